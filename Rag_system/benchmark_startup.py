@@ -0,0 +1,61 @@
+"""
+Measure RefactoredSupabaseRAG cold start, phase by phase.
+
+    python benchmark_startup.py          # import, construct and warm up (what the API waits for)
+    python benchmark_startup.py --rag    # also wait for the background LangChain/RAG chain build
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+
+async def _run(args, import_ms: float):
+    from config import RAGConfig
+    from rag_system_refactored import RefactoredSupabaseRAG
+
+    config = RAGConfig(
+        openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+        supabase_url=os.getenv("SUPABASE_URL", ""),
+        supabase_key=os.getenv("SUPABASE_KEY", "")
+    )
+
+    started = time.perf_counter()
+    rag_system = RefactoredSupabaseRAG(config)
+    await rag_system.warm_up()
+    ready_ms = (time.perf_counter() - started) * 1000
+
+    rag_ms = None
+    if args.rag:
+        await rag_system.rag_service.ainitialize()
+        rag_ms = (time.perf_counter() - started) * 1000
+
+    phases = {"import": round(import_ms, 1), **rag_system.timings.as_dict()}
+    await rag_system.shutdown()
+
+    print(f"{'Phase':<24}{'ms':>10}")
+    print("-" * 34)
+    for phase, ms in phases.items():
+        print(f"{phase:<24}{ms:>10.1f}")
+    print("-" * 34)
+    print(f"{'ready to serve':<24}{import_ms + ready_ms:>10.1f}")
+    if rag_ms is not None:
+        print(f"{'rag ready':<24}{import_ms + rag_ms:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report RAG system startup time per phase")
+    parser.add_argument("--rag", action="store_true", help="Also wait for the LangChain components")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    started = time.perf_counter()
+    import rag_system_refactored  # noqa: F401  (timed: module imports)
+    import_ms = (time.perf_counter() - started) * 1000
+    asyncio.run(_run(args, import_ms))
+
+
+if __name__ == "__main__":
+    main()
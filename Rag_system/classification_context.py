@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from keyword_matcher import normalize_arabic
+
+logger = logging.getLogger(__name__)
+
+_current_context: ContextVar[Optional["ClassificationContext"]] = ContextVar("classification_context", default=None)
+
+
+def _question_key(question: str) -> str:
+    return " ".join(normalize_arabic(question).split())
+
+
+class ClassificationContext:
+    """
+    Per-request memo for classification work on one question.
+    RouterService and SemanticSearchService store the category, embedding and
+    confidence they compute here, so every method asked about the same
+    question within a request reuses the first result instead of calling
+    OpenAI again. Concurrent callers share the same in-flight computation;
+    it is cancelled when its last waiter is (e.g. a routing tier that lost
+    the race) and when the request scope ends.
+    """
+
+    def __init__(self, question: str):
+        self.question = question
+        self._key = _question_key(question)
+        self._results: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+
+    def matches(self, question: str) -> bool:
+        return _question_key(question) == self._key
+
+    async def memoize(self, name: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Compute a value once per request; later and concurrent callers await the same result"""
+        future = self._results.get(name)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._results[name] = future
+        else:
+            logger.debug(f"Reusing '{name}' from classification context")
+        self._waiters[name] = self._waiters.get(name, 0) + 1
+        try:
+            # Shield so one cancelled caller does not cancel a computation others still await
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[name] == 1 and not future.done():
+                # Last waiter gone: stop the paid call and let a later caller start afresh
+                future.cancel()
+                self._results.pop(name, None)
+            raise
+        finally:
+            self._waiters[name] -= 1
+
+    def close(self):
+        """Cancel computations still running when the request ends"""
+        for name, future in self._results.items():
+            if not future.done():
+                logger.debug(f"Cancelling unfinished '{name}' at end of classification scope")
+                future.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return every value computed so far (for analysis and logging)"""
+        return {
+            name: future.result()
+            for name, future in self._results.items()
+            if future.done() and not future.cancelled() and future.exception() is None
+        }
+
+
+def current_context(question: str) -> Optional[ClassificationContext]:
+    """Return the active context if it belongs to this question"""
+    context = _current_context.get()
+    if context is not None and context.matches(question):
+        return context
+    return None
+
+
+@contextmanager
+def classification_scope(question: str) -> Iterator[ClassificationContext]:
+    """Open a classification context for the duration of one request"""
+    context = ClassificationContext(question)
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+        context.close()
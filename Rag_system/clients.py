@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from config import RAGConfig
+from supabase_rest import SupabaseREST
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamLimit:
+    """
+    Bounded concurrency for one upstream API. Callers wrap each request
+    (including reading a streamed response) in `async with`, so the number
+    of requests in flight is set by configuration, not by a thread pool.
+    """
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.BoundedSemaphore(self.max_concurrency)
+
+        # Counters
+        self.requests = 0
+        self.waited = 0
+        self.in_flight = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked():
+            self.waited += 1
+        await self._semaphore.acquire()
+        self.requests += 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "waited": self.waited,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency
+        }
+
+
+class ClientRegistry:
+    """
+    Process-wide pooled, keep-alive clients shared by every service, so
+    connections (and TLS handshakes) are reused instead of each service
+    opening its own: the Supabase REST pool, the supabase-py client the
+    LangChain vector store needs, and sync and async OpenAI-compatible
+    clients. Each client is created on first use; pool sizes come from config.
+    Async OpenAI calls go through limit("openai_chat") / limit("openai_embeddings").
+    """
+
+    def __init__(self, config: RAGConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._supabase_rest: Optional[SupabaseREST] = None
+        self._supabase: Any = None
+        self._openai: Optional[OpenAI] = None
+        self._async_openai: Optional[AsyncOpenAI] = None
+        self._limits: Dict[str, UpstreamLimit] = {
+            "openai_chat": UpstreamLimit("openai_chat", config.openai_chat_concurrency),
+            "openai_embeddings": UpstreamLimit("openai_embeddings", config.openai_embedding_concurrency)
+        }
+
+    def supabase_rest(self) -> SupabaseREST:
+        with self._lock:
+            if self._supabase_rest is None:
+                self._supabase_rest = SupabaseREST(
+                    self.config.supabase_url,
+                    self.config.supabase_key,
+                    rest_url=self.config.supabase_rest_url or None,
+                    max_connections=self.config.supabase_pool_size,
+                    max_concurrency=self.config.supabase_max_concurrency,
+                    timeout=self.config.supabase_timeout
+                )
+            return self._supabase_rest
+
+    def supabase(self):
+        """supabase-py client, for LangChain's SupabaseVectorStore"""
+        with self._lock:
+            if self._supabase is None:
+                from supabase import create_client
+                self._supabase = create_client(self.config.supabase_url, self.config.supabase_key)
+                logger.info("Supabase client initialized")
+            return self._supabase
+
+    def _openai_options(self) -> Dict[str, Any]:
+        return {
+            "api_key": self.config.openai_api_key,
+            "base_url": self.config.openai_base_url or None,
+            "timeout": self.config.openai_timeout
+        }
+
+    def _openai_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.config.openai_pool_size,
+            max_keepalive_connections=self.config.openai_pool_size
+        )
+
+    def openai(self) -> OpenAI:
+        with self._lock:
+            if self._openai is None:
+                self._openai = OpenAI(
+                    **self._openai_options(),
+                    http_client=httpx.Client(limits=self._openai_limits())
+                )
+                logger.info(f"OpenAI client initialized (pool={self.config.openai_pool_size})")
+            return self._openai
+
+    def async_openai(self) -> AsyncOpenAI:
+        with self._lock:
+            if self._async_openai is None:
+                self._async_openai = AsyncOpenAI(
+                    **self._openai_options(),
+                    http_client=httpx.AsyncClient(limits=self._openai_limits())
+                )
+                logger.info(f"Async OpenAI client initialized (pool={self.config.openai_pool_size})")
+            return self._async_openai
+
+    def limit(self, upstream: str) -> UpstreamLimit:
+        """Concurrency limit for an upstream ("openai_chat", "openai_embeddings")"""
+        return self._limits[upstream]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "supabase_rest": self._supabase_rest is not None,
+                "supabase": self._supabase is not None,
+                "openai": self._openai is not None,
+                "async_openai": self._async_openai is not None,
+                "openai_base_url": self.config.openai_base_url or None,
+                "openai_pool_size": self.config.openai_pool_size,
+                "supabase_pool_size": self.config.supabase_pool_size,
+                "limits": {name: limit.get_stats() for name, limit in self._limits.items()}
+            }
+
+    async def aclose(self):
+        """Close every pool; clients are recreated if used again"""
+        with self._lock:
+            supabase_rest, self._supabase_rest = self._supabase_rest, None
+            sync_openai, self._openai = self._openai, None
+            async_openai, self._async_openai = self._async_openai, None
+            self._supabase = None
+        try:
+            if supabase_rest is not None:
+                await supabase_rest.aclose()
+            if sync_openai is not None:
+                sync_openai.close()
+            if async_openai is not None:
+                await async_openai.close()
+        except Exception as e:
+            logger.error(f"Error closing shared clients: {e}")
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_clients(config: Optional[RAGConfig] = None) -> ClientRegistry:
+    """Return the process-wide registry; the first caller's config (or the environment) sets it up"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry(config or RAGConfig(
+                openai_api_key=os.getenv("OPENAI_API_KEY", ""),
+                supabase_url=os.getenv("SUPABASE_URL", ""),
+                supabase_key=os.getenv("SUPABASE_KEY", "")
+            ))
+        return _registry
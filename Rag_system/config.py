@@ -7,6 +7,22 @@ from dotenv import load_dotenv
 # Load environment variables from config.env (one level up)
 load_dotenv("../config.env")
 
+# Directory of this package; relative data-file paths below are resolved against it, not the working directory
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Precomputed product descriptions (enrichment_store.py); the legacy rag_system.py resolves the same path
+ENRICHMENT_STORE_PATH = os.path.join(PACKAGE_DIR, os.getenv("ENRICHMENT_STORE_PATH") or "product_enrichment.json")
+
+def package_path(path: str) -> str:
+    """Resolve a relative data-file path against PACKAGE_DIR; an empty path (feature off) stays empty"""
+    return os.path.join(PACKAGE_DIR, path) if path else ""
+
+# Persisted semantic pattern index; set SEMANTIC_INDEX_PATH="" to keep it in memory only
+SEMANTIC_INDEX_PATH = package_path(os.getenv("SEMANTIC_INDEX_PATH", "semantic_patterns.npz"))
+
+# Local intent model written by `python intent_classifier.py`
+INTENT_MODEL_PATH = package_path(os.getenv("INTENT_MODEL_PATH", "intent_model.npz"))
+
 @dataclass
 class RAGConfig:
     openai_api_key: str
@@ -19,16 +35,85 @@ class RAGConfig:
     chunk_overlap: int = 200
     table_name: str = os.getenv("VECTOR_TABLE", "documents")
     query_name: str = os.getenv("VECTOR_QUERY_FN", "match_documents")
+    embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    semantic_index_path: str = SEMANTIC_INDEX_PATH
+    # ada-002 similarities between Arabic questions and the patterns are almost all above 0.7;
+    # calibrate both on real embeddings (see get_question_analysis) before enabling the semantic tier
+    semantic_min_similarity: float = float(os.getenv("SEMANTIC_MIN_SIMILARITY", "0.85"))
+    semantic_min_margin: float = float(os.getenv("SEMANTIC_MIN_MARGIN", "0.05"))  # over the best other category
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    embedding_cache_dir: str = os.getenv("EMBEDDING_CACHE_DIR", "")
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    embedding_batch_wait_ms: float = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+    response_cache_size: int = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+    response_cache_ttl: float = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+    response_cache_trim_interval: int = int(os.getenv("RESPONSE_CACHE_TRIM_INTERVAL", "100"))
+    routing_parallel_budget: float = float(os.getenv("ROUTING_PARALLEL_BUDGET", "20"))
+    intent_model_path: str = INTENT_MODEL_PATH
+    intent_confidence_threshold: float = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+    classification_log_path: str = os.getenv("CLASSIFICATION_LOG_PATH", "")
+    catalog_refresh_interval: float = float(os.getenv("CATALOG_REFRESH_SECONDS", "60"))
+    catalog_max_staleness: float = float(os.getenv("CATALOG_MAX_STALENESS_SECONDS", "600"))
+    data_version_ttl: float = float(os.getenv("DATA_VERSION_TTL_SECONDS", "1"))  # how long a worker reuses the shared data version
+    supabase_rest_url: str = os.getenv("SUPABASE_REST_URL", "")  # e.g. a local PostgREST for testing
+    supabase_pool_size: int = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+    supabase_max_concurrency: int = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "10"))
+    supabase_timeout: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")  # any OpenAI-compatible endpoint
+    openai_pool_size: int = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+    openai_timeout: float = float(os.getenv("OPENAI_TIMEOUT", "30"))
+    openai_chat_concurrency: int = int(os.getenv("OPENAI_CHAT_CONCURRENCY", "16"))
+    openai_embedding_concurrency: int = int(os.getenv("OPENAI_EMBEDDING_CONCURRENCY", "8"))
+    chat_invoice_limit: int = int(os.getenv("CHAT_INVOICE_LIMIT", "10"))
+    memory_max_turns: int = int(os.getenv("MEMORY_MAX_TURNS", "20"))
+    memory_max_tokens: int = int(os.getenv("MEMORY_MAX_TOKENS", "2000"))
+    memory_idle_ttl: float = float(os.getenv("MEMORY_IDLE_TTL_SECONDS", "1800"))
+    memory_max_users: int = int(os.getenv("MEMORY_MAX_USERS", "1000"))
+    memory_db_path: str = os.getenv("MEMORY_DB_PATH", "")  # SQLite file; empty keeps history in RAM only
+    history_keep_turns: int = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+    history_token_budget: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+    history_summary_tokens: int = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+    enrichment_concurrency: int = int(os.getenv("ENRICHMENT_CONCURRENCY", "4"))
+    enrichment_store_path: str = ENRICHMENT_STORE_PATH
+    workers: int = int(os.getenv("RAG_WORKERS", "1"))  # API worker processes (set by start_server.py)
+    shared_state_url: str = os.getenv("SHARED_STATE_URL", "")  # "" in-process, or sqlite:///path shared by workers
+
+# Routing tiers for ask_question. Local tiers run sequentially in cost order;
+# remote tiers whose total cost fits ROUTING_PARALLEL_BUDGET run concurrently,
+# and the confident answer with the lowest "priority" (default: cost) wins,
+# the others are cancelled. The original cascade never ran semantic search
+# (it was commented out), so that tier stays off unless SEMANTIC_SEARCH_ENABLED
+# is set; when enabled, the LLM router keeps precedence over it.
+ROUTING_TIERS: Dict[str, Dict[str, Any]] = {
+    "keyword_matching": {"stage": "local", "cost": 0.0, "timeout": 1.0},
+    "smart_product_query": {"stage": "local", "cost": 1.0, "timeout": float(os.getenv("DB_TIER_TIMEOUT", "5"))},
+    "database_query": {"stage": "local", "cost": 1.0, "timeout": float(os.getenv("DB_TIER_TIMEOUT", "5"))},
+    "retrieval_prefetch": {"stage": "remote", "cost": 1.0, "timeout": float(os.getenv("PREFETCH_TIER_TIMEOUT", "5")), "answers": False},
+    "semantic_search": {"stage": "remote", "cost": 2.0, "priority": 2.0, "timeout": float(os.getenv("SEMANTIC_TIER_TIMEOUT", "3")),
+                        "enabled": os.getenv("SEMANTIC_SEARCH_ENABLED", "false").lower() == "true"},
+    "llm_router": {"stage": "remote", "cost": 10.0, "priority": 1.0, "timeout": float(os.getenv("ROUTER_TIER_TIMEOUT", "5"))},
+    "rag_chain": {"stage": "remote", "cost": 100.0, "timeout": float(os.getenv("RAG_TIER_TIMEOUT", "30"))},
+}
+
+# Answer tiers whose results are deterministic enough for the response cache
+CACHEABLE_METHODS: Tuple[str, ...] = (
+    "keyword_matching", "llm_router", "semantic_search", "smart_product_query", "database_query"
+)
+
+# Query types whose answers depend on who asks (their invoices, login state or history); never cached
+USER_SPECIFIC_QUERY_TYPES: Tuple[str, ...] = (
+    "user_invoices", "smart_product_query: context_pronoun"
+)
 
 # Enhanced Smart Responses with Regex Patterns and Semantic Variations
 SMART_RESPONSES: Dict[Tuple[str, ...], Callable[[str], str]] = {
     # Greetings - Enhanced with variations
-    ("اهلا", "أهلا", "مرحبا", "السلام عليكم", "hello", "hi", "مرحبتين", "هلا", "أهلين", 
+    ("اهلا", "مرحبا", "السلام عليكم", "hello", "hi", "مرحبتين", "هلا", "أهلين", 
      "صباح الخير", "مساء الخير", "صباح النور", "مساء النور", "أهلاً وسهلاً", "أهلاً وسهلاً بك"): 
         lambda user: f"أهلاً {user}!" if user else "أهلاً وسهلاً! كيف حالك؟ أنا صديق، مساعدك الذكي في دكان فجن، سعيد بلقائك.",
     
     # Farewells - Enhanced
-    ("مع السلامة", "إلى اللقاء", "goodbye", "bye", "سلام", "باي", "وداعاً", "إلى اللقاء", 
+    ("مع السلامة", "إلى اللقاء", "goodbye", "bye", "سلام", "باي", "وداعاً", 
      "أراك لاحقاً", "أراك قريباً", "أراك غداً", "أراك بعد قليل"): 
         lambda _: "وداعاً! نتمنى لك يوماً سعيداً.",
     
@@ -38,12 +123,12 @@ SMART_RESPONSES: Dict[Tuple[str, ...], Callable[[str], str]] = {
         lambda user: f"الحمد لله بخير {user or ''}. كيف أقدر أساعدك اليوم؟",
     
     # Thanks - Enhanced
-    ("شكرا", "شكراً", "thank you", "thanks", "مشكور", "تسلم", "تسلم إيدك", "الله يسلمك", 
+    ("شكرا", "thank you", "thanks", "مشكور", "تسلم", "تسلم إيدك", "الله يسلمك", 
      "أشكرك", "أشكرك كثيراً", "شكراً جزيلاً", "شكراً لك"): 
         lambda user: f"العفو {user or ''}! سعيد بمساعدتك.",
     
     # About the assistant - Enhanced
-    ("اسمك", "your name", "من انت", "من أنت", "وش اسمك", "ما اسمك", "ما اسمك", "كيف أسمك", 
+    ("اسمك", "your name", "من انت", "وش اسمك", "ما اسمك", "كيف أسمك", 
      "ما اسمك الحقيقي", "هل لك اسم", "ما اسمك يا مساعد"): 
         lambda _: "أنا صديق، مساعدك الذكي في دكان فجن. أساعدك في التسوق والإجابة على أسئلتك.",
     
@@ -129,25 +214,25 @@ SMART_RESPONSES: Dict[Tuple[str, ...], Callable[[str], str]] = {
 # Enhanced Smart Product Queries with Semantic Variations
 SMART_PRODUCT_QUERIES: Dict[Tuple[str, ...], str] = {
     # Price queries - Enhanced with variations
-    ("اعلى سعر", "أعلى سعر", "اغلى", "أغلى", "أعلى تكلفة", "اعلى تكلفة", "highest price", "most expensive",
+    ("اعلى سعر", "اغلى", "أعلى تكلفة", "highest price", "most expensive",
      "ما هو أغلى منتج", "ما هو الأعلى سعراً", "ما هو الأغلى", "ما هو الأعلى تكلفة", 
      "أي منتج أغلى", "أي منتج أعلى سعراً", "ما هو المنتج الأغلى", "ما هو المنتج الأعلى سعراً"): "highest_price",
     
-    ("اقل سعر", "أقل سعر", "ارخص", "أرخص", "أقل تكلفة", "اقل تكلفة", "lowest price", "cheapest",
+    ("اقل سعر", "ارخص", "أقل تكلفة", "lowest price", "cheapest",
      "ما هو أرخص منتج", "ما هو الأقل سعراً", "ما هو الأرخص", "ما هو الأقل تكلفة",
      "أي منتج أرخص", "أي منتج أقل سعراً", "ما هو المنتج الأرخص", "ما هو المنتج الأقل سعراً"): "lowest_price",
     
-         ("اعلى كالوري", "أعلى كالوري", "أعلى سعرات", "اعلى سعرات", "highest calories", "most calories",
+         ("اعلى كالوري", "أعلى سعرات", "highest calories", "most calories",
       "ما هو أعلى سعرات حرارية", "ما هو الأكثر سعرات", "أي منتج أعلى سعرات", 
-      "ما هو المنتج الأعلى سعرات حرارية", "اكثر منتج في سعرات حرارية", "أكثر منتج في سعرات حرارية",
-      "وش اكثر منتج في سعرات حرارية", "وش أكثر منتج في سعرات حرارية", "اكثر منتج سعرات", "أكثر منتج سعرات",
-      "وش اكثر منتج فيه سعرات حرارية", "وش أكثر منتج فيه سعرات حرارية", "اكثر منتج فيه سعرات", "أكثر منتج فيه سعرات"): "highest_calories",
+      "ما هو المنتج الأعلى سعرات حرارية", "اكثر منتج في سعرات حرارية", 
+      "وش اكثر منتج في سعرات حرارية", "اكثر منتج سعرات", 
+      "وش اكثر منتج فيه سعرات حرارية", "اكثر منتج فيه سعرات"): "highest_calories",
      
-     ("اقل كالوري", "أقل كالوري", "اقل سعرات", "أقل سعرات", "lowest calories", "least calories",
+     ("اقل كالوري", "اقل سعرات", "lowest calories", "least calories",
       "ما هو أقل سعرات حرارية", "ما هو الأقل سعرات", "أي منتج أقل سعرات", 
-      "ما هو المنتج الأقل سعرات حرارية", "ارخص منتج في سعرات حرارية", "أرخص منتج في سعرات حرارية",
-      "وش ارخص منتج في سعرات حرارية", "وش أرخص منتج في سعرات حرارية", "ارخص منتج سعرات", "أرخص منتج سعرات",
-      "وش ارخص منتج فيه سعرات حرارية", "وش أرخص منتج فيه سعرات حرارية", "ارخص منتج فيه سعرات", "أرخص منتج فيه سعرات"): "lowest_calories",
+      "ما هو المنتج الأقل سعرات حرارية", "ارخص منتج في سعرات حرارية", 
+      "وش ارخص منتج في سعرات حرارية", "ارخص منتج سعرات", 
+      "وش ارخص منتج فيه سعرات حرارية", "ارخص منتج فيه سعرات"): "lowest_calories",
     
     # Calories queries - Enhanced
     ("كم فيه سعرة", "كم سعرة", "كم سعرات", "كم سعرات حرارية", "calories", "سعرات حرارية", "سعرة حرارية",
@@ -168,12 +253,12 @@ SMART_PRODUCT_QUERIES: Dict[Tuple[str, ...], str] = {
      "كم تكلفة الشوكولاته", "ما هي أسعار الشوكولاته", "كم سعر الحلويات", "ما هو سعر الحلويات"): "chocolate_prices",
     
     ("كم سعر الشيبس", "سعر الشيبس", "تكلفة الشيبس", "price of chips", "كم سعر المقرمشات", "سعر المقرمشات",
-     "ما هو سعر الشيبس", "كم تكلفة الشيبس", "ما هي أسعار الشيبس", "كم سعر المقرمشات",
+     "ما هو سعر الشيبس", "كم تكلفة الشيبس", "ما هي أسعار الشيبس", 
      "ما هو سعر المقرمشات", "كم تكلفة المقرمشات", "ما هي أسعار المقرمشات", "كم سعر الوجبات الخفيفة",
      "ما هو سعر الوجبات الخفيفة", "كم تكلفة الوجبات الخفيفة", "ما هي أسعار الوجبات الخفيفة"): "chips_prices",
     
     # Comparison - Enhanced
-    ("قارن", "مقارنة", "مقارنه", "compare", "competition", "منافسة", "منافسين", "الاسواق", "متجر اخر", "متجر آخر",
+    ("قارن", "مقارنة", "مقارنه", "compare", "competition", "منافسة", "منافسين", "الاسواق", "متجر اخر", 
      "ما هي المقارنة", "كيف تقارنون", "ما هي المنافسة", "هل أسعاركم منافسة", "ما هي أسعار المنافسين",
      "هل أسعاركم أفضل", "هل أسعاركم أعلى", "هل أسعاركم أقل", "ما هي مزاياكم", "ما هي عيوبكم"): "price_comparison",
 }
@@ -187,9 +272,12 @@ PRODUCT_KEYWORDS: List[str] = [
     
     # Variations and synonyms
     "عصير", "مشروب", "عصائر", "مشروبات", "المراعي", "الربيع", "نادك",
-    "شوكولاتة", "شوكولاته", "حلويات", "حلويات", "بارني", "جالكسي",
-    "كيت كات", "كيتكات", "أوريو", "اوريو", "شيبس", "مقرمشات", "برينجلز",
-    "بروتين", "صن توب", "صن توب", "بسكريم", "بسكريم", "لويكر", "سكيتلز"
+    "شوكولاتة", "شوكولاته", "حلويات", "كيتكات", "شيبس", "مقرمشات", "برينجلز", "بروتين"
+]
+
+# Pronouns that refer back to a product mentioned earlier in the conversation
+CONTEXT_PRONOUNS: List[str] = [
+    "هو", "هي", "هذا", "هذه", "سعره", "سعرها", "سعراته", "سعراتها", "كم سعره", "كم سعرها"
 ]
 
 # Enhanced Database Queries with semantic variations
@@ -201,7 +289,7 @@ DATABASE_QUERIES: Dict[Tuple[str, ...], str] = {
     
     # Prices - Enhanced
     ("الاسعار", "prices", "price", "كم السعر", "كم الاسعار", "التكلفة", "cost",
-     "ما هي الأسعار", "ما هي التكلفة", "ما هي الأسعار", "ما هي التكاليف",
+     "ما هي الأسعار", "ما هي التكلفة", "ما هي التكاليف",
      "ما هي أسعار المنتجات", "ما هي تكلفة المنتجات", "ما هي أسعار البضائع"): "prices",
     
     # Branches - Enhanced
@@ -209,11 +297,11 @@ DATABASE_QUERIES: Dict[Tuple[str, ...], str] = {
      "ما هي الفروع", "ما هي المواقع", "ما هي الأماكن", "ما هي المناطق",
      "ما هي المدن", "ما هي المواقع المتوفرة", "ما هي الفروع المتاحة",
      "كم فرع موجود", "عدد الفروع", "كم عدد الفروع", "كم فرع", "عدد فروعكم",
-     "كم فرع لديكم", "كم فرع موجود", "كم فرع عندكم", "كم فرع في الرياض",
+     "كم فرع لديكم", "كم فرع عندكم", "كم فرع في الرياض",
      "كم فرع في جدة", "كم فرع في الدمام", "كم فرع في الخبر", "كم فرع في المدينة"): "branches",
     
     # Invoices (user-specific) - Enhanced
-    ("فواتيري", "فواتيري", "invoices", "invoice", "كم عدد فواتيري", "عرض فواتيري", "فواتيري",
+    ("فواتيري", "invoices", "invoice", "كم عدد فواتيري", "عرض فواتيري", 
      "ما هي فواتيري", "ما هي مشترياتي", "ما هي طلباتي", "ما هي أوامري",
      "ما هي فواتيري السابقة", "ما هي مشترياتي السابقة", "ما هي طلباتي السابقة"): "user_invoices",
     
@@ -241,6 +329,14 @@ PRODUCT_TRANSLATIONS: Dict[str, str] = {
     'pringles_barbeque': 'برينجلز باربكيو'
 }
 
+# Product categories answered by server-side filters: English and Arabic name terms
+PRODUCT_CATEGORY_TERMS: Dict[str, Tuple[str, str]] = {
+    "juice": ("juice", "عصير"),
+    "milk": ("milk", "حليب"),
+    "chocolate": ("chocolate", "شوكولاتة"),
+    "chips": ("chips", "شيبس"),
+}
+
 # Regex patterns for flexible matching
 REGEX_PATTERNS: Dict[str, str] = {
     # Price patterns (general price info only, not specific product queries)
@@ -1,54 +1,390 @@
-from typing import Dict, List, Any, Optional
-from supabase import create_client, Client
+from typing import Dict, List, Any, Optional, Callable, AsyncIterator, Awaitable, Union
+from dataclasses import dataclass, field
+from supabase_rest import SupabaseREST
+from clients import get_clients
+from config import PRODUCT_TRANSLATIONS, PRODUCT_CATEGORY_TERMS
+from single_flight import SingleFlight
+from shared_state import MemoryBackend, StateBackend
+import asyncio
+import base64
+import hashlib
+import inspect
+import json
 import logging
+import time
+import uuid
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Catalog tables held in the in-process snapshot
+CATALOG_TABLES = ("products", "branches")
+
+# Invoice columns shown in chat answers and list views (no products_and_quantities JSONB)
+INVOICE_SUMMARY_COLUMNS = "id,timestamp,total_amount,status"
+
+@dataclass
+class CatalogSnapshot:
+    rows: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    fingerprints: Dict[str, str] = field(default_factory=dict)
+    fetched_at: Dict[str, float] = field(default_factory=dict)
+    # Data version current when each table was loaded
+    versions: Dict[str, int] = field(default_factory=dict)
+
+    def age(self, table: str) -> float:
+        fetched_at = self.fetched_at.get(table)
+        return time.monotonic() - fetched_at if fetched_at is not None else float("inf")
+
 class DatabaseService:
-    def __init__(self, supabase_url: str, supabase_key: str):
-        self.supabase: Client = create_client(supabase_url, supabase_key)
+    def __init__(self, supabase_url: str, supabase_key: str,
+                 refresh_interval: float = 60.0, max_staleness: float = 600.0,
+                 rest_client: Optional[SupabaseREST] = None, state: Optional[StateBackend] = None,
+                 version_ttl: float = 1.0):
+        # Async PostgREST access through a shared connection pool
+        self.rest = rest_client or get_clients().supabase_rest()
+        # Holds the data version; a shared backend keeps it consistent across workers
+        self.state = state or MemoryBackend()
+        # The data version is re-read from the backend at most every version_ttl seconds
+        self.version_ttl = version_ttl
+        self._data_version = 0
+        self._version_read_at: Optional[float] = None
+        self._change_listeners: List[Callable[[str], Union[None, Awaitable[None]]]] = []
+        self._snapshot_listeners: List[Callable[[str], Union[None, Awaitable[None]]]] = []
+        
+        # Catalog snapshot: reads are served from memory, refreshed in the background
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.snapshot = CatalogSnapshot()
+        # Concurrent identical fetches share one request
+        self.flight = SingleFlight("catalog")
+        self._background_refreshes: Dict[str, asyncio.Task] = {}
+        self._refresh_loop_task: Optional[asyncio.Task] = None
         logger.info("Database service initialized")
 
+    def add_change_listener(self, listener: Callable[[str], Union[None, Awaitable[None]]]):
+        """
+        Register a callback (plain or async) invoked with the table name when catalog data changes.
+        With a shared backend only the worker that records the change calls it,
+        so use it for shared state (e.g. the answer cache).
+        """
+        self._change_listeners.append(listener)
+
+    def add_snapshot_listener(self, listener: Callable[[str], Union[None, Awaitable[None]]]):
+        """Register a callback invoked with the table name when this worker's snapshot of it changes"""
+        self._snapshot_listeners.append(listener)
+
+    @property
+    def data_version(self) -> int:
+        """The data version this worker last read or recorded (for stats; requests use get_data_version)"""
+        return self._data_version
+
+    async def get_data_version(self) -> int:
+        """
+        Bumped on every product/branch change so dependent caches can key on it.
+        Changes recorded by other workers are seen within version_ttl seconds.
+        """
+        now = time.monotonic()
+        if self._version_read_at is None or now - self._version_read_at >= self.version_ttl:
+            # Stamped first, so concurrent requests reuse the current value instead of piling onto the backend
+            self._version_read_at = now
+            self._data_version = max(self._data_version, await self.state.aget("catalog", "data_version") or 0)
+        return self._data_version
+
+    async def _bump_data_version(self, table: str) -> int:
+        version = await self.state.aincr("catalog", "data_version")
+        self._data_version = version
+        self._version_read_at = time.monotonic()
+        logger.info(f"Data change in '{table}', data version is now {version}")
+        await self._notify(self._change_listeners, table)
+        return version
+
+    @staticmethod
+    async def _notify(listeners: List[Callable[[str], Union[None, Awaitable[None]]]], table: str):
+        for listener in listeners:
+            try:
+                result = listener(table)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error in data change listener: {e}")
+
+    async def notify_data_changed(self, table: str = "products"):
+        """Record a write to products/branches, notify listeners and refresh the snapshot"""
+        await self._bump_data_version(table)
+        if table in CATALOG_TABLES:
+            self._schedule_refresh(table)
+
+    async def _fetch_table(self, table: str) -> List[Dict[str, Any]]:
+        return await self.rest.select(table)
+
+    async def refresh_catalog(self, table: str) -> bool:
+        """Reload one catalog table; bumps the data version if its contents changed"""
+        refreshed, _ = await self.flight.do(("refresh", table), lambda: self._refresh_catalog(table))
+        return refreshed
+
+    async def _refresh_catalog(self, table: str) -> bool:
+        # Read before fetching, so a change recorded meanwhile triggers another refresh
+        version = await self.get_data_version()
+        try:
+            rows = await self._fetch_table(table)
+        except Exception as e:
+            logger.error(f"Error refreshing {table} snapshot: {e}")
+            return False
+        
+        fingerprint = hashlib.sha256(
+            json.dumps(rows, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        previous = self.snapshot.fingerprints.get(table)
+        self.snapshot.rows[table] = rows
+        self.snapshot.fingerprints[table] = fingerprint
+        self.snapshot.fetched_at[table] = time.monotonic()
+        
+        # The last fingerprint seen by any worker; only the first worker to see a change bumps the version
+        recorded = await self.state.aget("catalog", f"fingerprint:{table}")
+        if recorded != fingerprint:
+            await self.state.aset("catalog", f"fingerprint:{table}", fingerprint)
+            if recorded is not None:
+                version = await self._bump_data_version(table)
+        self.snapshot.versions[table] = version
+        
+        if previous is not None and previous != fingerprint:
+            await self._notify(self._snapshot_listeners, table)
+        return True
+
+    def _schedule_refresh(self, table: str):
+        """Start a background refresh unless one is already running"""
+        task = self._background_refreshes.get(table)
+        if task is not None and not task.done():
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self.refresh_catalog(table))
+            self._background_refreshes[table] = task
+        except RuntimeError:
+            # No running loop (e.g. called from sync code); the next read refreshes instead
+            self.snapshot.fetched_at.pop(table, None)
+
+    async def _get_catalog(self, table: str) -> List[Dict[str, Any]]:
+        """Serve a catalog table from the snapshot (stale-while-revalidate)"""
+        age = self.snapshot.age(table)
+        # Another worker recorded a change this snapshot predates
+        outdated = self.snapshot.versions.get(table, 0) < await self.get_data_version()
+        if table not in self.snapshot.rows or age > self.max_staleness or outdated:
+            # Cold, too stale or outdated: wait for fresh data
+            await self.refresh_catalog(table)
+        elif age > self.refresh_interval:
+            # Stale: answer now, revalidate in the background
+            self._schedule_refresh(table)
+        return list(self.snapshot.rows.get(table, []))
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            for table in CATALOG_TABLES:
+                await self.refresh_catalog(table)
+
+    def start_background_refresh(self):
+        """Refresh the catalog snapshot on a timer"""
+        if self._refresh_loop_task is None or self._refresh_loop_task.done():
+            self._refresh_loop_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+            logger.info(f"Catalog refresh loop started (every {self.refresh_interval}s)")
+
+    async def stop_background_refresh(self):
+        if self._refresh_loop_task is not None:
+            self._refresh_loop_task.cancel()
+            try:
+                await self._refresh_loop_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_loop_task = None
+
+    def get_catalog_stats(self) -> Dict[str, Any]:
+        """Describe the snapshot for monitoring"""
+        return {
+            "data_version": self.data_version,
+            "tables": {
+                table: {
+                    "rows": len(self.snapshot.rows.get(table, [])),
+                    "age_seconds": self.snapshot.age(table) if table in self.snapshot.fetched_at else None,
+                    "fingerprint": self.snapshot.fingerprints.get(table),
+                    "data_version": self.snapshot.versions.get(table)
+                }
+                for table in CATALOG_TABLES
+            }
+        }
+
     async def get_products(self) -> List[Dict[str, Any]]:
-        """Get all products from database"""
+        """Get all products (served from the catalog snapshot)"""
         try:
-            result = self.supabase.table("products").select("*").execute()
-            return result.data or []
+            return await self._get_catalog("products")
         except Exception as e:
             logger.error(f"Error fetching products: {e}")
             return []
 
+    @staticmethod
+    def _quote_filter_value(value: str) -> str:
+        """Double-quote a PostgREST filter value, backslash-escaping backslashes and quotes"""
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+    @classmethod
+    def _category_filter(cls, category: str) -> str:
+        """PostgREST filter matching the products _matches_category selects from the snapshot"""
+        english, arabic = PRODUCT_CATEGORY_TERMS[category]
+        translated = [name for name, ar_name in PRODUCT_TRANSLATIONS.items() if arabic in ar_name.lower()]
+        # Untranslated names are matched as-is, so Arabic product names need the Arabic term too
+        conditions = [f"name.ilike.{cls._quote_filter_value(f'*{term}*')}" for term in (english, arabic)]
+        if translated:
+            names = ",".join(cls._quote_filter_value(name) for name in translated)
+            conditions.append(f"name.in.({names})")
+        return f"({','.join(conditions)})"
+
+    def _matches_category(self, product: Dict[str, Any], category: str) -> bool:
+        english, arabic = PRODUCT_CATEGORY_TERMS[category]
+        name = product.get('name', '') or ''
+        return english in name.lower() or arabic in PRODUCT_TRANSLATIONS.get(name, name).lower()
+
+    async def query_products(self, order_by: Optional[str] = None, descending: bool = False,
+                             limit: Optional[int] = None, category: Optional[str] = None,
+                             columns: str = "*") -> List[Dict[str, Any]]:
+        """
+        Ordered, filtered and limited product query executed by Postgres
+        (indexes on products.price and products.calories keep it cheap).
+        Falls back to the catalog snapshot if the query fails.
+        """
+        filters = {"or": self._category_filter(category)} if category else None
+        order = f"{order_by}.{'desc' if descending else 'asc'}.nullslast" if order_by else None
+        try:
+            key = ("products", columns, order, limit, category)
+            rows, _ = await self.flight.do(key, lambda: self.rest.select(
+                "products", columns=columns, filters=filters, order=order, limit=limit
+            ))
+            # Each caller gets its own list
+            return list(rows)
+        except Exception as e:
+            logger.error(f"Error querying products, using catalog snapshot: {e}")
+            products = await self.get_products()
+            if category:
+                products = [p for p in products if self._matches_category(p, category)]
+            if order_by:
+                present = [p for p in products if p.get(order_by) is not None]
+                missing = [p for p in products if p.get(order_by) is None]
+                products = sorted(present, key=lambda p: p[order_by], reverse=descending) + missing
+            return products[:limit] if limit is not None else products
+
+    async def get_top_products(self, field: str, k: int = 1, highest: bool = True,
+                               category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Top-k products by a numeric column (price, calories)"""
+        return await self.query_products(order_by=field, descending=highest, limit=k, category=category)
+
+    async def get_extreme_product(self, field: str, highest: bool = True,
+                                  category: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Product with the highest/lowest value of a column (argmax/argmin)"""
+        products = await self.get_top_products(field, k=1, highest=highest, category=category)
+        return products[0] if products else None
+
+    async def get_products_in_category(self, category: str) -> List[Dict[str, Any]]:
+        """Products of one category (juice, milk, chocolate, chips)"""
+        return await self.query_products(category=category, columns="id,name,price")
+
     async def get_all_products(self) -> List[Dict[str, Any]]:
         """Get all products from database (alias for get_products)"""
         return await self.get_products()
 
     async def get_branches(self) -> List[Dict[str, Any]]:
-        """Get all branches from database"""
+        """Get all branches (served from the catalog snapshot)"""
         try:
-            result = self.supabase.table("branches").select("*").execute()
-            return result.data or []
+            return await self._get_catalog("branches")
         except Exception as e:
             logger.error(f"Error fetching branches: {e}")
             return []
 
-    async def get_invoices(self, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get invoices, optionally filtered by user_id"""
+    async def get_invoices(self, user_id: Optional[str] = None, columns: str = "*",
+                           limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get invoices (newest first), optionally filtered by user_id"""
         try:
-            query = self.supabase.table("invoices").select("*")
-            if user_id:
-                query = query.eq("user_id", user_id)
-            result = query.execute()
-            return result.data or []
+            filters = {"user_id": f"eq.{user_id}"} if user_id else None
+            return await self.rest.select(
+                "invoices", columns=columns, filters=filters, order="timestamp.desc,id.desc", limit=limit
+            )
         except Exception as e:
             logger.error(f"Error fetching invoices: {e}")
             return []
 
+    @staticmethod
+    def encode_invoice_cursor(invoice: Dict[str, Any]) -> str:
+        raw = json.dumps([invoice.get("timestamp"), invoice.get("id")]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    @staticmethod
+    def decode_invoice_cursor(cursor: str) -> List[Any]:
+        """Decode a cursor to [ISO timestamp, id]; the values end up in a PostgREST filter, so both are validated"""
+        try:
+            timestamp, invoice_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            if not isinstance(timestamp, str):
+                raise ValueError
+            datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+            if isinstance(invoice_id, bool):
+                raise ValueError
+            if not isinstance(invoice_id, int):
+                invoice_id = str(uuid.UUID(str(invoice_id)))
+        except Exception:
+            raise ValueError("Invalid invoice cursor")
+        return [timestamp, invoice_id]
+
+    async def get_invoice_page(self, user_id: str, limit: int = 20, cursor: Optional[str] = None,
+                               columns: str = INVOICE_SUMMARY_COLUMNS) -> Dict[str, Any]:
+        """
+        One page of a user's invoices, newest first, using a keyset cursor on
+        (timestamp, id) so deep pages cost the same as the first one.
+        Returns {"invoices", "next_cursor"}; next_cursor is None on the last page.
+        """
+        selected = [c.strip() for c in columns.split(",")]
+        # The cursor needs both key columns
+        for key in ("timestamp", "id"):
+            if "*" not in selected and key not in selected:
+                selected.append(key)
+        
+        filters = {"user_id": f"eq.{user_id}"}
+        if cursor:
+            timestamp, invoice_id = self.decode_invoice_cursor(cursor)
+            filters["or"] = (f'(timestamp.lt."{timestamp}",'
+                             f'and(timestamp.eq."{timestamp}",id.lt."{invoice_id}"))')
+        
+        # Fetch one extra row to know whether another page exists
+        rows = await self.rest.select(
+            "invoices",
+            columns=",".join(selected),
+            filters=filters,
+            order="timestamp.desc,id.desc",
+            limit=limit + 1
+        )
+        page = rows[:limit]
+        next_cursor = self.encode_invoice_cursor(page[-1]) if len(rows) > limit and page else None
+        return {"invoices": page, "next_cursor": next_cursor}
+
+    async def iter_invoice_page(self, user_id: str, limit: int = 20, cursor: Optional[str] = None,
+                                columns: str = INVOICE_SUMMARY_COLUMNS,
+                                chunk_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """
+        The same page as get_invoice_page, read from PostgREST chunk_size rows at a
+        time and yielded as each chunk arrives, so large pages can be streamed
+        without holding them in memory. next_cursor is only set on the last chunk.
+        """
+        remaining = limit
+        while True:
+            chunk = await self.get_invoice_page(user_id, limit=min(chunk_size, remaining), cursor=cursor, columns=columns)
+            remaining -= len(chunk["invoices"])
+            cursor = chunk["next_cursor"]
+            if remaining <= 0 or cursor is None:
+                yield chunk
+                return
+            yield {"invoices": chunk["invoices"], "next_cursor": None}
+
     async def get_product_translations(self) -> Dict[str, str]:
         """Get product translations from database (future enhancement)"""
         try:
             # For now, return empty dict - will be implemented when translations table is created
-            # result = self.supabase.table("product_translations").select("*").execute()
-            # return {row['eng_name']: row['ar_name'] for row in result.data or []}
+            # rows = await self.rest.select("product_translations")
+            # return {row['eng_name']: row['ar_name'] for row in rows}
             return {}
         except Exception as e:
             logger.error(f"Error fetching translations: {e}")
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from clients import ClientRegistry, get_clients
+
+logger = logging.getLogger(__name__)
+
+EmbedFunction = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching embedder.
+    Concurrent embed() calls are collected for a short window (or until the
+    batch is full) and sent to OpenAI as one multi-input request. Each caller
+    gets its vector back through its own future.
+    """
+
+    def __init__(self, model: str = "text-embedding-ada-002", max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, embed_fn: Optional[EmbedFunction] = None,
+                 clients: Optional[ClientRegistry] = None):
+        self.model = model
+        self.clients = clients or get_clients()
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.embed_fn: EmbedFunction = embed_fn or self._request_embeddings
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._send_tasks: Set[asyncio.Task] = set()
+
+        # Counters
+        self.requests = 0
+        self.texts = 0
+
+        logger.info(f"Embedding batcher initialized (max_batch_size={self.max_batch_size}, max_wait_ms={max_wait_ms})")
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue one text and wait for its embedding"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush_now()
+        elif self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_after_delay())
+
+        return await future
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed several texts; they share batches with any concurrent callers"""
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def get_stats(self) -> Dict[str, float]:
+        """Return request counters"""
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.requests if self.requests else 0.0
+        }
+
+    async def _flush_after_delay(self):
+        try:
+            await asyncio.sleep(self.max_wait)
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+        self._flush_now()
+
+    def _flush_now(self):
+        """Send everything pending, split into requests of at most max_batch_size"""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.max_batch_size):
+            batch = pending[start:start + self.max_batch_size]
+            task = asyncio.get_running_loop().create_task(self._send(batch))
+            # Keep a reference so the task is not garbage collected mid-flight
+            self._send_tasks.add(task)
+            task.add_done_callback(self._send_tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Identical texts in the same window share one input slot
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            self.requests += 1
+            self.texts += len(unique_texts)
+            vectors = await self.embed_fn(unique_texts)
+            if len(vectors) != len(unique_texts):
+                raise ValueError(f"Expected {len(unique_texts)} embeddings, got {len(vectors)}")
+            by_text = dict(zip(unique_texts, vectors))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+        except Exception as e:
+            logger.error(f"Error in batched embedding request: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Default transport: one multi-input OpenAI embeddings request"""
+        async with self.clients.limit("openai_embeddings"):
+            response = await self.clients.async_openai().embeddings.create(
+                model=self.model,
+                input=texts
+            )
+        # The API may return items out of order; sort by index
+        items = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in items]
@@ -0,0 +1,318 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache for embedding vectors.
+    Entries are keyed by the embedding model plus a hash of the normalized text,
+    held in a bounded in-memory LRU and optionally persisted to a memory-mapped
+    file on disk so they survive restarts. Several worker processes can share
+    one cache_dir: appends are serialized by a file lock and every key line
+    records the row its vector was written to. Async callers should use the
+    a* methods, which keep the LRU lookup on the event loop but do disk reads
+    and writes (and the file lock) in a worker thread.
+    """
+
+    def __init__(self, max_entries: int = 10000, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir or None
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Guards the disk index, held across file I/O so the LRU lock never waits on it
+        self._disk_lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        # On-disk store: append-only float32 matrix + key index
+        self._dim: Optional[int] = None
+        self._disk_rows: Dict[str, int] = {}
+        self._disk_matrix: Optional[np.memmap] = None
+        # Bytes of keys.txt already indexed; other processes may append more
+        self._keys_offset = 0
+        self._keys_read = 0
+        if self.cache_dir:
+            self._open_disk_store()
+
+        logger.info(f"Embedding cache initialized (max_entries={max_entries}, disk={bool(self.cache_dir)})")
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Normalize text so trivially different spellings share a cache entry"""
+        return re.sub(r"\s+", " ", (text or "").strip()).lower()
+
+    def make_key(self, model: str, text: str) -> str:
+        """Build the cache key from the model name and normalized text"""
+        digest = hashlib.sha256(self.normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for text, or None on a miss"""
+        return self.get_many(model, [text])[0]
+
+    def put(self, model: str, text: str, vector: List[float]):
+        """Store an embedding in memory and, if enabled, on disk"""
+        key = self._store(model, text, vector)
+        if key and self.cache_dir:
+            self._put_disk(key, vector)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up several texts at once; misses are returned as None"""
+        keys = [self.make_key(model, text) for text in texts]
+        vectors = self._lookup_memory(keys)
+        if None in vectors:
+            self._lookup_disk(keys, vectors)
+        return vectors
+
+    async def aget(self, model: str, text: str) -> Optional[List[float]]:
+        """Async get: the disk store is read in a worker thread"""
+        return (await self.aget_many(model, [text]))[0]
+
+    async def aput(self, model: str, text: str, vector: List[float]):
+        """Async put: the disk append runs in a worker thread"""
+        key = self._store(model, text, vector)
+        if key and self.cache_dir:
+            await asyncio.to_thread(self._put_disk, key, vector)
+
+    async def aget_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Async get_many: memory hits are served on the loop, misses in one worker thread"""
+        keys = [self.make_key(model, text) for text in texts]
+        vectors = self._lookup_memory(keys)
+        if None in vectors:
+            if self.cache_dir:
+                await asyncio.to_thread(self._lookup_disk, keys, vectors)
+            else:
+                self._lookup_disk(keys, vectors)
+        return vectors
+
+    def clear(self):
+        """Drop all in-memory entries (the disk store is kept)"""
+        with self._lock:
+            self._memory.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current sizes"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk_rows),
+                "max_entries": self.max_entries
+            }
+
+    def _lookup_memory(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Serve keys from the LRU; misses are left as None"""
+        vectors = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                vectors.append(vector)
+        return vectors
+
+    def _lookup_disk(self, keys: List[str], vectors: List[Optional[List[float]]]):
+        """Fill the misses in vectors from the disk store (blocking)"""
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if self.cache_dir:
+            with self._disk_lock:
+                for i in missing:
+                    vectors[i] = self._read_disk(keys[i])
+        with self._lock:
+            for i in missing:
+                if vectors[i] is None:
+                    self.misses += 1
+                else:
+                    self._remember(keys[i], vectors[i])
+                    self.hits += 1
+                    self.disk_hits += 1
+
+    def _store(self, model: str, text: str, vector: List[float]) -> Optional[str]:
+        """Put an embedding in the LRU and return its key"""
+        if not vector:
+            return None
+        key = self.make_key(model, text)
+        with self._lock:
+            self._remember(key, list(vector))
+        return key
+
+    def _put_disk(self, key: str, vector: List[float]):
+        with self._disk_lock:
+            self._write_disk(key, vector)
+
+    def _remember(self, key: str, vector: List[float]):
+        """Insert into the LRU and evict the least recently used entries"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Disk store
+    # ------------------------------------------------------------------
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.cache_dir, "meta.json")
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.cache_dir, "keys.txt")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.cache_dir, "vectors.f32")
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.cache_dir, "write.lock")
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process writing to cache_dir"""
+        with open(self._lock_path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _open_disk_store(self):
+        """Load the key index and map the vector file"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_meta()
+            self._load_new_keys()
+            logger.info(f"Embedding disk cache opened with {len(self._disk_rows)} entries")
+        except Exception as e:
+            logger.error(f"Error opening embedding disk cache: {e}")
+            self._disk_rows = {}
+            self._disk_matrix = None
+
+    def _load_meta(self):
+        if self._dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                self._dim = json.load(f).get("dim")
+
+    def _load_new_keys(self):
+        """Index key lines appended since the last call (by this or another process)"""
+        if not self._dim or not os.path.exists(self._keys_path) or not os.path.exists(self._vectors_path):
+            return
+        # Nothing appended since the last call: skip reading the file
+        if os.path.getsize(self._keys_path) <= self._keys_offset:
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        # A line without its newline is still being written
+        data = data[:data.rfind(b"\n") + 1]
+        self._keys_offset += len(data)
+        # Ignore keys whose vectors were not fully written
+        complete_rows = os.path.getsize(self._vectors_path) // (self._dim * 4)
+        for line in data.decode("utf-8").splitlines():
+            key, _, row = line.strip().partition("\t")
+            if not key:
+                continue
+            # Lines without a row come from the old single-process format (row = line number)
+            row = int(row) if row else self._keys_read
+            self._keys_read += 1
+            if row < complete_rows:
+                self._disk_rows[key] = row
+
+    def _map_vectors(self):
+        """(Re)map the vector file so newly appended rows are visible"""
+        rows = os.path.getsize(self._vectors_path) // (self._dim * 4) if self._dim else 0
+        if rows == 0:
+            self._disk_matrix = None
+            return
+        self._disk_matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+
+    def _read_disk(self, key: str) -> Optional[List[float]]:
+        if not self.cache_dir:
+            return None
+        try:
+            row = self._disk_rows.get(key)
+            if row is None:
+                # Another worker may have written it since
+                self._load_meta()
+                self._load_new_keys()
+                row = self._disk_rows.get(key)
+                if row is None:
+                    return None
+            if self._disk_matrix is None or row >= self._disk_matrix.shape[0]:
+                self._map_vectors()
+            return self._disk_matrix[row].tolist()
+        except Exception as e:
+            logger.error(f"Error reading embedding disk cache: {e}")
+            return None
+
+    def _write_disk(self, key: str, vector: List[float]):
+        if not self.cache_dir or key in self._disk_rows:
+            return
+        try:
+            with self._file_lock():
+                self._load_meta()
+                if self._dim is None:
+                    self._dim = len(vector)
+                    # Replaced atomically, since readers open it without the lock
+                    tmp_path = f"{self._meta_path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump({"dim": self._dim}, f)
+                    os.replace(tmp_path, self._meta_path)
+                if len(vector) != self._dim:
+                    logger.warning(f"Skipping disk cache write: dimension {len(vector)} != {self._dim}")
+                    return
+                self._load_new_keys()
+                if key in self._disk_rows:
+                    return
+                row_bytes = self._dim * 4
+                with open(self._vectors_path, "ab") as f:
+                    f.seek(0, os.SEEK_END)
+                    row, partial = divmod(f.tell(), row_bytes)
+                    if partial:
+                        # Drop the torn row of a writer that crashed mid-append
+                        f.truncate(row * row_bytes)
+                    f.write(np.asarray(vector, dtype=np.float32).tobytes())
+                with open(self._keys_path, "ab") as f:
+                    # Everything before _keys_offset is whole lines; anything after it is the
+                    # unfinished key line of a writer that crashed mid-append
+                    if f.seek(0, os.SEEK_END) > self._keys_offset:
+                        f.truncate(self._keys_offset)
+                    f.write(f"{key}\t{row}\n".encode("utf-8"))
+                self._load_new_keys()
+        except Exception as e:
+            logger.error(f"Error writing embedding disk cache: {e}")
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from shared_state import MemoryBackend, StateBackend
+
+logger = logging.getLogger(__name__)
+
+# Product fields the enrichment prompt is built from; price, stock or shelf changes do not regenerate it
+PROMPT_FIELDS = ("name",)
+
+# State backend namespaces: generated entries per product name, and per-product generation claims
+ENTRY_NAMESPACE = "enrichment"
+CLAIM_NAMESPACE = "enrichment_claims"
+
+
+@dataclass
+class EnrichmentEntry:
+    text: str
+    fingerprint: str
+    updated_at: float = field(default_factory=time.time)
+
+
+class ProductEnrichmentCache:
+    """
+    Per-product cache for the OpenAI-generated product description
+    (ingredients, health benefits, tips). Entries are keyed by the product's
+    database name and refreshed only when a field the prompt uses changes.
+    Lookups never wait: a missing entry is generated in the background and
+    served from the next request on.
+    Generated entries are published to the state backend. Before calling
+    OpenAI a worker claims the product there, so with a shared backend each
+    product is generated once for all workers and the others adopt the result.
+    """
+
+    def __init__(self, generate: Callable[[str], Awaitable[str]],
+                 translate: Callable[[str], str], max_concurrency: int = 4,
+                 state: Optional[StateBackend] = None, claim_ttl: float = 120.0):
+        self.generate = generate
+        self.translate = translate
+        self.state = state or MemoryBackend()
+        # A claim outlives one generation; it expires if its worker dies mid-way
+        self.claim_ttl = claim_ttl
+        self.entries: Dict[str, EnrichmentEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.adopted = 0
+        self.errors = 0
+
+    @staticmethod
+    def fingerprint(product: Dict[str, Any]) -> str:
+        """Hash of the PROMPT_FIELDS of a product row"""
+        fields = {name: product.get(name) for name in PROMPT_FIELDS}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def seed(self, products: Dict[str, Dict[str, Any]]):
+        """Load precomputed entries ({name: {"text", "fingerprint"}}) from the enrichment store"""
+        for name, entry in products.items():
+            if entry.get("text"):
+                self.entries[name] = EnrichmentEntry(entry["text"], entry.get("fingerprint", ""))
+        logger.info(f"Seeded enrichment cache with {len(products)} products")
+
+    async def _adopt(self, name: str, fingerprint: str) -> Optional[EnrichmentEntry]:
+        """Take over an entry another worker published for this fingerprint"""
+        try:
+            value = await self.state.aget(ENTRY_NAMESPACE, name)
+        except Exception as e:
+            logger.error(f"Error reading shared enrichment for {name}: {e}")
+            return None
+        if not value or value.get("fingerprint") != fingerprint or not value.get("text"):
+            return None
+        entry = EnrichmentEntry(value["text"], fingerprint, value.get("updated_at", time.time()))
+        self.entries[name] = entry
+        self.adopted += 1
+        return entry
+
+    async def aget(self, product: Dict[str, Any]) -> Optional[str]:
+        """Return the cached enrichment; schedule generation if it is missing or the product changed"""
+        name = product.get('name', '')
+        fingerprint = self.fingerprint(product)
+        entry = self.entries.get(name)
+        if entry is None or entry.fingerprint != fingerprint:
+            entry = await self._adopt(name, fingerprint) or entry
+        if entry is None or entry.fingerprint != fingerprint:
+            self.schedule(product)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.text
+
+    def schedule(self, product: Dict[str, Any]) -> Optional[asyncio.Task]:
+        """Generate the product's enrichment in the background (once per product at a time)"""
+        name = product.get('name', '')
+        if not name:
+            return None
+        task = self._inflight.get(name)
+        if task is not None and not task.done():
+            return task
+        try:
+            task = asyncio.get_running_loop().create_task(self._refresh(product))
+        except RuntimeError:
+            return None
+        self._inflight[name] = task
+        return task
+
+    async def _refresh(self, product: Dict[str, Any]):
+        name = product['name']
+        fingerprint = self.fingerprint(product)
+        claim = f"{name}:{fingerprint}"
+        claimed = False
+        try:
+            if await self._adopt(name, fingerprint):
+                return
+            claimed = await self.state.aadd(CLAIM_NAMESPACE, claim, os.getpid(), ttl=self.claim_ttl)
+            if not claimed:
+                # Another worker is generating it; lookups adopt its entry once published
+                return
+            async with self._semaphore:
+                text = await self.generate(self.translate(name))
+            if text:
+                entry = EnrichmentEntry(text, fingerprint)
+                self.entries[name] = entry
+                await self.state.aset(ENTRY_NAMESPACE, name, {
+                    "text": entry.text, "fingerprint": entry.fingerprint, "updated_at": entry.updated_at
+                })
+                self.generated += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error generating enrichment for {name}: {e}")
+        finally:
+            if claimed:
+                try:
+                    await self.state.adelete(CLAIM_NAMESPACE, claim)
+                except Exception as e:
+                    logger.error(f"Error releasing enrichment claim for {name}: {e}")
+            self._inflight.pop(name, None)
+
+    async def precompute(self, products: List[Dict[str, Any]]):
+        """Bring the cache in line with the catalog: generate new/changed products, drop removed ones"""
+        names = {p.get('name') for p in products}
+        for name in [n for n in self.entries if n not in names]:
+            del self.entries[name]
+            try:
+                await self.state.adelete(ENTRY_NAMESPACE, name)
+            except Exception as e:
+                logger.error(f"Error deleting shared enrichment for {name}: {e}")
+
+        tasks = [
+            self.schedule(product)
+            for product in products
+            if product.get('name') and (
+                product['name'] not in self.entries
+                or self.entries[product['name']].fingerprint != self.fingerprint(product)
+            )
+        ]
+        tasks = [task for task in tasks if task is not None]
+        if tasks:
+            logger.info(f"Precomputing enrichment for {len(tasks)} products")
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "in_flight": sum(1 for task in self._inflight.values() if not task.done()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "adopted": self.adopted,
+            "errors": self.errors
+        }
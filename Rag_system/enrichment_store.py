@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from clients import get_clients
+from config import ENRICHMENT_STORE_PATH, PRODUCT_TRANSLATIONS
+from enrichment_cache import ProductEnrichmentCache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the prompt changes so existing stores are regenerated
+PROMPT_VERSION = 1
+ENRICHMENT_MODEL = "gpt-3.5-turbo"
+
+
+async def generate_enrichment(product_name: str) -> str:
+    """Generate the product description with OpenAI; raises on failure"""
+    prompt = f"""
+    أعطني معلومات مفيدة ومختصرة عن المنتج التالي: {product_name}
+
+    أريد معلومات عن:
+    - المكونات الرئيسية
+    - الفوائد الصحية
+    - القيمة الغذائية
+    - نصائح للاستهلاك
+    - معلومات عامة مثيرة للاهتمام
+
+    اكتب الإجابة باللغة العربية وبشكل مختصر ومفيد.
+    """
+
+    request = dict(
+        model=ENRICHMENT_MODEL,
+        messages=[
+            {"role": "system", "content": "أنت مساعد متخصص في معلومات المنتجات الغذائية. أعط معلومات دقيقة ومفيدة."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=300,
+        temperature=0.7
+    )
+
+    clients = get_clients()
+    async with clients.limit("openai_chat"):
+        response = await clients.async_openai().chat.completions.create(**request)
+    return response.choices[0].message.content.strip()
+
+
+class EnrichmentStore:
+    """
+    Versioned JSON file of precomputed product descriptions.
+    Built offline by the CLI below for every row in products, keyed by the
+    database name (the PRODUCT_TRANSLATIONS key) with the Arabic name and a
+    fingerprint of the fields the prompt uses alongside. Each build
+    increments the version.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self.prompt_version = PROMPT_VERSION
+        self.generated_at: Optional[str] = None
+        self.products: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "EnrichmentStore":
+        store = cls(path)
+        if not path or not os.path.exists(path):
+            return store
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            store.version = data.get("version", 0)
+            store.prompt_version = data.get("prompt_version", 0)
+            store.generated_at = data.get("generated_at")
+            store.products = data.get("products", {})
+            logger.info(f"Loaded enrichment store v{store.version} from {path} ({len(store.products)} products)")
+        except Exception as e:
+            logger.error(f"Error loading enrichment store {path}: {e}")
+        return store
+
+    def get(self, name: str) -> Optional[str]:
+        """Look up a description by database name or Arabic name"""
+        entry = self.products.get(name)
+        if entry is None:
+            entry = next((e for e in self.products.values() if e.get("ar_name") == name), None)
+        return entry.get("text") if entry else None
+
+    def is_current(self, product: Dict[str, Any]) -> bool:
+        entry = self.products.get(product.get("name", ""))
+        return (
+            entry is not None
+            and self.prompt_version == PROMPT_VERSION
+            and entry.get("fingerprint") == ProductEnrichmentCache.fingerprint(product)
+        )
+
+    def put(self, product: Dict[str, Any], text: str):
+        name = product["name"]
+        self.products[name] = {
+            "ar_name": PRODUCT_TRANSLATIONS.get(name, name),
+            "text": text,
+            "fingerprint": ProductEnrichmentCache.fingerprint(product),
+            "generated_at": datetime.now().isoformat()
+        }
+
+    def save(self):
+        """Write the next version atomically"""
+        self.version += 1
+        self.prompt_version = PROMPT_VERSION
+        self.generated_at = datetime.now().isoformat()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.version,
+                "prompt_version": self.prompt_version,
+                "model": ENRICHMENT_MODEL,
+                "generated_at": self.generated_at,
+                "products": self.products
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved enrichment store v{self.version} to {self.path} ({len(self.products)} products)")
+
+
+async def build_store(store: EnrichmentStore, products: List[Dict[str, Any]],
+                      concurrency: int = 4, force: bool = False) -> int:
+    """Generate descriptions for new or changed products; returns how many were generated"""
+    names = {p.get("name") for p in products}
+    for name in [n for n in store.products if n not in names]:
+        del store.products[name]
+
+    todo = [p for p in products if p.get("name") and (force or not store.is_current(p))]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def enrich(product: Dict[str, Any]) -> bool:
+        async with semaphore:
+            try:
+                name = product["name"]
+                text = await generate_enrichment(PRODUCT_TRANSLATIONS.get(name, name))
+                store.put(product, text)
+                logger.info(f"Generated enrichment for {name}")
+                return True
+            except Exception as e:
+                logger.error(f"Error generating enrichment for {product.get('name')}: {e}")
+                return False
+
+    results = await asyncio.gather(*(enrich(p) for p in todo))
+    return sum(results)
+
+
+async def _run(args):
+    clients = get_clients()
+    try:
+        products = await clients.supabase_rest().select("products")
+        store = EnrichmentStore.load(args.out)
+        generated = await build_store(store, products, concurrency=args.concurrency, force=args.force)
+    finally:
+        await clients.aclose()
+    if generated or len(store.products) != len(products) or not os.path.exists(args.out):
+        store.save()
+    print(f"Generated {generated} descriptions; store v{store.version} has {len(store.products)} products")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute product enrichment text for the whole catalog")
+    parser.add_argument("--out", default=ENRICHMENT_STORE_PATH,
+                        help="Enrichment store path (default: ENRICHMENT_STORE_PATH, relative to Rag_system/)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel OpenAI requests")
+    parser.add_argument("--force", action="store_true", help="Regenerate every product")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
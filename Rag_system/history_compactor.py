@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from memory_store import ConversationTurn, count_tokens, truncate_tokens
+from shared_state import MemoryBackend, StateBackend
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_LABEL = "ملخص المحادثة السابقة"
+
+# State backend namespace holding {"summary", "covered_until"} per user
+SUMMARY_NAMESPACE = "history_summary"
+
+
+@dataclass
+class SummaryState:
+    summary: str = ""
+    covered_until: float = 0.0  # created_at of the newest turn folded into the summary
+
+
+class HistoryCompactor:
+    """
+    Caps the conversation history sent to the RAG chain.
+    The last keep_turns turns are kept verbatim and older turns are folded
+    into a rolling per-user summary. The summary is updated incrementally in
+    a background task after a turn is saved, never while answering, and the
+    combined history is cut to token_budget tokens on every call.
+    get_llm returns the summarization LLM, so it is only built once needed.
+    Summaries live in the state backend, so with a shared backend any worker
+    can answer the user's next question; backend calls are awaited so its
+    I/O stays off the event loop.
+    """
+
+    def __init__(self, get_llm: Callable[[], Awaitable[Any]], keep_turns: int = 4, token_budget: int = 1200,
+                 summary_max_tokens: int = 300, state: Optional[StateBackend] = None,
+                 max_summaries: int = 1000):
+        self.get_llm = get_llm
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.state = state or MemoryBackend()
+        self.max_summaries = max_summaries
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        # Counters
+        self.summaries_built = 0
+        self.summary_errors = 0
+
+    async def _load(self, user_key: str) -> Optional[SummaryState]:
+        try:
+            value = await self.state.aget(SUMMARY_NAMESPACE, user_key)
+        except Exception as e:
+            logger.error(f"Error reading history summary for user {user_key}: {e}")
+            return None
+        return SummaryState(**value) if value else None
+
+    async def _store(self, user_key: str, state: SummaryState):
+        current = await self._load(user_key)
+        # Another worker may have folded in newer turns meanwhile
+        if current is not None and current.covered_until >= state.covered_until:
+            return
+        await self.state.aset(SUMMARY_NAMESPACE, user_key, {"summary": state.summary, "covered_until": state.covered_until})
+        await self.state.atrim(SUMMARY_NAMESPACE, self.max_summaries)
+
+    async def compact(self, user_key: str, turns: List[ConversationTurn]) -> List[Tuple[str, str]]:
+        """Return chat_history pairs: the rolling summary (if any) then the newest turns, within the budget"""
+        state = await self._load(user_key)
+        summary = truncate_tokens(state.summary, self.summary_max_tokens) if state else ""
+        budget = self.token_budget - count_tokens(summary)
+
+        recent = turns[-self.keep_turns:] if self.keep_turns > 0 else []
+        kept: List[Tuple[str, str]] = []
+        # Newest turns first, so the oldest verbatim turns are the ones dropped
+        for turn in reversed(recent):
+            if turn.tokens > budget:
+                break
+            kept.append((turn.question, turn.answer))
+            budget -= turn.tokens
+        kept.reverse()
+
+        if summary:
+            return [(SUMMARY_LABEL, summary)] + kept
+        return kept
+
+    def fit_turns(self, turns: List[ConversationTurn], max_tokens: int) -> List[ConversationTurn]:
+        """Newest turns that fit into max_tokens, oldest first"""
+        kept: List[ConversationTurn] = []
+        for turn in reversed(turns):
+            if turn.tokens > max_tokens:
+                break
+            kept.append(turn)
+            max_tokens -= turn.tokens
+        kept.reverse()
+        return kept
+
+    def schedule_update(self, user_key: str, turns: List[ConversationTurn]):
+        """Fold turns that left the verbatim window into the summary, in the background"""
+        older = turns[:-self.keep_turns] if self.keep_turns > 0 else list(turns)
+        if not older:
+            return
+
+        task = self._tasks.get(user_key)
+        if task is not None and not task.done():
+            # The running update will be followed by another one on the next turn
+            return
+        try:
+            self._tasks[user_key] = asyncio.get_running_loop().create_task(self._update(user_key, older))
+        except RuntimeError:
+            logger.debug("No running event loop; skipping history summarization")
+
+    async def _update(self, user_key: str, older: List[ConversationTurn]):
+        try:
+            await self._summarize(user_key, older)
+        finally:
+            self._tasks.pop(user_key, None)
+
+    async def _summarize(self, user_key: str, older: List[ConversationTurn]):
+        state = await self._load(user_key) or SummaryState()
+        # Only turns the stored summary does not cover yet
+        pending = [turn for turn in older if turn.created_at > state.covered_until]
+        if not pending:
+            return
+        transcript = "\n".join(f"المستخدم: {turn.question}\nالمساعد: {turn.answer}" for turn in pending)
+        prompt = f"""
+        لخص المحادثة التالية بين المستخدم ومساعد دكان فجن في فقرة قصيرة.
+        احتفظ بالمنتجات والأسعار والتفضيلات التي ذكرها المستخدم.
+
+        الملخص السابق:
+        {state.summary or "لا يوجد"}
+
+        المحادثة الجديدة:
+        {transcript}
+
+        اكتب الملخص المحدث باللغة العربية في أقل من {self.summary_max_tokens} كلمة.
+        """
+        try:
+            llm = await self.get_llm()
+            response = await llm.ainvoke(prompt)
+            summary = getattr(response, "content", str(response)).strip()
+            await self._store(user_key, SummaryState(
+                summary=truncate_tokens(summary, self.summary_max_tokens),
+                covered_until=pending[-1].created_at
+            ))
+            self.summaries_built += 1
+        except Exception as e:
+            self.summary_errors += 1
+            logger.error(f"Error summarizing history for user {user_key}: {e}")
+
+    async def forget(self, user_key: Optional[str] = None):
+        """Drop the summary of one user, or of everyone (when their history is cleared)"""
+        keys = [user_key] if user_key is not None else list(self._tasks)
+        for key in keys:
+            task = self._tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+        try:
+            await self.state.adelete(SUMMARY_NAMESPACE, user_key)
+        except Exception as e:
+            logger.error(f"Error deleting history summary: {e}")
+
+    async def aget_stats(self) -> Dict[str, Any]:
+        return {
+            "summaries": await self.state.acount(SUMMARY_NAMESPACE),
+            "pending_updates": sum(1 for task in self._tasks.values() if not task.done()),
+            "summaries_built": self.summaries_built,
+            "summary_errors": self.summary_errors,
+            "keep_turns": self.keep_turns,
+            "token_budget": self.token_budget,
+            "summary_max_tokens": self.summary_max_tokens
+        }
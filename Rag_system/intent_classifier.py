@@ -0,0 +1,188 @@
+import argparse
+import json
+import logging
+import math
+import os
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import INTENT_MODEL_PATH
+from keyword_matcher import normalize_arabic
+
+logger = logging.getLogger(__name__)
+
+
+class LocalIntentClassifier:
+    """
+    In-process intent classifier for RouterService.
+    Questions are turned into hashed character n-gram TF-IDF vectors and
+    scored against one centroid per category. Confidence is a softmax over
+    the centroid similarities with a temperature fitted on held-out data.
+    Trained offline from logged (question, category) pairs.
+    """
+
+    def __init__(self, dim: int = 2 ** 15, ngram_range: Tuple[int, int] = (2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.labels: List[str] = []
+        self.idf: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.temperature: float = 0.1
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _features(self, text: str) -> Dict[int, float]:
+        """Hashed character n-gram counts of the normalized text"""
+        text = f" {' '.join(normalize_arabic(text).split())} "
+        counts: Counter = Counter()
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                counts[zlib.crc32(text[i:i + n].encode("utf-8")) % self.dim] += 1
+        return counts
+
+    def _vectorize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sparse L2-normalized TF-IDF vector as (indices, values)"""
+        counts = self._features(text)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        if self.idf is not None:
+            values = values * self.idf[indices]
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            values = values / norm
+        return indices, values.astype(np.float32)
+
+    def _similarities(self, text: str, centroids: np.ndarray) -> np.ndarray:
+        indices, values = self._vectorize(text)
+        if indices.size == 0:
+            return np.zeros(centroids.shape[0], dtype=np.float32)
+        return centroids[:, indices] @ values
+
+    def _fit_centroids(self, questions: List[str], labels: List[str]) -> np.ndarray:
+        centroids = np.zeros((len(self.labels), self.dim), dtype=np.float32)
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        for question, label in zip(questions, labels):
+            indices, values = self._vectorize(question)
+            np.add.at(centroids[label_index[label]], indices, values)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return centroids / norms
+
+    def _fit_temperature(self, questions: List[str], labels: List[str], centroids: np.ndarray) -> float:
+        """Pick the softmax temperature that minimizes held-out negative log-likelihood"""
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        sims = np.stack([self._similarities(q, centroids) for q in questions])
+        targets = np.array([label_index[label] for label in labels])
+        best_temperature, best_nll = self.temperature, math.inf
+        for temperature in np.geomspace(0.01, 1.0, 40):
+            logits = sims / temperature
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probs = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+            nll = -log_probs[np.arange(len(targets)), targets].mean()
+            if nll < best_nll:
+                best_temperature, best_nll = float(temperature), float(nll)
+        return best_temperature
+
+    def fit(self, questions: List[str], labels: List[str], holdout_fraction: float = 0.2, seed: int = 0):
+        """Train centroids and calibrate confidence from (question, category) pairs"""
+        if not questions or len(questions) != len(labels):
+            raise ValueError("fit() needs the same non-zero number of questions and labels")
+
+        self.labels = sorted(set(labels))
+
+        # Document frequencies over hashed n-grams
+        df = np.zeros(self.dim, dtype=np.float32)
+        for question in questions:
+            df[list(self._features(question).keys())] += 1
+        self.idf = (np.log((1 + len(questions)) / (1 + df)) + 1.0).astype(np.float32)
+
+        # Calibrate on a held-out split, then train the final centroids on everything
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(questions))
+        holdout = int(len(questions) * holdout_fraction)
+        if holdout >= len(self.labels):
+            held, train = order[:holdout], order[holdout:]
+            centroids = self._fit_centroids([questions[i] for i in train], [labels[i] for i in train])
+            self.temperature = self._fit_temperature(
+                [questions[i] for i in held], [labels[i] for i in held], centroids
+            )
+
+        self.centroids = self._fit_centroids(questions, labels)
+        logger.info(f"Trained intent classifier on {len(questions)} questions, "
+                    f"{len(self.labels)} categories, temperature={self.temperature:.3f}")
+        return self
+
+    def predict(self, question: str) -> Tuple[str, float]:
+        """Return the best category and its calibrated probability"""
+        if not self.is_trained:
+            return "unknown", 0.0
+        sims = self._similarities(question, self.centroids)
+        logits = sims / self.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            labels=np.array(self.labels),
+            idf=self.idf,
+            centroids=self.centroids,
+            temperature=np.array(self.temperature),
+            dim=np.array(self.dim),
+            ngram_range=np.array(self.ngram_range)
+        )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved intent classifier to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "LocalIntentClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            model = cls(dim=int(data["dim"]), ngram_range=tuple(int(n) for n in data["ngram_range"]))
+            model.labels = [str(label) for label in data["labels"]]
+            model.idf = data["idf"].astype(np.float32)
+            model.centroids = data["centroids"].astype(np.float32)
+            model.temperature = float(data["temperature"])
+        logger.info(f"Loaded intent classifier from {path} ({len(model.labels)} categories)")
+        return model
+
+
+def load_training_pairs(path: str) -> Tuple[List[str], List[str]]:
+    """Read (question, category) pairs from a JSONL classification log"""
+    questions, labels = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row = json.loads(line)
+            if row.get("question") and row.get("category"):
+                questions.append(row["question"])
+                labels.append(row["category"])
+    return questions, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local intent classifier from logged classifications")
+    parser.add_argument("--data", required=True, help="JSONL file with {\"question\", \"category\"} rows")
+    parser.add_argument("--out", default=INTENT_MODEL_PATH, help="Output model path (default: where the server loads it)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    questions, labels = load_training_pairs(args.data)
+    model = LocalIntentClassifier().fit(questions, labels)
+    model.save(args.out)
+
+
+if __name__ == "__main__":
+    main()
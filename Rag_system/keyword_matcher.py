@@ -0,0 +1,130 @@
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Set, Tuple
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Arabic letter folding applied to both keywords and questions.
+# Taa marbuta is deliberately not folded into haa: "سعرة" (calorie) and the
+# pronoun form "سعره" (its price) must stay distinct.
+_ARABIC_FOLDING = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ؤ": "و",
+    "ئ": "ي",
+    "ى": "ي",
+})
+
+# Tashkeel (harakat, tanween, shadda, sukun, dagger alef) and tatweel
+_ARABIC_MARKS = re.compile(r"[\u064B-\u0652\u0670\u0640]")
+
+
+def normalize_arabic(text: str) -> str:
+    """Lowercase and fold alef/hamza/alef-maqsura variants so spellings compare equal"""
+    if not text:
+        return ""
+    text = _ARABIC_MARKS.sub("", text.lower())
+    return text.translate(_ARABIC_FOLDING)
+
+
+def _normalized_chars(text: str) -> Iterator[Tuple[str, int]]:
+    """normalize_arabic one character at a time, keeping each character's offset in text"""
+    for offset, char in enumerate(text):
+        for lowered in char.lower():
+            if not _ARABIC_MARKS.match(lowered):
+                yield lowered.translate(_ARABIC_FOLDING), offset
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick multi-pattern matcher.
+    All keywords are compiled into one automaton, so a single pass over the
+    question returns the payload of every keyword it contains, together with
+    the text of the question it matched (as typed, before normalization).
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[Tuple[Hashable, int]]] = [set()]
+        self._built = False
+        self.keyword_count = 0
+
+    def add(self, keyword: str, payload: Hashable):
+        """Add a keyword; it is normalized before insertion"""
+        keyword = normalize_arabic(keyword).strip()
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].add((payload, len(keyword)))
+        self.keyword_count += 1
+        self._built = False
+
+    def add_many(self, keywords: Iterable[str], payload: Hashable):
+        for keyword in keywords:
+            self.add(keyword, payload)
+
+    def build(self):
+        """Compute failure links (breadth-first) and merge outputs along them"""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+        self._built = True
+        logger.info(f"Keyword matcher built with {self.keyword_count} keywords and {len(self._goto)} states")
+
+    def _scan(self, text: str) -> Iterator[Tuple[Hashable, int, int]]:
+        """Yield (payload, start, end) for every keyword occurrence; offsets index the original text"""
+        if not self._built:
+            self.build()
+
+        state = 0
+        offsets: List[int] = []
+        for char, offset in _normalized_chars(text):
+            offsets.append(offset)
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for payload, length in self._output[state]:
+                yield payload, offsets[-length], offset + 1
+
+    def find_all(self, text: str) -> Set[Hashable]:
+        """Return the payloads of every keyword found in text"""
+        return {payload for payload, _, _ in self._scan(text)}
+
+    def find_first(self, text: str) -> Dict[Hashable, Tuple[int, str]]:
+        """
+        Group matches by table: payloads are (table, index) tuples, and the
+        lowest index per table is returned so table order keeps its priority,
+        along with the leftmost text it matched in the question.
+        """
+        first: Dict[Hashable, Tuple[int, int, int]] = {}
+        for (table, index), start, end in self._scan(text):
+            if table not in first or (index, start) < first[table][:2]:
+                first[table] = (index, start, end)
+        return {table: (index, text[start:end]) for table, (index, start, end) in first.items()}
@@ -0,0 +1,87 @@
+import logging
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.callbacks import AsyncCallbackHandler
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from token_stream import TokenSink
+
+logger = logging.getLogger(__name__)
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain embeddings wrapper that consults the shared EmbeddingCache before
+    calling OpenAI, and routes async misses through the shared EmbeddingBatcher.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str,
+                 cache: Optional[EmbeddingCache] = None,
+                 batcher: Optional[EmbeddingBatcher] = None):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+        self.batcher = batcher
+
+    def _split(self, texts: List[str]):
+        if self.cache:
+            vectors = self.cache.get_many(self.model, texts)
+        else:
+            vectors = [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        return vectors, missing
+
+    async def _asplit(self, texts: List[str]):
+        if self.cache:
+            vectors = await self.cache.aget_many(self.model, texts)
+        else:
+            vectors = [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        return vectors, missing
+
+    def _fill(self, texts: List[str], vectors: List, missing: List[int], embedded: List[List[float]]) -> List[List[float]]:
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+            if self.cache:
+                self.cache.put(self.model, texts[i], vector)
+        return vectors
+
+    async def _afill(self, texts: List[str], vectors: List, missing: List[int], embedded: List[List[float]]) -> List[List[float]]:
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+            if self.cache:
+                await self.cache.aput(self.model, texts[i], vector)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, missing = self._split(texts)
+        if missing:
+            embedded = self.embeddings.embed_documents([texts[i] for i in missing])
+            self._fill(texts, vectors, missing, embedded)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors, missing = await self._asplit(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if self.batcher:
+                embedded = await self.batcher.embed_many(missing_texts)
+            else:
+                embedded = await self.embeddings.aembed_documents(missing_texts)
+            await self._afill(texts, vectors, missing, embedded)
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+class SinkCallbackHandler(AsyncCallbackHandler):
+    """Forwards streamed LLM tokens to the request's TokenSink"""
+
+    def __init__(self, sink: TokenSink):
+        self.sink = sink
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.sink.emit(token)
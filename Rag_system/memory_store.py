@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to a character estimate
+    _ENCODING = None
+
+logger = logging.getLogger(__name__)
+
+
+def count_tokens(text: str) -> int:
+    """Token count of text (tiktoken if installed, otherwise ~3 characters per token)"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text) // 3 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(text)
+        return text if len(tokens) <= max_tokens else _ENCODING.decode(tokens[:max_tokens])
+    return text[:max_tokens * 3]
+
+
+@dataclass
+class ConversationTurn:
+    question: str
+    answer: str
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.question) + count_tokens(self.answer)
+
+
+@dataclass
+class Conversation:
+    turns: List[ConversationTurn] = field(default_factory=list)
+    last_access: float = field(default_factory=time.monotonic)
+
+
+class ConversationMemoryStore:
+    """
+    Bounded per-user conversation history for RAGService.
+    Each user keeps at most max_turns turns and max_tokens tokens (oldest
+    turns are dropped first). Users idle for longer than idle_ttl are evicted
+    from memory, and at most max_users conversations are held in memory (least
+    recently used first out). With db_path set, turns are written to SQLite so
+    history survives restarts and evicted users are reloaded on their next
+    question; eviction never deletes persisted turns. With shared=True several
+    worker processes use the same SQLite file and every read reloads the
+    user's turns from it, so any worker can answer. Async callers use
+    aadd_turn/aget_turns/aclear, which run the SQLite I/O in a worker thread.
+    """
+
+    def __init__(self, max_turns: int = 20, max_tokens: int = 2000, idle_ttl: float = 1800.0,
+                 max_users: int = 1000, db_path: Optional[str] = None, shared: bool = False):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self.db_path = db_path or None
+        self.shared = shared and self.db_path is not None
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evict_listeners: List[Callable[[str], None]] = []
+        self._last_sweep = time.monotonic()
+
+        # Counters
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self.trimmed_turns = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if self.db_path:
+            self._open_db()
+
+        logger.info(f"Conversation memory store initialized (max_turns={max_turns}, max_tokens={max_tokens}, "
+                    f"idle_ttl={idle_ttl}s, max_users={max_users}, sqlite={bool(self.db_path)}, shared={self.shared})")
+
+    def _open_db(self):
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_turns ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_key TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS conversation_turns_user_idx ON conversation_turns (user_key, id)"
+        )
+        self._db.commit()
+
+    def add_evict_listener(self, listener: Callable[[str], None]):
+        """Register a callback invoked with the user key when a conversation is evicted"""
+        self._evict_listeners.append(listener)
+
+    def add_turn(self, user_key: str, question: str, answer: str) -> List[ConversationTurn]:
+        """Append a turn, trim the user's window to the turn and token limits and return the retained turns"""
+        turns, evicted = self._add_turn(user_key, question, answer)
+        self._notify_evicted(evicted)
+        return turns
+
+    async def aadd_turn(self, user_key: str, question: str, answer: str) -> List[ConversationTurn]:
+        """add_turn without blocking the event loop"""
+        turns, evicted = await asyncio.to_thread(self._add_turn, user_key, question, answer)
+        self._notify_evicted(evicted)
+        return turns
+
+    def _add_turn(self, user_key: str, question: str, answer: str) -> Tuple[List[ConversationTurn], List[str]]:
+        turn = ConversationTurn(question, answer)
+        evicted: List[str] = []
+        with self._lock:
+            conversation = self._load(user_key)
+            conversation.turns.append(turn)
+            self._trim(conversation)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT INTO conversation_turns (user_key, question, answer, created_at) VALUES (?, ?, ?, ?)",
+                    (user_key, question, answer, turn.created_at)
+                )
+                self._db.execute(
+                    "DELETE FROM conversation_turns WHERE user_key = ? AND id NOT IN "
+                    "(SELECT id FROM conversation_turns WHERE user_key = ? ORDER BY id DESC LIMIT ?)",
+                    (user_key, user_key, len(conversation.turns))
+                )
+                self._db.commit()
+            evicted.extend(self._evict_over_capacity())
+            evicted.extend(self._sweep_if_due())
+            turns = list(conversation.turns)
+        return turns, evicted
+
+    def get_turns(self, user_key: str) -> List[ConversationTurn]:
+        """Return the user's retained turns, oldest first"""
+        turns, evicted = self._get_turns(user_key)
+        self._notify_evicted(evicted)
+        return turns
+
+    async def aget_turns(self, user_key: str) -> List[ConversationTurn]:
+        """get_turns without blocking the event loop"""
+        if not self.shared and (user_key in self._conversations or self._db is None):
+            # Answered from memory: no I/O, no thread hop
+            return self.get_turns(user_key)
+        turns, evicted = await asyncio.to_thread(self._get_turns, user_key)
+        self._notify_evicted(evicted)
+        return turns
+
+    def _get_turns(self, user_key: str) -> Tuple[List[ConversationTurn], List[str]]:
+        with self._lock:
+            conversation = self._conversations.get(user_key)
+            if conversation is None and self._db is None:
+                return [], []
+            conversation = self._load(user_key)
+            evicted = self._evict_over_capacity()
+            return list(conversation.turns), evicted
+
+    def clear(self, user_key: Optional[str] = None):
+        """Forget one user's history, or everyone's"""
+        self._notify_evicted(self._clear(user_key))
+
+    async def aclear(self, user_key: Optional[str] = None):
+        """clear without blocking the event loop"""
+        self._notify_evicted(await asyncio.to_thread(self._clear, user_key))
+
+    def _clear(self, user_key: Optional[str]) -> List[str]:
+        with self._lock:
+            if user_key is None:
+                keys = list(self._conversations)
+                self._conversations.clear()
+                if self._db is not None:
+                    self._db.execute("DELETE FROM conversation_turns")
+                    self._db.commit()
+            else:
+                keys = [user_key]
+                self._conversations.pop(user_key, None)
+                if self._db is not None:
+                    self._db.execute("DELETE FROM conversation_turns WHERE user_key = ?", (user_key,))
+                    self._db.commit()
+        return keys
+
+    def evict_idle(self) -> int:
+        """Drop conversations idle for longer than idle_ttl; returns how many were evicted"""
+        with self._lock:
+            evicted = self._evict_idle()
+        self._notify_evicted(evicted)
+        return len(evicted)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return store size and eviction counters for monitoring"""
+        with self._lock:
+            return {
+                "users": len(self._conversations),
+                "turns": sum(len(c.turns) for c in self._conversations.values()),
+                "evicted_idle": self.evicted_idle,
+                "evicted_lru": self.evicted_lru,
+                "trimmed_turns": self.trimmed_turns,
+                "max_users": self.max_users,
+                "max_turns": self.max_turns,
+                "max_tokens": self.max_tokens,
+                "idle_ttl": self.idle_ttl,
+                "sqlite": bool(self.db_path),
+                "shared": self.shared
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _load(self, user_key: str) -> Conversation:
+        """Return the user's conversation (from memory, then SQLite) and mark it most recently used"""
+        conversation = self._conversations.get(user_key)
+        # Shared stores reload every time: another worker may have added turns
+        if conversation is None or self.shared:
+            conversation = conversation or Conversation()
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT question, answer, created_at FROM conversation_turns "
+                    "WHERE user_key = ? ORDER BY id DESC LIMIT ?",
+                    (user_key, self.max_turns)
+                ).fetchall()
+                conversation.turns = [ConversationTurn(q, a, t) for q, a, t in reversed(rows)]
+                self._trim(conversation)
+            self._conversations[user_key] = conversation
+        conversation.last_access = time.monotonic()
+        self._conversations.move_to_end(user_key)
+        return conversation
+
+    def _trim(self, conversation: Conversation):
+        """Drop the oldest turns beyond the turn window or token budget (the newest turn is always kept)"""
+        turns = conversation.turns
+        excess = max(0, len(turns) - self.max_turns)
+        total = sum(turn.tokens for turn in turns[excess:])
+        while excess < len(turns) - 1 and total > self.max_tokens:
+            total -= turns[excess].tokens
+            excess += 1
+        if excess:
+            del turns[:excess]
+            self.trimmed_turns += excess
+
+    def _evict_over_capacity(self) -> List[str]:
+        evicted = []
+        while len(self._conversations) > self.max_users:
+            user_key, _ = self._conversations.popitem(last=False)
+            evicted.append(user_key)
+            self.evicted_lru += 1
+        return evicted
+
+    def _evict_idle(self) -> List[str]:
+        """Drop idle conversations from memory; their persisted turns stay in SQLite (bounded by max_turns per user)"""
+        cutoff = time.monotonic() - self.idle_ttl
+        # OrderedDict is in access order, so idle users are at the front
+        evicted = []
+        for user_key, conversation in list(self._conversations.items()):
+            if conversation.last_access >= cutoff:
+                break
+            del self._conversations[user_key]
+            evicted.append(user_key)
+            self.evicted_idle += 1
+        return evicted
+
+    def _sweep_if_due(self) -> List[str]:
+        # Idle sweeps run at most every tenth of the TTL, piggybacking on writes
+        now = time.monotonic()
+        if now - self._last_sweep < self.idle_ttl / 10:
+            return []
+        self._last_sweep = now
+        return self._evict_idle()
+
+    def _notify_evicted(self, user_keys: List[str]):
+        for user_key in user_keys:
+            for listener in self._evict_listeners:
+                try:
+                    listener(user_key)
+                except Exception as e:
+                    logger.error(f"Error in memory eviction listener: {e}")
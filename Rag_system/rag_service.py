@@ -1,101 +1,195 @@
-from typing import Dict, List, Any, Optional
-from collections import defaultdict
+from typing import Dict, List, Any, Optional, Tuple
 import asyncio
-import openai
+import threading
+import uuid
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
 
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import SupabaseVectorStore
-from langchain.schema import Document
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 from config import RAGConfig
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from memory_store import ConversationMemoryStore, ConversationTurn
+from history_compactor import HistoryCompactor
+from token_stream import current_sink
+from enrichment_store import generate_enrichment
+from startup_timings import StartupTimings
+from clients import ClientRegistry, get_clients
+from shared_state import StateBackend
 
 logger = logging.getLogger(__name__)
 
+# Turns read during the current request, by user key (see RAGService.history_scope)
+_request_history: ContextVar[Optional[Dict[str, List[ConversationTurn]]]] = ContextVar("request_history", default=None)
+
 class RAGService:
-    def __init__(self, config: RAGConfig):
+    """
+    LangChain RAG answers over the Supabase vector store.
+    The LLMs, embeddings, vector store and chain (and the LangChain imports
+    themselves) are built on first use, off the event loop, so startup and
+    the non-RAG tiers never wait for them.
+    """
+
+    def __init__(self, config: RAGConfig, embedding_cache: Optional[EmbeddingCache] = None,
+                 embedding_batcher: Optional[EmbeddingBatcher] = None,
+                 memory_store: Optional[ConversationMemoryStore] = None,
+                 timings: Optional[StartupTimings] = None,
+                 clients: Optional[ClientRegistry] = None,
+                 state: Optional[StateBackend] = None):
         self.config = config
+        self.clients = clients or get_clients(config)
+        self.embedding_cache = embedding_cache
+        self.embedding_batcher = embedding_batcher
+        self.timings = timings or StartupTimings()
         self.llm = None
+        self.streaming_llm = None
         self.embeddings = None
         self.vector_store = None
-        self.chains = {}  # Store chains per user
-        # Per-user memory as suggested in the refactoring plan
-        self.memories = defaultdict(lambda: ConversationBufferMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            input_key="question",
-            output_key="answer"
-        ))
-        self._initialize()
-
-    def _initialize(self):
-        """Initialize LangChain components"""
-        try:
-            # OpenAI LLM
-            self.llm = ChatOpenAI(
-                model=self.config.model_name,
-                temperature=self.config.temperature,
-                max_tokens=self.config.max_tokens,
-                openai_api_key=self.config.openai_api_key,
-            )
-            logger.info("OpenAI LLM initialized")
+        self.chain = None  # One stateless chain shared by all users
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        # Per-user memory, bounded by turn window, token budget, idle TTL and user count
+        self.memory_store = memory_store or ConversationMemoryStore(
+            max_turns=config.memory_max_turns,
+            max_tokens=config.memory_max_tokens,
+            idle_ttl=config.memory_idle_ttl,
+            max_users=config.memory_max_users,
+            db_path=config.memory_db_path,
+            # Other workers write to the same file, so never trust the in-process copy
+            shared=config.workers > 1
+        )
+        
+        # Last K turns verbatim plus a rolling summary, within a token budget;
+        # summaries are kept in the state backend so every worker sees them
+        self.history_compactor = HistoryCompactor(
+            self.get_llm,
+            keep_turns=config.history_keep_turns,
+            token_budget=config.history_token_budget,
+            summary_max_tokens=config.history_summary_tokens,
+            state=state,
+            max_summaries=config.memory_max_users
+        )
 
-            # Embeddings
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=self.config.openai_api_key
-            )
-            logger.info("OpenAI Embeddings initialized")
-
-            # Vector store
-            self.vector_store = SupabaseVectorStore(
-                client=None,  # Will be set when needed
-                embedding=self.embeddings,
-                table_name=self.config.table_name,
-                query_name=self.config.query_name
-            )
-            logger.info("Vector store initialized")
+    @property
+    def is_initialized(self) -> bool:
+        return self._initialized
 
-        except Exception as e:
-            logger.error(f"Error initializing RAG service: {e}")
-            raise
+    async def ainitialize(self):
+        """Build the LangChain components in a worker thread (no-op once built)"""
+        if not self._initialized:
+            await asyncio.to_thread(self.initialize)
+
+    async def get_llm(self):
+        await self.ainitialize()
+        return self.llm
+
+    def initialize(self):
+        """Initialize LangChain components (thread-safe, runs once)"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            try:
+                with self.timings.phase("langchain_import"):
+                    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+                    from langchain_community.vectorstores import SupabaseVectorStore
+                    from langchain_adapters import CachedEmbeddings
+
+                with self.timings.phase("llm"):
+                    # Both LLMs use the shared pooled OpenAI clients
+                    openai_client = self.clients.openai()
+                    async_openai_client = self.clients.async_openai()
+                    # OpenAI LLM
+                    self.llm = ChatOpenAI(
+                        model=self.config.model_name,
+                        temperature=self.config.temperature,
+                        max_tokens=self.config.max_tokens,
+                        openai_api_key=self.config.openai_api_key,
+                        client=openai_client.chat.completions,
+                        async_client=async_openai_client.chat.completions
+                    )
+                    # Answers are generated with streaming so /ask/stream can forward tokens
+                    self.streaming_llm = ChatOpenAI(
+                        model=self.config.model_name,
+                        temperature=self.config.temperature,
+                        max_tokens=self.config.max_tokens,
+                        openai_api_key=self.config.openai_api_key,
+                        client=openai_client.chat.completions,
+                        async_client=async_openai_client.chat.completions,
+                        streaming=True
+                    )
+                logger.info("OpenAI LLM initialized")
+
+                with self.timings.phase("embeddings"):
+                    self.embeddings = OpenAIEmbeddings(
+                        model=self.config.embedding_model,
+                        openai_api_key=self.config.openai_api_key,
+                        client=openai_client.embeddings,
+                        async_client=async_openai_client.embeddings
+                    )
+                    if self.embedding_cache or self.embedding_batcher:
+                        self.embeddings = CachedEmbeddings(
+                            self.embeddings,
+                            self.config.embedding_model,
+                            cache=self.embedding_cache,
+                            batcher=self.embedding_batcher
+                        )
+                logger.info("OpenAI Embeddings initialized")
+
+                with self.timings.phase("vector_store"):
+                    self.vector_store = SupabaseVectorStore(
+                        client=self.clients.supabase(),
+                        embedding=self.embeddings,
+                        table_name=self.config.table_name,
+                        query_name=self.config.query_name
+                    )
+                logger.info("Vector store initialized")
+
+            except Exception as e:
+                logger.error(f"Error initializing RAG service: {e}")
+                raise
+
+            with self.timings.phase("rag_chain"):
+                self._build_chain()
+            self._initialized = True
 
     def get_chain(self, user_id: Optional[str] = None):
-        """Get conversational chain for specific user"""
-        user_key = user_id or "default"
-        
-        # Return existing chain if available
-        if user_key in self.chains:
-            return self.chains[user_key]
-        
-        # Create new chain for user
-        memory = self.memories[user_key]
-        
+        """
+        Get the shared conversational chain. It holds no per-user state:
+        each call passes the user's history from the memory store as chat_history.
+        """
+        if self.chain is None:
+            if self._initialized:
+                # Chain creation failed earlier; try again
+                with self._init_lock:
+                    if self.chain is None:
+                        self._build_chain()
+            else:
+                self.initialize()
+        return self.chain
+
+    def _build_chain(self):
+        from langchain.chains import ConversationalRetrievalChain
+
         try:
-            chain = ConversationalRetrievalChain.from_llm(
-                llm=self.llm,
+            self.chain = ConversationalRetrievalChain.from_llm(
+                llm=self.streaming_llm,
+                condense_question_llm=self.llm,  # not streamed: its output is not part of the answer
                 retriever=self.vector_store.as_retriever(search_kwargs={"k": 5}),
-                memory=memory,
                 return_source_documents=True,
                 verbose=False,  # Set to False to reduce noise
                 output_key="answer"
             )
-            
-            # Store chain for this user
-            self.chains[user_key] = chain
-            logger.info(f"Created new chain for user {user_key}")
-            
-            return chain
+            logger.info("Created shared RAG chain")
             
         except Exception as e:
-            logger.error(f"Error creating chain for user {user_key}: {e}")
-            # Return a simple fallback
-            return None
+            logger.error(f"Error creating RAG chain: {e}")
+            # ask_rag answers with a fallback while the chain is missing
+            self.chain = None
 
     async def ask_rag(self, question: str, user_id: Optional[str] = None) -> Dict[str, Any]:
         """Ask question using RAG chain with context awareness"""
         try:
+            await self.ainitialize()
             chain = self.get_chain(user_id)
             
             if chain is None:
@@ -107,9 +201,18 @@ class RAGService:
                 }
             
             # Add context awareness to the question
-            context_aware_question = self._add_context_to_question(question, user_id)
+            context_aware_question = await self._add_context_to_question(question, user_id)
             
-            resp = await chain.ainvoke({"question": context_aware_question})
+            sink = current_sink()
+            if sink:
+                from langchain_adapters import SinkCallbackHandler
+            resp = await chain.ainvoke(
+                {
+                    "question": context_aware_question,
+                    "chat_history": await self.get_compacted_history(user_id)
+                },
+                config={"callbacks": [SinkCallbackHandler(sink)]} if sink else None
+            )
             
             return {
                 "answer": resp.get("answer", "عذراً، لا أستطيع الإجابة على هذا السؤال."),
@@ -129,23 +232,79 @@ class RAGService:
         """Get RAG response (alias for ask_rag)"""
         return await self.ask_rag(question, user_id)
 
-    def _add_context_to_question(self, question: str, user_id: Optional[str] = None) -> str:
+    async def prefetch_retrieval(self, question: str, user_id: Optional[str] = None):
+        """
+        Embed the retrieval query ahead of time so the RAG chain's lookup hits the
+        embedding cache. Only done without chat history: with history the chain
+        retrieves with an LLM-condensed question that is not known in advance.
+        """
+        if not self.embedding_cache or await self.get_compacted_history(user_id):
+            return
+        try:
+            await self.ainitialize()
+            from langchain_adapters import CachedEmbeddings
+            if not isinstance(self.embeddings, CachedEmbeddings):
+                return
+            query = await self._add_context_to_question(question, user_id)
+            await self.embeddings.aembed_query(query)
+        except Exception as e:
+            logger.warning(f"Retrieval prefetch failed: {e}")
+
+    @contextmanager
+    def history_scope(self):
+        """Within one request, each user's history is read from the memory store only once"""
+        token = _request_history.set({})
+        try:
+            yield
+        finally:
+            _request_history.reset(token)
+
+    async def load_turns(self, user_id: Optional[str] = None) -> List[ConversationTurn]:
+        """The user's retained turns, read off the event loop and reused for the rest of the request"""
+        user_key = user_id or "default"
+        memo = _request_history.get()
+        if memo is not None and user_key in memo:
+            return memo[user_key]
+        turns = await self.memory_store.aget_turns(user_key)
+        if memo is not None:
+            memo[user_key] = turns
+        return turns
+
+    async def save_turn(self, question: str, answer: str, user_id: Optional[str] = None):
+        """Record one question/answer exchange in the user's memory"""
+        user_key = user_id or "default"
+        turns = await self.memory_store.aadd_turn(user_key, question, answer)
+        memo = _request_history.get()
+        if memo is not None:
+            memo[user_key] = turns
+        self.history_compactor.schedule_update(user_key, turns)
+
+    async def get_chat_history(self, user_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        """Retained (question, answer) pairs for the user, oldest first"""
+        return [(turn.question, turn.answer) for turn in await self.load_turns(user_id)]
+
+    async def get_compacted_history(self, user_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        """History for the RAG prompts: rolling summary plus the newest turns, within the token budget"""
+        return await self.history_compactor.compact(user_id or "default", await self.load_turns(user_id))
+
+    async def _add_context_to_question(self, question: str, user_id: Optional[str] = None) -> str:
         """Add context awareness to questions with pronouns"""
         try:
             # Get recent conversation history
-            memory = self.memories[user_id or "default"]
-            if hasattr(memory, 'chat_memory') and memory.chat_memory.messages:
-                recent_messages = memory.chat_memory.messages[-4:]  # Last 2 exchanges
-                
+            turns = (await self.load_turns(user_id))[-2:]  # Last 2 exchanges
+            recent_turns = [
+                (turn.question, turn.answer)
+                for turn in self.history_compactor.fit_turns(turns, self.config.history_token_budget // 2)
+            ]
+            if recent_turns:
                 # Check for pronouns that need context
                 pronouns = ["هو", "هي", "هذا", "هذه", "سعره", "سعرها", "سعراته", "سعراتها"]
                 
                 if any(pronoun in question for pronoun in pronouns):
                     # Add context from recent conversation
                     context = ""
-                    for msg in recent_messages:
-                        if hasattr(msg, 'content'):
-                            context += f"{msg.content}\n"
+                    for user_message, ai_message in recent_turns:
+                        context += f"{user_message}\n{ai_message}\n"
                     
                     if context:
                         enhanced_question = f"سياق المحادثة السابقة:\n{context}\n\nالسؤال الحالي: {question}"
@@ -157,35 +316,14 @@ class RAGService:
             logger.error(f"Error adding context to question: {e}")
             return question
 
+    async def generate_product_info(self, product_name: str) -> str:
+        """Generate additional product information with OpenAI; raises on failure"""
+        return await generate_enrichment(product_name)
+
     async def get_product_info_from_web(self, product_name: str) -> str:
         """Get additional product information from OpenAI"""
         try:
-            prompt = f"""
-            أعطني معلومات مفيدة ومختصرة عن المنتج التالي: {product_name}
-            
-            أريد معلومات عن:
-            - المكونات الرئيسية
-            - الفوائد الصحية
-            - القيمة الغذائية
-            - نصائح للاستهلاك
-            - معلومات عامة مثيرة للاهتمام
-            
-            اكتب الإجابة باللغة العربية وبشكل مختصر ومفيد.
-            """
-            
-            response = await asyncio.to_thread(
-                openai.chat.completions.create,
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "أنت مساعد متخصص في معلومات المنتجات الغذائية. أعط معلومات دقيقة ومفيدة."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
-            
+            return await self.generate_product_info(product_name)
         except Exception as e:
             logger.error(f"Error getting product info from web: {e}")
             return "عذراً، لا يمكنني جلب معلومات إضافية عن هذا المنتج حالياً."
@@ -193,6 +331,10 @@ class RAGService:
     async def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
         """Add documents to vector store"""
         try:
+            from langchain.schema import Document
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+            await self.ainitialize()
             docs = []
             for doc in documents:
                 content = doc.get('content', '')
@@ -204,23 +346,30 @@ class RAGService:
                 chunk_overlap=self.config.chunk_overlap
             )
             split_docs = splitter.split_documents(docs)
-            self.vector_store.add_documents(split_docs)
+            if self.embedding_batcher:
+                # Embed all chunks through the batcher, then write the precomputed vectors
+                vectors = await self.embeddings.aembed_documents([d.page_content for d in split_docs])
+                ids = [str(uuid.uuid4()) for _ in split_docs]
+                self.vector_store.add_vectors(vectors, split_docs, ids)
+            else:
+                self.vector_store.add_documents(split_docs)
             logger.info(f"Added {len(split_docs)} chunks to vector store")
             return True
         except Exception as e:
             logger.error(f"Error adding documents: {e}")
             return False
 
-    def clear_memory(self, user_id: Optional[str] = None):
+    async def clear_memory(self, user_id: Optional[str] = None):
         """Clear conversation memory for specific user"""
         try:
             if user_id:
-                if user_id in self.memories:
-                    self.memories[user_id].clear()
-                    logger.info(f"Conversation memory cleared for user {user_id}")
+                await self.memory_store.aclear(user_id)
+                await self.history_compactor.forget(user_id)
+                logger.info(f"Conversation memory cleared for user {user_id}")
             else:
                 # Clear all memories
-                self.memories.clear()
+                await self.memory_store.aclear()
+                await self.history_compactor.forget()
                 logger.info("All conversation memories cleared")
         except Exception as e:
             logger.error(f"Error clearing memory: {e}")
@@ -228,18 +377,10 @@ class RAGService:
     async def get_conversation_history(self, user_id: Optional[str] = None) -> List[Dict[str, str]]:
         """Get conversation history for specific user"""
         try:
-            memory = self.memories[user_id or "default"]
-            history = []
-            
-            if hasattr(memory, 'chat_memory') and memory.chat_memory.messages:
-                messages = memory.chat_memory.messages
-                
-                for i in range(0, len(messages), 2):  # Process in pairs (human, ai)
-                    if i + 1 < len(messages):
-                        history.append({
-                            "question": messages[i].content if hasattr(messages[i], 'content') else str(messages[i]),
-                            "answer": messages[i + 1].content if hasattr(messages[i + 1], 'content') else str(messages[i + 1])
-                        })
+            history = [
+                {"question": question, "answer": answer}
+                for question, answer in await self.get_chat_history(user_id)
+            ]
             
             logger.info(f"Retrieved {len(history)} conversation pairs for user {user_id}")
             return history
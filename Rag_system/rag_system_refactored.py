@@ -1,12 +1,30 @@
 import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, List, Optional, Any
-from config import RAGConfig
+import os
+import time
+from typing import Dict, List, Optional, Any, AsyncIterator
+from config import RAGConfig, ROUTING_TIERS, CACHEABLE_METHODS, USER_SPECIFIC_QUERY_TYPES
 from db_service import DatabaseService
+from clients import get_clients
 from smart_service import SmartResponseService
 from rag_service import RAGService
 from semantic_service import SemanticSearchService
 from router_service import RouterService
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from response_cache import ResponseCache
+from shared_state import create_backend
+from startup_timings import StartupTimings
+from routing_engine import RoutingEngine, RoutingTier, RoutingDecision
+from intent_classifier import LocalIntentClassifier
+from classification_context import classification_scope
+from token_stream import TokenSink, token_stream
+from single_flight import SingleFlight
+from keyword_matcher import normalize_arabic
+from enrichment_cache import ProductEnrichmentCache
+from enrichment_store import EnrichmentStore, PROMPT_VERSION
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,29 +41,345 @@ class RefactoredSupabaseRAG:
     """
     
     def __init__(self, config: RAGConfig):
+        started = time.perf_counter()
         self.config = config
         self.logger = logging.getLogger(__name__)
+        # Duration of each startup phase, reported in /cache-stats
+        self.timings = StartupTimings()
+        
+        # State every API worker must agree on (answer cache, catalog data version)
+        self.shared_state = create_backend(config.shared_state_url)
+        if config.workers > 1 and not self.shared_state.shared:
+            self.logger.warning("Running several workers without SHARED_STATE_URL; caches are per worker")
+        
+        # One set of pooled Supabase/OpenAI clients for every service in the process
+        self.clients = get_clients(config)
+        
+        # Shared embedding cache used by every service that embeds text
+        self.embedding_cache = EmbeddingCache(
+            max_entries=config.embedding_cache_size,
+            cache_dir=config.embedding_cache_dir or None
+        )
+        self.embedding_batcher = EmbeddingBatcher(
+            model=config.embedding_model,
+            max_batch_size=config.embedding_batch_size,
+            max_wait_ms=config.embedding_batch_wait_ms,
+            clients=self.clients
+        )
         
         # Initialize all services
-        self.db_service = DatabaseService(config.supabase_url, config.supabase_key)
+        self.supabase_rest = self.clients.supabase_rest()
+        self.db_service = DatabaseService(
+            config.supabase_url,
+            config.supabase_key,
+            refresh_interval=config.catalog_refresh_interval,
+            max_staleness=config.catalog_max_staleness,
+            rest_client=self.supabase_rest,
+            state=self.shared_state,
+            version_ttl=config.data_version_ttl
+        )
         self.smart_service = SmartResponseService()
-        self.rag_service = RAGService(config)
+        self.rag_service = RAGService(
+            config,
+            embedding_cache=self.embedding_cache,
+            embedding_batcher=self.embedding_batcher,
+            timings=self.timings,
+            clients=self.clients,
+            state=self.shared_state
+        )
         
         # Initialize new services for enhanced understanding
         self.semantic_service = SemanticSearchService(
             config.openai_api_key, 
             config.supabase_url, 
-            config.supabase_key
+            config.supabase_key,
+            pattern_index_path=config.semantic_index_path or None,
+            embedding_model=config.embedding_model,
+            embedding_cache=self.embedding_cache,
+            embedding_batcher=self.embedding_batcher,
+            clients=self.clients,
+            min_similarity=config.semantic_min_similarity,
+            min_margin=config.semantic_min_margin
         )
         self.router_service = RouterService(
             config.openai_api_key, 
-            config.model_name
+            config.model_name,
+            local_classifier=None,  # loaded during warm_up
+            confidence_threshold=config.intent_confidence_threshold,
+            classification_log_path=config.classification_log_path or None,
+            clients=self.clients
         )
         
+        # Answer cache in front of the cascade, invalidated on catalog writes
+        self.response_cache = ResponseCache(
+            max_entries=config.response_cache_size,
+            ttl_seconds=config.response_cache_ttl,
+            backend=self.shared_state,
+            trim_interval=config.response_cache_trim_interval
+        )
+        self.db_service.add_change_listener(
+            lambda table: self.response_cache.ainvalidate(f"{table} changed")
+        )
+        
+        # Product descriptions, generated once per product and refreshed when it changes
+        self.enrichment_cache = ProductEnrichmentCache(
+            self.rag_service.generate_product_info,
+            self.smart_service.translate_product_name,
+            max_concurrency=config.enrichment_concurrency,
+            state=self.shared_state
+        )
+        self._background_tasks = set()
+        # Every worker refreshes its enrichment entries once its snapshot sees the change (one generates, the rest adopt)
+        self.db_service.add_snapshot_listener(self._on_catalog_change)
+        
+        self.routing_engine = self._build_routing_engine()
+        # Identical questions asked at the same time are routed once
+        self.question_flight = SingleFlight("ask_question")
+        
+        self.timings.record("construct", time.perf_counter() - started)
         self.logger.info("Refactored RAG system initialized with all three approaches")
 
+    def _load_enrichment_store(self):
+        """Seed the enrichment cache from the store built by `python enrichment_store.py`"""
+        store = EnrichmentStore.load(self.config.enrichment_store_path)
+        if store.products and store.prompt_version == PROMPT_VERSION:
+            self.enrichment_cache.seed(store.products)
+        elif store.products:
+            self.logger.warning("Enrichment store was built with an older prompt; regenerating on demand")
+
+    def _load_intent_classifier(self) -> Optional[LocalIntentClassifier]:
+        """Load the offline-trained intent classifier if one has been built"""
+        path = self.config.intent_model_path
+        if not path or not os.path.exists(path):
+            self.logger.info("No local intent model found, router will use the LLM")
+            return None
+        try:
+            return LocalIntentClassifier.load(path)
+        except Exception as e:
+            self.logger.error(f"Error loading intent classifier: {e}")
+            return None
+
+    async def warm_up(self):
+        """Load indexes and the catalog concurrently before serving traffic"""
+        try:
+            with self.timings.phase("warm_up"):
+                await asyncio.gather(
+                    self._timed("pattern_index", self.semantic_service.build_pattern_index()),
+                    self._timed("catalog_products", self.db_service.refresh_catalog("products")),
+                    self._timed("catalog_branches", self.db_service.refresh_catalog("branches")),
+                    self._timed("intent_classifier", asyncio.to_thread(self._install_intent_classifier)),
+                    self._timed("enrichment_store", asyncio.to_thread(self._load_enrichment_store))
+                )
+            self.db_service.start_background_refresh()
+            # LangChain and the RAG chain are built in the background; only RAG answers wait for them
+            self._run_in_background(self._initialize_rag_service())
+            # Enrichment for the whole catalog is filled in without delaying startup
+            self._run_in_background(self._precompute_enrichment())
+        except Exception as e:
+            self.logger.error(f"Error warming up RAG system: {e}")
+
+    async def _timed(self, phase: str, awaitable):
+        with self.timings.phase(phase):
+            return await awaitable
+
+    def _install_intent_classifier(self):
+        self.router_service.local_classifier = self._load_intent_classifier()
+
+    async def _initialize_rag_service(self):
+        try:
+            await self.rag_service.ainitialize()
+        except Exception as e:
+            self.logger.error(f"Error initializing RAG service: {e}")
+
+    def _run_in_background(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _precompute_enrichment(self):
+        try:
+            products = await self.db_service.get_products()
+            await self.enrichment_cache.precompute(products)
+        except Exception as e:
+            self.logger.error(f"Error precomputing product enrichment: {e}")
+
+    def _on_catalog_change(self, table: str):
+        """Regenerate enrichment for new or changed products"""
+        if table != "products":
+            return
+        try:
+            self._run_in_background(self._precompute_enrichment())
+        except RuntimeError:
+            # No running loop; the next lookup schedules missing entries instead
+            pass
+
+    async def shutdown(self):
+        """Stop background tasks"""
+        try:
+            for task in list(self._background_tasks):
+                task.cancel()
+            await self.db_service.stop_background_refresh()
+            await self.clients.aclose()
+            self.rag_service.memory_store.close()
+            self.shared_state.close()
+        except Exception as e:
+            self.logger.error(f"Error shutting down RAG system: {e}")
+
+    async def get_cache_stats(self) -> Dict[str, Any]:
+        """Get cache statistics for monitoring"""
+        return {
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "embedding_batcher": self.embedding_batcher.get_stats(),
+            "response_cache": await self.response_cache.aget_stats(),
+            "catalog_snapshot": self.db_service.get_catalog_stats(),
+            "worker": {"pid": os.getpid(), "workers": self.config.workers},
+            "startup": {
+                "phases_ms": self.timings.as_dict(),
+                "rag_initialized": self.rag_service.is_initialized
+            },
+            "supabase_rest": self.supabase_rest.get_stats(),
+            "clients": self.clients.get_stats(),
+            "conversation_memory": self.rag_service.memory_store.get_stats(),
+            "history_compactor": await self.rag_service.history_compactor.aget_stats(),
+            "product_enrichment": self.enrichment_cache.get_stats(),
+            "single_flight": {
+                flight.name: flight.get_stats()
+                for flight in (self.question_flight, self.db_service.flight, self.semantic_service.flight)
+            }
+        }
+
+    async def _cache_result(self, cache_key, result: Dict[str, Any], user_name: Optional[str] = None):
+        """Cache a deterministic answer; personalized, history-dependent, incomplete and failed answers are skipped"""
+        # "cacheable" is False for answers still missing parts (e.g. enrichment not ready yet)
+        cacheable = result.pop("cacheable", True)
+        query_type = result.pop("query_type", None)
+        if not cacheable or query_type in USER_SPECIFIC_QUERY_TYPES:
+            return
+        if result.get("method") not in CACHEABLE_METHODS or result.get("confidence", 0.0) <= 0.0:
+            return
+        # Keyword answers may embed the user's name, so only cache the anonymous variant
+        if result.get("method") == "keyword_matching" and user_name:
+            return
+        await self.response_cache.aput(cache_key, result)
+
+    def _build_routing_engine(self) -> RoutingEngine:
+        """Create the routing engine from the ROUTING_TIERS table in config.py"""
+        handlers = {
+            "keyword_matching": self._route_keyword_matching,
+            "smart_product_query": self._route_smart_product_query,
+            "database_query": self._route_database_query,
+            "retrieval_prefetch": self._route_retrieval_prefetch,
+            "semantic_search": self._route_semantic_search,
+            "llm_router": self._route_llm_router,
+            "rag_chain": self._route_rag_chain,
+        }
+        tiers = []
+        for name, settings in ROUTING_TIERS.items():
+            if name not in handlers or not settings.get("enabled", True):
+                continue
+            tiers.append(RoutingTier(
+                name=name,
+                handler=handlers[name],
+                stage=settings.get("stage", "local"),
+                cost=settings.get("cost", 0.0),
+                timeout=settings.get("timeout", 10.0),
+                min_confidence=settings.get("min_confidence", 0.0),
+                answers=settings.get("answers", True),
+                priority=settings.get("priority")
+            ))
+        return RoutingEngine(tiers, parallel_budget=self.config.routing_parallel_budget)
+
+    async def _route_keyword_matching(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        smart_response = self.smart_service.get_smart_response(question, user_name)
+        if not smart_response:
+            return None
+        return {
+            "answer": smart_response,
+            "source": "smart_response",
+            "confidence": 0.95,
+            "method": "keyword_matching"
+        }
+
+    async def _route_smart_product_query(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        smart_product_query = self.smart_service.get_smart_product_query(question)
+        if not smart_product_query:
+            return None
+        result = await self._handle_smart_product_query(smart_product_query, user_id)
+        if result:
+            result.setdefault("method", "smart_product_query")
+            # Pronoun questions depend on the user's history (USER_SPECIFIC_QUERY_TYPES)
+            result["query_type"] = smart_product_query
+        return result
+
+    async def _route_database_query(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        db_query = self.smart_service.get_database_query(question)
+        if not db_query:
+            return None
+        result = await self._handle_database_query(db_query, user_id)
+        if result:
+            result.setdefault("method", "database_query")
+            # Invoice answers (and the login prompt) belong to one user (USER_SPECIFIC_QUERY_TYPES)
+            result["query_type"] = db_query
+        return result
+
+    async def _route_retrieval_prefetch(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> None:
+        await self.rag_service.prefetch_retrieval(question, user_id)
+        return None
+
+    async def _route_semantic_search(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        semantic_response = await self.semantic_service.get_semantic_response(question)
+        if not semantic_response:
+            return None
+        return {
+            "answer": semantic_response,
+            "source": "semantic_search",
+            "confidence": 0.85,
+            "method": "semantic_search"
+        }
+
+    async def _route_llm_router(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        router_response = await self.router_service.get_router_response(question)
+        if not router_response:
+            return None
+        return {
+            "answer": router_response,
+            "source": "llm_router",
+            "confidence": 0.90,
+            "method": "llm_router"
+        }
+
+    async def _route_rag_chain(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        rag_result = await self.rag_service.get_rag_response(question, user_id)
+        if not rag_result:
+            return None
+        return {
+            "answer": rag_result["answer"],
+            "source": "rag_chain",
+            "confidence": rag_result.get("confidence", 0.7),
+            "method": "rag_chain"
+        }
+
+    async def _coalescing_key(self, question: str, user_id: Optional[str], user_name: Optional[str], data_version: int):
+        """Questions share a routing run when the text, name, catalog version and visible history all match"""
+        history = await self.rag_service.get_compacted_history(user_id)
+        history_key = hashlib.sha256(
+            json.dumps(history, ensure_ascii=False).encode("utf-8")
+        ).hexdigest() if history else ""
+        normalized = " ".join(normalize_arabic(question).split())
+        return (normalized, user_name or "", data_version, history_key)
+
+    async def _route(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> RoutingDecision:
+        # Classify each question once per request, shared by every tier
+        with classification_scope(question):
+            return await self.routing_engine.route(question, user_id, user_name)
+
     async def ask_question(self, question: str, user_id: Optional[str] = None, user_name: Optional[str] = None) -> Dict[str, Any]:
-        """Ask question using optimized approach: Keywords first, then LLM Router, then Semantic as fallback"""
+        """Ask question using the cost-aware router: cache, local matchers, concurrent remote tiers, then RAG"""
+        # The user's history is read once and shared by every tier
+        with self.rag_service.history_scope():
+            return await self._ask_question(question, user_id, user_name)
+
+    async def _ask_question(self, question: str, user_id: Optional[str], user_name: Optional[str]) -> Dict[str, Any]:
         try:
             if not question:
                 return {
@@ -55,76 +389,33 @@ class RefactoredSupabaseRAG:
                     "method": "error"
                 }
             
-            # Track which method was used
-            method_used = "unknown"
-            confidence = 0.0
-            
-            # Approach 1: Keyword Matching (Fastest) - Always try first
-            self.logger.info("Trying Approach 1: Keyword Matching")
-            smart_response = self.smart_service.get_smart_response(question, user_name)
-            if smart_response:
-                await self._save_to_memory(question, smart_response, user_id)
-                return {
-                    "answer": smart_response,
-                    "source": "smart_response",
-                    "confidence": 0.95,
-                    "method": "keyword_matching"
-                }
-            
-            # Approach 2: LLM Router (Fast and Intelligent) - Try second
-            self.logger.info("Trying Approach 2: LLM Router")
-            router_response = await self.router_service.get_router_response(question)
-            if router_response:
-                await self._save_to_memory(question, router_response, user_id)
-                return {
-                    "answer": router_response,
-                    "source": "llm_router",
-                    "confidence": 0.90,
-                    "method": "llm_router"
-                }
-            
-            # Approach 3: Semantic Search (Slow but thorough) - Only if needed
-            # Skip semantic search for now to prioritize speed
-            # self.logger.info("Trying Approach 3: Semantic Search")
-            # semantic_response = await self.semantic_service.get_semantic_response(question)
-            # if semantic_response:
-            #     await self._save_to_memory(question, semantic_response, user_id)
-            #     return {
-            #         "answer": semantic_response,
-            #         "source": "semantic_search",
-            #         "confidence": 0.85,
-            #         "method": "semantic_search"
-            #     }
-            
-            # If all approaches fail, try smart product queries
-            self.logger.info("Trying Smart Product Queries")
-            smart_product_query = self.smart_service.get_smart_product_query(question)
-            if smart_product_query:
-                result = await self._handle_smart_product_query(smart_product_query, user_id)
-                if result:
-                    await self._save_to_memory(question, result["answer"], user_id)
-                    return result
-            
-            # Try database queries
-            self.logger.info("Trying Database Queries")
-            db_query = self.smart_service.get_database_query(question)
-            if db_query:
-                result = await self._handle_database_query(db_query, user_id)
-                if result:
-                    await self._save_to_memory(question, result["answer"], user_id)
-                    return result
-            
-            # Final fallback: RAG Chain
-            self.logger.info("Trying RAG Chain (Final Fallback)")
-            rag_result = await self.rag_service.get_rag_response(question, user_id)
-            if rag_result:
-                await self._save_to_memory(question, rag_result["answer"], user_id)
-                return {
-                    "answer": rag_result["answer"],
-                    "source": "rag_chain",
-                    "confidence": rag_result.get("confidence", 0.7),
-                    "method": "rag_chain"
-                }
+            # Answer cache for deterministic tiers
+            # Read once; the cache key and the coalescing key share it
+            data_version = await self.db_service.get_data_version()
+            cache_key = self.response_cache.make_key(question, user_name, data_version)
+            cached = await self.response_cache.aget(cache_key)
+            if cached:
+                self.logger.info(f"Serving cached answer from tier {cached.get('method')}")
+                await self._save_to_memory(question, cached["answer"], user_id)
+                cached["cache_hit"] = True
+                return cached
+            
+            # Concurrent identical questions wait for one routing run
+            decision, shared = await self.question_flight.do(
+                await self._coalescing_key(question, user_id, user_name, data_version),
+                lambda: self._route(question, user_id, user_name)
+            )
+            if shared and decision.result and decision.result.get("query_type") in USER_SPECIFIC_QUERY_TYPES:
+                # The shared answer is specific to the other asker (e.g. their invoices)
+                decision = await self._route(question, user_id, user_name)
+            self.logger.info(f"Routed to tier {decision.tier} (timings: {decision.timings}, shared: {shared})")
+            
+            if decision.result:
+                # Copy: the decision may be shared with other waiters
+                result = dict(decision.result)
+                await self._save_to_memory(question, result["answer"], user_id)
+                await self._cache_result(cache_key, result, user_name)
+                return result
             
             # If nothing works, return default response
             default_response = "عذراً، لا أستطيع فهم سؤالك. هل يمكنك إعادة صياغته بطريقة أخرى؟"
@@ -145,6 +436,45 @@ class RefactoredSupabaseRAG:
                 "method": "error"
             }
 
+    async def ask_question_stream(self, question: str, user_id: Optional[str] = None,
+                                  user_name: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streamed ask_question: yields {"event": "token", "data": text} as the answer
+        is generated, then one {"event": "done", "data": {...}} with the full answer
+        and its source/confidence/method. Tiers that cannot stream arrive as one token.
+        """
+        sink = TokenSink()
+        
+        async def answer() -> Dict[str, Any]:
+            with token_stream(sink):
+                try:
+                    return await self.ask_question(question, user_id, user_name)
+                finally:
+                    sink.close()
+        
+        task = asyncio.create_task(answer())
+        try:
+            async for text in sink:
+                yield {"event": "token", "data": text}
+            result = await task
+            if not sink.emitted:
+                yield {"event": "token", "data": result["answer"]}
+            yield {
+                "event": "done",
+                "data": {
+                    # The complete answer; it replaces any partial text streamed before a fallback
+                    "answer": result["answer"],
+                    "source": result.get("source"),
+                    "confidence": result.get("confidence", 0.0),
+                    "method": result.get("method"),
+                    "cache_hit": result.get("cache_hit", False)
+                }
+            }
+        finally:
+            if not task.done():
+                # Client went away
+                task.cancel()
+
     async def get_question_analysis(self, question: str) -> Dict[str, Any]:
         """Get detailed analysis of question using all three approaches"""
         try:
@@ -161,24 +491,27 @@ class RefactoredSupabaseRAG:
                 "confidence": 0.95 if smart_response else 0.0
             }
             
-            # Approach 2: Semantic Analysis
-            semantic_response = await self.semantic_service.get_semantic_response(question)
-            category, confidence = await self.semantic_service.classify_question_semantic(question)
-            analysis["approaches"]["semantic_search"] = {
-                "success": bool(semantic_response),
-                "response": semantic_response,
-                "category": category,
-                "confidence": confidence
-            }
-            
-            # Approach 3: LLM Router Analysis
-            router_response = await self.router_service.get_router_response(question)
-            intent = await self.router_service.get_question_intent(question)
-            analysis["approaches"]["llm_router"] = {
-                "success": bool(router_response),
-                "response": router_response,
-                "intent": intent
-            }
+            # The semantic and router calls below share one classification per question
+            with classification_scope(question):
+                # Approach 2: Semantic Analysis
+                semantic_response = await self.semantic_service.get_semantic_response(question)
+                category, confidence, margin = await self.semantic_service.classify_with_margin(question)
+                analysis["approaches"]["semantic_search"] = {
+                    "success": bool(semantic_response),
+                    "response": semantic_response,
+                    "category": category,
+                    "confidence": confidence,
+                    "margin": margin
+                }
+                
+                # Approach 3: LLM Router Analysis
+                router_response = await self.router_service.get_router_response(question)
+                intent = await self.router_service.get_question_intent(question)
+                analysis["approaches"]["llm_router"] = {
+                    "success": bool(router_response),
+                    "response": router_response,
+                    "intent": intent
+                }
             
             return analysis
             
@@ -200,7 +533,8 @@ class RefactoredSupabaseRAG:
             elif query_type.startswith("smart_product_query: product_info:"):
                 product_name = query_type.split(":", 2)[2]
                 products = await self.db_service.get_all_products()
-                product = next((p for p in products if self.smart_service.translate_product_name(p.get('name', '')).lower() == product_name.lower()), None)
+                wanted = normalize_arabic(product_name)
+                product = next((p for p in products if normalize_arabic(self.smart_service.translate_product_name(p.get('name', ''))) == wanted), None)
                 
                 if product:
                     return await self._format_product_info(product)
@@ -212,8 +546,7 @@ class RefactoredSupabaseRAG:
                     }
             
             elif query_type == "smart_product_query: juice_prices":
-                products = await self.db_service.get_all_products()
-                juice_products = [p for p in products if 'juice' in p.get('name', '').lower() or 'عصير' in self.smart_service.translate_product_name(p.get('name', '')).lower()]
+                juice_products = await self.db_service.get_products_in_category("juice")
                 
                 if juice_products:
                     result = "أسعار العصائر:\n"
@@ -235,8 +568,7 @@ class RefactoredSupabaseRAG:
                     }
             
             elif query_type == "smart_product_query: chips_prices":
-                products = await self.db_service.get_all_products()
-                chips_products = [p for p in products if 'chips' in p.get('name', '').lower() or 'شيبس' in self.smart_service.translate_product_name(p.get('name', '')).lower()]
+                chips_products = await self.db_service.get_products_in_category("chips")
                 
                 if chips_products:
                     result = "أسعار الشيبس:\n"
@@ -258,8 +590,7 @@ class RefactoredSupabaseRAG:
                     }
             
             elif query_type == "smart_product_query: milk_prices":
-                products = await self.db_service.get_all_products()
-                milk_products = [p for p in products if 'milk' in p.get('name', '').lower() or 'حليب' in self.smart_service.translate_product_name(p.get('name', '')).lower()]
+                milk_products = await self.db_service.get_products_in_category("milk")
                 
                 if milk_products:
                     result = "أسعار الحليب:\n"
@@ -281,8 +612,7 @@ class RefactoredSupabaseRAG:
                     }
             
             elif query_type == "smart_product_query: chocolate_prices":
-                products = await self.db_service.get_all_products()
-                chocolate_products = [p for p in products if 'chocolate' in p.get('name', '').lower() or 'شوكولاتة' in self.smart_service.translate_product_name(p.get('name', '')).lower()]
+                chocolate_products = await self.db_service.get_products_in_category("chocolate")
                 
                 if chocolate_products:
                     result = "أسعار الشوكولاتة:\n"
@@ -303,51 +633,27 @@ class RefactoredSupabaseRAG:
                         "confidence": 0.0
                     }
             
-            # Handle other smart product queries
-            products = await self.db_service.get_all_products()
-            
-            if query_type == "smart_product_query: highest_price":
-                if products:
-                    max_product = max(products, key=lambda x: x.get('price', 0))
-                    return await self._format_product_info(max_product)
-            
-            elif query_type == "smart_product_query: lowest_price":
-                if products:
-                    min_product = min(products, key=lambda x: x.get('price', 0))
-                    return await self._format_product_info(min_product)
-            
-            elif query_type == "smart_product_query: highest_calories":
-                if products:
-                    max_product = self.smart_service.get_highest_calorie_product(products)
-                    if max_product and max_product.get('name'):  # Check if product has name
-                        return await self._format_product_info(max_product)
-                    else:
-                        return {
-                            "answer": "عذراً، لا أستطيع العثور على معلومات السعرات الحرارية للمنتجات",
-                            "source": "database",
-                            "confidence": 0.0
-                        }
-                else:
+            # Argmax/argmin queries are answered by Postgres (ORDER BY ... LIMIT 1)
+            extremes = {
+                "smart_product_query: highest_price": ("price", True),
+                "smart_product_query: lowest_price": ("price", False),
+                "smart_product_query: highest_calories": ("calories", True),
+                "smart_product_query: lowest_calories": ("calories", False),
+            }
+            if query_type in extremes:
+                field, highest = extremes[query_type]
+                product = await self.db_service.get_extreme_product(field, highest=highest)
+                if product and product.get('name'):  # Check if product has name
+                    return await self._format_product_info(product)
+                if not await self.db_service.get_all_products():
                     return {
                         "answer": "عذراً، لا توجد منتجات متوفرة حالياً",
                         "source": "database",
                         "confidence": 0.0
                     }
-            
-            elif query_type == "smart_product_query: lowest_calories":
-                if products:
-                    min_product = self.smart_service.get_lowest_calorie_product(products)
-                    if min_product and min_product.get('name'):  # Check if product has name
-                        return await self._format_product_info(min_product)
-                    else:
-                        return {
-                            "answer": "عذراً، لا أستطيع العثور على معلومات السعرات الحرارية للمنتجات",
-                            "source": "database",
-                            "confidence": 0.0
-                        }
-                else:
+                if field == "calories":
                     return {
-                        "answer": "عذراً، لا توجد منتجات متوفرة حالياً",
+                        "answer": "عذراً، لا أستطيع العثور على معلومات السعرات الحرارية للمنتجات",
                         "source": "database",
                         "confidence": 0.0
                     }
@@ -406,6 +712,33 @@ class RefactoredSupabaseRAG:
                         "confidence": 0.0
                     }
             
+            elif query_type == "user_invoices":
+                if not user_id:
+                    return {
+                        "answer": "عذراً، لا يمكنني عرض فواتيرك بدون تسجيل الدخول. يرجى تسجيل الدخول أولاً.",
+                        "source": "user_auth_required",
+                        "confidence": 1.0
+                    }
+                
+                # Only the summary columns shown in the answer, newest first
+                page = await self.db_service.get_invoice_page(user_id, limit=self.config.chat_invoice_limit)
+                invoices = page["invoices"]
+                if not invoices:
+                    return {
+                        "answer": "لا توجد فواتير لك حتى الآن.",
+                        "source": "database",
+                        "confidence": 1.0
+                    }
+                
+                result = f"آخر فواتيرك:\n{self.smart_service.format_invoices(invoices)}"
+                if page["next_cursor"]:
+                    result += "\n\n... ولديك فواتير أقدم يمكنك عرضها من صفحة الفواتير"
+                return {
+                    "answer": result,
+                    "source": "database",
+                    "confidence": 1.0
+                }
+            
             return None
             
         except Exception as e:
@@ -415,11 +748,8 @@ class RefactoredSupabaseRAG:
     async def _save_to_memory(self, question: str, answer: str, user_id: Optional[str] = None):
         """Save conversation to memory for context awareness"""
         try:
-            memory = self.rag_service.memories[user_id or "default"]
-            if hasattr(memory, 'chat_memory'):
-                memory.chat_memory.add_user_message(question)
-                memory.chat_memory.add_ai_message(answer)
-                self.logger.info(f"Saved conversation to memory for user {user_id}")
+            await self.rag_service.save_turn(question, answer, user_id)
+            self.logger.info(f"Saved conversation to memory for user {user_id}")
         except Exception as e:
             self.logger.error(f"Error saving to memory: {e}")
 
@@ -491,18 +821,17 @@ class RefactoredSupabaseRAG:
             if shelf:
                 result += f"📍 الموقع: {shelf}"
             
-            # Try to get additional info from web
-            try:
-                web_info = await self.rag_service.get_product_info_from_web(name)
-                if web_info:
-                    result += f"\n\n{web_info}"
-            except Exception as e:
-                self.logger.warning(f"Could not fetch web info for {name}: {e}")
+            # Additional info comes from the enrichment cache; the facts never wait for OpenAI
+            web_info = await self.enrichment_cache.aget(product)
+            if web_info:
+                result += f"\n\n{web_info}"
             
             return {
                 "answer": result,
                 "source": "database",
-                "confidence": 1.0
+                "confidence": 1.0,
+                # Answer again (with the description) once the enrichment is ready
+                "cacheable": bool(web_info)
             }
             
         except Exception as e:
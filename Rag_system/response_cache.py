@@ -0,0 +1,122 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from keyword_matcher import normalize_arabic
+from shared_state import MemoryBackend, StateBackend
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, bool, int]
+
+NAMESPACE = "answers"
+
+
+class ResponseCache:
+    """
+    TTL cache for deterministic answers from ask_question.
+    Entries are keyed by the normalized question, whether a user name was
+    supplied and the catalog data version, and remember which tier produced them.
+    Entries live in a StateBackend, so with a shared backend every API worker
+    serves the answers cached by the others. Counters are per process.
+    Backend calls are awaited so a shared backend's I/O stays off the event loop.
+
+    Eviction follows the backend: the in-process backend is LRU and is trimmed
+    on every write. A shared backend evicts the oldest written entries (FIFO),
+    since bumping recency on a hit would make every hit a cross-worker write,
+    and is only trimmed every trim_interval writes of this process, so it can
+    briefly hold up to workers * trim_interval entries above max_entries.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl_seconds: float = 300.0,
+                 backend: Optional[StateBackend] = None, trim_interval: int = 100):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend or MemoryBackend()
+        self.trim_interval = max(1, trim_interval)
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.hits_by_tier: Dict[str, int] = defaultdict(int)
+
+        logger.info(f"Response cache initialized (max_entries={max_entries}, ttl={ttl_seconds}s, "
+                    f"backend={type(self.backend).__name__})")
+
+    @staticmethod
+    def make_key(question: str, user_name: Optional[str], data_version: int) -> CacheKey:
+        """Build the cache key for a question"""
+        normalized = " ".join(normalize_arabic(question).split())
+        return (normalized, bool(user_name), data_version)
+
+    @staticmethod
+    def _backend_key(key: CacheKey) -> str:
+        return json.dumps(key, ensure_ascii=False)
+
+    async def aget(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result, or None if missing or expired"""
+        try:
+            result = await self.backend.aget(NAMESPACE, self._backend_key(key))
+        except Exception as e:
+            logger.error(f"Error reading response cache: {e}")
+            result = None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.hits_by_tier[result.get("method", "unknown")] += 1
+        return dict(result)
+
+    async def aput(self, key: CacheKey, result: Dict[str, Any]):
+        """Cache a result; the tier is taken from its 'method' field"""
+        try:
+            await self.backend.aset(NAMESPACE, self._backend_key(key), dict(result), ttl=self.ttl_seconds)
+            if self._trim_due():
+                await self.backend.atrim(NAMESPACE, self.max_entries)
+        except Exception as e:
+            logger.error(f"Error writing response cache: {e}")
+
+    def _trim_due(self) -> bool:
+        """A shared backend's trim is a write transaction, so only run it every trim_interval writes"""
+        if not self.backend.shared:
+            return True
+        with self._lock:
+            self._writes_since_trim += 1
+            if self._writes_since_trim < self.trim_interval:
+                return False
+            self._writes_since_trim = 0
+            return True
+
+    async def ainvalidate(self, reason: str = ""):
+        """Drop every cached answer (called when catalog data changes)"""
+        try:
+            await self.backend.adelete(NAMESPACE)
+        except Exception as e:
+            logger.error(f"Error invalidating response cache: {e}")
+        with self._lock:
+            self.invalidations += 1
+        logger.info(f"Response cache invalidated{': ' + reason if reason else ''}")
+
+    async def aget_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, including hits per serving tier"""
+        entries = await self.backend.acount(NAMESPACE)
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "hits_by_tier": dict(self.hits_by_tier),
+                "entries": entries,
+                "invalidations": self.invalidations,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "trim_interval": self.trim_interval,
+                "backend": self.backend.get_stats()
+            }
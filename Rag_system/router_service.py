@@ -1,8 +1,12 @@
-import openai
 import asyncio
-from typing import Dict, List, Optional, Any
+import json
+from typing import Dict, List, Optional, Any, Tuple
 import logging
 
+from intent_classifier import LocalIntentClassifier
+from classification_context import current_context
+from clients import ClientRegistry, get_clients
+
 logger = logging.getLogger(__name__)
 
 class RouterService:
@@ -11,12 +15,22 @@ class RouterService:
     Uses OpenAI LLM to classify incoming questions and provide appropriate responses.
     """
     
-    def __init__(self, openai_api_key: str, model_name: str = "gpt-3.5-turbo"):
+    def __init__(self, openai_api_key: str, model_name: str = "gpt-3.5-turbo",
+                 local_classifier: Optional[LocalIntentClassifier] = None,
+                 confidence_threshold: float = 0.6,
+                 classification_log_path: Optional[str] = None,
+                 clients: Optional[ClientRegistry] = None):
         self.openai_api_key = openai_api_key
         self.model_name = model_name
         
-        # Initialize OpenAI client
-        openai.api_key = openai_api_key
+        # Local classifier answers confident questions; the LLM is the fallback
+        self.local_classifier = local_classifier
+        self.confidence_threshold = confidence_threshold
+        # LLM classifications are logged here as training data for the local classifier
+        self.classification_log_path = classification_log_path
+        
+        # Shared pooled OpenAI client (the global openai module is left untouched)
+        self.clients = clients or get_clients()
         
         # Define question categories
         self.categories = [
@@ -56,21 +70,22 @@ class RouterService:
             Return only the category name, nothing else.
             """
             
-            response = await asyncio.to_thread(
-                openai.chat.completions.create,
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are a question classifier. Return only the category name."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=50,
-                temperature=0.1
-            )
+            async with self.clients.limit("openai_chat"):
+                response = await self.clients.async_openai().chat.completions.create(
+                    model=self.model_name,
+                    messages=[
+                        {"role": "system", "content": "You are a question classifier. Return only the category name."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=50,
+                    temperature=0.1
+                )
             
             category = response.choices[0].message.content.strip().lower()
             
             # Validate category
             if category in self.categories:
+                await self._log_classification(question, category)
                 return category
             else:
                 return "general_info"  # Default fallback
@@ -79,10 +94,53 @@ class RouterService:
             logger.error(f"Error in LLM classification: {e}")
             return "general_info"
 
+    async def _log_classification(self, question: str, category: str):
+        """Append an LLM classification to the training log, off the event loop"""
+        if not self.classification_log_path:
+            return
+        line = json.dumps({"question": question, "category": category}, ensure_ascii=False) + "\n"
+        try:
+            await asyncio.to_thread(self._append_log_line, line)
+        except Exception as e:
+            logger.error(f"Error logging classification: {e}")
+
+    def _append_log_line(self, line: str):
+        # One write per line on an O_APPEND file, so concurrent appends do not interleave
+        with open(self.classification_log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def classify_question_local(self, question: str) -> Tuple[str, float]:
+        """Classify question with the in-process classifier"""
+        if not self.local_classifier or not self.local_classifier.is_trained:
+            return "unknown", 0.0
+        try:
+            category, confidence = self.local_classifier.predict(question)
+            if category not in self.categories:
+                return "unknown", 0.0
+            return category, confidence
+        except Exception as e:
+            logger.error(f"Error in local classification: {e}")
+            return "unknown", 0.0
+
+    async def classify_question(self, question: str) -> Tuple[str, float]:
+        """Classify locally and fall back to the LLM only below the confidence threshold"""
+        context = current_context(question)
+        if context:
+            return await context.memoize("router_classification", lambda: self._classify_question(question))
+        return await self._classify_question(question)
+
+    async def _classify_question(self, question: str) -> Tuple[str, float]:
+        category, confidence = self.classify_question_local(question)
+        if confidence >= self.confidence_threshold:
+            return category, confidence
+        
+        category = await self.classify_question_llm(question)
+        return category, 0.9  # High confidence for LLM classification
+
     async def get_router_response(self, question: str) -> Optional[str]:
         """Get router response based on question classification"""
         try:
-            category = await self.classify_question_llm(question)
+            category, _ = await self.classify_question(question)
             
             # Define responses for each category
             responses = {
@@ -125,11 +183,11 @@ class RouterService:
     async def get_question_intent(self, question: str) -> Dict[str, Any]:
         """Get detailed intent analysis of the question"""
         try:
-            category = await self.classify_question_llm(question)
+            category, confidence = await self.classify_question(question)
             
             intent_analysis = {
                 "category": category,
-                "confidence": 0.9,  # High confidence for LLM classification
+                "confidence": confidence,
                 "requires_database": category in ["product_list", "product_price", "product_info", "location"],
                 "requires_smart_response": category in ["greeting", "thanks", "farewell", "weather", "date"],
                 "requires_rag": category == "general_info"
@@ -150,14 +208,14 @@ class RouterService:
     async def get_enhanced_classification(self, question: str) -> Dict[str, Any]:
         """Get enhanced classification with multiple approaches"""
         try:
-            # Basic LLM classification
-            category = await self.classify_question_llm(question)
+            # Basic classification (local first, LLM fallback)
+            category, confidence = await self.classify_question(question)
             
             # Enhanced analysis
             enhanced = {
                 "question": question,
                 "primary_category": category,
-                "confidence": 0.9,
+                "confidence": confidence,
                 "alternative_categories": [],
                 "keywords_detected": [],
                 "suggested_actions": []
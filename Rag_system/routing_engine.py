@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TierHandler = Callable[[str, Optional[str], Optional[str]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+@dataclass
+class RoutingTier:
+    name: str
+    handler: TierHandler
+    stage: str = "local"            # "local" tiers run sequentially, "remote" tiers run concurrently
+    cost: float = 0.0               # relative cost; cheaper tiers are tried (and preferred) first
+    timeout: float = 10.0           # seconds before the tier is abandoned
+    min_confidence: float = 0.0     # answers below this confidence are ignored
+    answers: bool = True            # False for side-effect tiers such as retrieval prefetch
+    priority: Optional[float] = None  # precedence among concurrent answers; defaults to cost
+
+    @property
+    def precedence(self) -> float:
+        return self.cost if self.priority is None else self.priority
+
+
+@dataclass
+class RoutingDecision:
+    result: Optional[Dict[str, Any]] = None
+    tier: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    cancelled: List[str] = field(default_factory=list)
+
+
+class RoutingEngine:
+    """
+    Cost-aware router for ask_question.
+    Local tiers (keyword tables, catalog lookups) run first in cost order. If
+    none answers, remote tiers within the parallel cost budget are started
+    together; the confident answer with the highest precedence (priority, else
+    cost) wins and the rest are cancelled. Remote tiers beyond the budget (the
+    RAG chain) run afterwards.
+    """
+
+    def __init__(self, tiers: List[RoutingTier], parallel_budget: float = 20.0):
+        self.tiers = sorted(tiers, key=lambda t: t.cost)
+        self.parallel_budget = parallel_budget
+
+    async def route(self, question: str, user_id: Optional[str] = None,
+                    user_name: Optional[str] = None) -> RoutingDecision:
+        decision = RoutingDecision()
+
+        # Stage 1: local matchers, cheapest first
+        for tier in (t for t in self.tiers if t.stage == "local"):
+            result = await self._run_tier(tier, question, user_id, user_name, decision)
+            if self._is_confident(tier, result):
+                decision.result, decision.tier = result, tier.name
+                return decision
+
+        # Stage 2: remote tiers that fit the parallel budget, started together
+        remote = [t for t in self.tiers if t.stage == "remote"]
+        parallel, deferred, spent = [], [], 0.0
+        for tier in remote:
+            if not parallel or spent + tier.cost <= self.parallel_budget:
+                parallel.append(tier)
+                spent += tier.cost
+            else:
+                deferred.append(tier)
+
+        winner = await self._race(parallel, question, user_id, user_name, decision)
+        if winner:
+            return decision
+
+        # Stage 3: expensive tiers, one at a time
+        for tier in deferred:
+            result = await self._run_tier(tier, question, user_id, user_name, decision)
+            if tier.answers and self._is_confident(tier, result):
+                decision.result, decision.tier = result, tier.name
+                return decision
+
+        return decision
+
+    async def _race(self, tiers: List[RoutingTier], question: str, user_id: Optional[str],
+                    user_name: Optional[str], decision: RoutingDecision) -> bool:
+        """Run tiers concurrently; accept the first confident answer in precedence order and cancel the losers"""
+        if not tiers:
+            return False
+
+        tasks = {
+            tier.name: asyncio.create_task(self._run_tier(tier, question, user_id, user_name, decision))
+            for tier in tiers
+        }
+        answering = sorted((t for t in tiers if t.answers), key=lambda t: t.precedence)
+        try:
+            for tier in answering:
+                # Tiers are awaited in precedence order, so a lower-precedence answer never wins
+                result = await tasks[tier.name]
+                if self._is_confident(tier, result):
+                    decision.result, decision.tier = result, tier.name
+                    return True
+            # No answer: let side-effect tiers (prefetch) finish for the deferred tiers
+            await asyncio.gather(*tasks.values())
+            return False
+        finally:
+            for name, task in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    decision.cancelled.append(name)
+            if decision.cancelled:
+                logger.info(f"Cancelled routing tiers: {', '.join(decision.cancelled)}")
+
+    async def _run_tier(self, tier: RoutingTier, question: str, user_id: Optional[str],
+                        user_name: Optional[str], decision: RoutingDecision) -> Optional[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(tier.handler(question, user_id, user_name), timeout=tier.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Routing tier '{tier.name}' timed out after {tier.timeout}s")
+            return None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in routing tier '{tier.name}': {e}")
+            return None
+        finally:
+            decision.timings[tier.name] = time.perf_counter() - start
+
+    @staticmethod
+    def _is_confident(tier: RoutingTier, result: Optional[Dict[str, Any]]) -> bool:
+        return bool(result) and result.get("confidence", 0.0) >= tier.min_confidence
@@ -1,9 +1,16 @@
-import openai
 import numpy as np
 from typing import Dict, List, Tuple, Optional, Any
 import logging
-from supabase import create_client, Client
 import asyncio
+import hashlib
+import json
+import os
+
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from classification_context import current_context
+from single_flight import SingleFlight
+from clients import ClientRegistry, get_clients
 
 logger = logging.getLogger(__name__)
 
@@ -13,16 +20,26 @@ class SemanticSearchService:
     Provides semantic understanding of questions beyond keyword matching.
     """
     
-    def __init__(self, openai_api_key: str, supabase_url: str, supabase_key: str):
+    def __init__(self, openai_api_key: str, supabase_url: str, supabase_key: str,
+                 pattern_index_path: Optional[str] = None,
+                 embedding_model: str = "text-embedding-ada-002",
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 embedding_batcher: Optional[EmbeddingBatcher] = None,
+                 clients: Optional[ClientRegistry] = None,
+                 min_similarity: float = 0.85, min_margin: float = 0.05):
         self.openai_api_key = openai_api_key
         self.supabase_url = supabase_url
         self.supabase_key = supabase_key
+        self.embedding_model = embedding_model
+        self.pattern_index_path = pattern_index_path
+        self.embedding_cache = embedding_cache
+        self.embedding_batcher = embedding_batcher
+        # A semantic answer needs a close best pattern that also beats every other category by min_margin
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
         
-        # Initialize OpenAI client
-        openai.api_key = openai_api_key
-        
-        # Initialize Supabase client
-        self.supabase: Client = create_client(supabase_url, supabase_key)
+        # Shared pooled OpenAI and Supabase REST clients
+        self.clients = clients or get_clients()
         
         # Define semantic patterns for different question categories
         self.semantic_patterns = {
@@ -52,21 +69,155 @@ class SemanticSearchService:
             ]
         }
         
+        # Precomputed pattern index: one normalized row per pattern
+        self._pattern_categories: List[str] = []
+        self._pattern_matrix: Optional[np.ndarray] = None
+        self._pattern_index_lock = asyncio.Lock()
+        
+        # Identical texts being embedded at the same moment share one request
+        self.flight = SingleFlight("embeddings")
+        
         logger.info("Semantic search service initialized")
 
     async def get_embeddings(self, text: str) -> List[float]:
-        """Get embeddings for text using OpenAI"""
+        """Get embeddings for text using OpenAI (served from the cache when possible)"""
+        context = current_context(text)
+        if context:
+            return await context.memoize("embedding", lambda: self._get_embeddings(text))
+        return await self._get_embeddings(text)
+
+    async def _get_embeddings(self, text: str) -> List[float]:
         try:
-            response = await asyncio.to_thread(
-                openai.embeddings.create,
-                model="text-embedding-ada-002",
-                input=text
-            )
-            return response.data[0].embedding
+            if self.embedding_cache:
+                cached = await self.embedding_cache.aget(self.embedding_model, text)
+                if cached is not None:
+                    return cached
+            
+            key = (self.embedding_model, " ".join(text.split()).lower())
+            embedding, _ = await self.flight.do(key, lambda: self._fetch_embedding(text))
+            return embedding
         except Exception as e:
             logger.error(f"Error getting embeddings: {e}")
             return []
 
+    async def _fetch_embedding(self, text: str) -> List[float]:
+        if self.embedding_batcher:
+            # Shares one multi-input request with concurrent callers
+            embedding = await self.embedding_batcher.embed(text)
+        else:
+            async with self.clients.limit("openai_embeddings"):
+                response = await self.clients.async_openai().embeddings.create(
+                    model=self.embedding_model,
+                    input=text
+                )
+            embedding = response.data[0].embedding
+        
+        if self.embedding_cache:
+            await self.embedding_cache.aput(self.embedding_model, text, embedding)
+        return embedding
+
+    async def get_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for several texts in a single OpenAI request"""
+        if not texts:
+            return []
+        try:
+            results: List[Optional[List[float]]] = [None] * len(texts)
+            if self.embedding_cache:
+                results = await self.embedding_cache.aget_many(self.embedding_model, texts)
+            
+            missing = [i for i, vector in enumerate(results) if vector is None]
+            if missing:
+                missing_texts = [texts[i] for i in missing]
+                if self.embedding_batcher:
+                    embeddings = await self.embedding_batcher.embed_many(missing_texts)
+                else:
+                    async with self.clients.limit("openai_embeddings"):
+                        response = await self.clients.async_openai().embeddings.create(
+                            model=self.embedding_model,
+                            input=missing_texts
+                        )
+                    # The API may return items out of order; sort by index
+                    items = sorted(response.data, key=lambda item: item.index)
+                    embeddings = [item.embedding for item in items]
+                for i, embedding in zip(missing, embeddings):
+                    results[i] = embedding
+                    if self.embedding_cache:
+                        await self.embedding_cache.aput(self.embedding_model, texts[i], embedding)
+            
+            return results
+        except Exception as e:
+            logger.error(f"Error getting batch embeddings: {e}")
+            return []
+
+    def _patterns_fingerprint(self) -> str:
+        """Hash of the model and pattern table, used to validate a persisted index"""
+        payload = json.dumps([self.embedding_model, self.semantic_patterns], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load_pattern_index(self) -> bool:
+        """Load the pattern index from disk if it matches the current patterns"""
+        if not self.pattern_index_path or not os.path.exists(self.pattern_index_path):
+            return False
+        try:
+            with np.load(self.pattern_index_path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != self._patterns_fingerprint():
+                    logger.info("Persisted pattern index is stale, rebuilding")
+                    return False
+                self._pattern_categories = [str(c) for c in data["categories"]]
+                self._pattern_matrix = data["matrix"].astype(np.float32)
+            logger.info(f"Loaded pattern index from {self.pattern_index_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading pattern index: {e}")
+            return False
+
+    def _save_pattern_index(self):
+        """Persist the pattern index so restarts skip the embedding request"""
+        if not self.pattern_index_path:
+            return
+        try:
+            tmp_path = f"{self.pattern_index_path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                fingerprint=np.array(self._patterns_fingerprint()),
+                categories=np.array(self._pattern_categories),
+                matrix=self._pattern_matrix
+            )
+            os.replace(tmp_path, self.pattern_index_path)
+            logger.info(f"Saved pattern index to {self.pattern_index_path}")
+        except Exception as e:
+            logger.error(f"Error saving pattern index: {e}")
+
+    async def build_pattern_index(self, force: bool = False) -> bool:
+        """Embed all semantic patterns once and keep them as a normalized matrix"""
+        async with self._pattern_index_lock:
+            if self._pattern_matrix is not None and not force:
+                return True
+            if not force and self._load_pattern_index():
+                return True
+            
+            categories = []
+            patterns = []
+            for category, category_patterns in self.semantic_patterns.items():
+                for pattern in category_patterns:
+                    categories.append(category)
+                    patterns.append(pattern)
+            
+            embeddings = await self.get_embeddings_batch(patterns)
+            if len(embeddings) != len(patterns):
+                logger.error("Could not build pattern index: embedding request failed")
+                return False
+            
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            
+            self._pattern_categories = categories
+            self._pattern_matrix = matrix / norms
+            self._save_pattern_index()
+            logger.info(f"Built pattern index with {len(patterns)} patterns")
+            return True
+
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """Calculate cosine similarity between two vectors"""
         try:
@@ -87,35 +238,52 @@ class SemanticSearchService:
 
     async def classify_question_semantic(self, question: str) -> Tuple[str, float]:
         """Classify question using semantic similarity"""
+        category, similarity, _ = await self.classify_with_margin(question)
+        return category, similarity
+
+    async def classify_with_margin(self, question: str) -> Tuple[str, float, float]:
+        """Best category, its similarity, and how far it is ahead of the best other category"""
+        context = current_context(question)
+        if context:
+            return await context.memoize("semantic_classification", lambda: self._classify_question_semantic(question))
+        return await self._classify_question_semantic(question)
+
+    async def _classify_question_semantic(self, question: str) -> Tuple[str, float, float]:
         try:
+            if not await self.build_pattern_index():
+                return "unknown", 0.0, 0.0
+            
             question_embedding = await self.get_embeddings(question)
             if not question_embedding:
-                return "unknown", 0.0
+                return "unknown", 0.0, 0.0
             
-            best_category = "unknown"
-            best_similarity = 0.0
+            query = np.asarray(question_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm == 0:
+                return "unknown", 0.0, 0.0
             
-            for category, patterns in self.semantic_patterns.items():
-                for pattern in patterns:
-                    pattern_embedding = await self.get_embeddings(pattern)
-                    if pattern_embedding:
-                        similarity = self.cosine_similarity(question_embedding, pattern_embedding)
-                        if similarity > best_similarity:
-                            best_similarity = similarity
-                            best_category = category
+            # Cosine similarity against every pattern in one matrix-vector product
+            scores = self._pattern_matrix @ (query / norm)
+            best = int(np.argmax(scores))
+            best_similarity = float(scores[best])
+            if best_similarity <= 0.0:
+                return "unknown", 0.0, 0.0
             
-            return best_category, best_similarity
+            category = self._pattern_categories[best]
+            others = [float(score) for score, other in zip(scores, self._pattern_categories) if other != category]
+            margin = best_similarity - max(others) if others else best_similarity
+            return category, best_similarity, margin
             
         except Exception as e:
             logger.error(f"Error in semantic classification: {e}")
-            return "unknown", 0.0
+            return "unknown", 0.0, 0.0
 
     async def get_semantic_response(self, question: str) -> Optional[str]:
         """Get semantic-based response for question"""
         try:
-            category, confidence = await self.classify_question_semantic(question)
+            category, confidence, margin = await self.classify_with_margin(question)
             
-            if confidence < 0.7:  # Low confidence threshold
+            if confidence < self.min_similarity or margin < self.min_margin:
                 return None
             
             # Return category-specific responses
@@ -148,8 +316,8 @@ class SemanticSearchService:
                 "embedding": embedding
             }
             
-            result = self.supabase.table("question_embeddings").insert(data).execute()
-            return bool(result.data)
+            rows = await self.clients.supabase_rest().insert("question_embeddings", data)
+            return bool(rows)
             
         except Exception as e:
             logger.error(f"Error storing question embedding: {e}")
@@ -163,16 +331,16 @@ class SemanticSearchService:
                 return []
             
             # Query vector store for similar questions
-            result = self.supabase.rpc(
+            rows = await self.clients.supabase_rest().rpc(
                 "match_question_embeddings",
                 {
                     "query_embedding": question_embedding,
                     "match_threshold": 0.7,
                     "match_count": limit
                 }
-            ).execute()
+            )
             
-            return result.data or []
+            return rows or []
             
         except Exception as e:
             logger.error(f"Error finding similar questions: {e}")
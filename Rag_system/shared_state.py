@@ -0,0 +1,295 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend(ABC):
+    """
+    Key/value store for state every API worker has to agree on (answer
+    cache entries, the catalog data version). Keys live in namespaces;
+    values are JSON-serializable and may expire after a TTL.
+    Async code uses the a* methods, which keep blocking I/O off the event loop.
+    """
+
+    # True when other processes see the same data
+    shared = False
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the value, or None if missing or expired"""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value, expiring after ttl seconds if given"""
+
+    @abstractmethod
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Atomically store a value only if the key is missing or expired; True if it was stored"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: Optional[str] = None):
+        """Delete one key, or the whole namespace when key is None"""
+
+    @abstractmethod
+    def incr(self, namespace: str, key: str) -> int:
+        """Atomically increment an integer counter; returns the new value"""
+
+    @abstractmethod
+    def trim(self, namespace: str, max_entries: int):
+        """Drop expired keys, then the oldest keys beyond max_entries"""
+
+    @abstractmethod
+    def count(self, namespace: str) -> int:
+        """Number of keys in the namespace"""
+
+    async def _run(self, method, *args):
+        """Run a blocking backend call in a worker thread"""
+        return await asyncio.to_thread(method, *args)
+
+    async def aget(self, namespace: str, key: str) -> Optional[Any]:
+        return await self._run(self.get, namespace, key)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        await self._run(self.set, namespace, key, value, ttl)
+
+    async def aadd(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return await self._run(self.add, namespace, key, value, ttl)
+
+    async def adelete(self, namespace: str, key: Optional[str] = None):
+        await self._run(self.delete, namespace, key)
+
+    async def aincr(self, namespace: str, key: str) -> int:
+        return await self._run(self.incr, namespace, key)
+
+    async def atrim(self, namespace: str, max_entries: int):
+        await self._run(self.trim, namespace, max_entries)
+
+    async def acount(self, namespace: str) -> int:
+        return await self._run(self.count, namespace)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "shared": self.shared}
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """In-process backend (single worker); namespaces are LRU ordered"""
+
+    async def _run(self, method, *args):
+        # Dictionary operations only; a thread hop would cost more than the call
+        return method(*args)
+
+    def __init__(self):
+        self._namespaces: Dict[str, "OrderedDict[str, Tuple[Optional[float], Any]]"] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            entry = entries.get(key) if entries else None
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = (expires_at, value)
+            entries.move_to_end(key)
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entry = entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] >= now):
+                return False
+            entries[key] = (now + ttl if ttl is not None else None, value)
+            entries.move_to_end(key)
+            return True
+
+    def delete(self, namespace: str, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._namespaces.pop(namespace, None)
+            else:
+                self._namespaces.get(namespace, {}).pop(key, None)
+
+    def incr(self, namespace: str, key: str) -> int:
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            _, value = entries.get(key, (None, 0))
+            entries[key] = (None, value + 1)
+            return value + 1
+
+    def trim(self, namespace: str, max_entries: int):
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            while entries and len(entries) > max_entries:
+                entries.popitem(last=False)
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return len(self._namespaces.get(namespace, {}))
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Backend shared by every worker process on the host through one SQLite
+    file (WAL mode). Put the file on tmpfs, e.g. /dev/shm, to keep it in memory.
+    Reads do not update recency, so trim() drops the oldest written keys.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout_ms / 1000)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS shared_state_updated_idx ON shared_state (namespace, updated_at)"
+        )
+        self._db.commit()
+        logger.info(f"Shared state backend opened at {path}")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM shared_state WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        # Wall clock, since expiry times are compared across processes
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO shared_state (namespace, key, value, expires_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False, default=str), expires_at, now)
+            )
+            self._db.commit()
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            # One transaction: the first write takes the database lock until commit
+            self._db.execute(
+                "DELETE FROM shared_state WHERE namespace = ? AND key = ? AND expires_at < ?",
+                (namespace, key, now)
+            )
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO shared_state (namespace, key, value, expires_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False, default=str), expires_at, now)
+            )
+            self._db.commit()
+        return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._db.execute("DELETE FROM shared_state WHERE namespace = ?", (namespace,))
+            else:
+                self._db.execute("DELETE FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key))
+            self._db.commit()
+
+    def incr(self, namespace: str, key: str) -> int:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO shared_state (namespace, key, value, expires_at, updated_at) "
+                "VALUES (?, ?, '1', NULL, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET "
+                "value = CAST(CAST(value AS INTEGER) + 1 AS TEXT), updated_at = excluded.updated_at",
+                (namespace, key, time.time())
+            )
+            (value,) = self._db.execute(
+                "SELECT value FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            self._db.commit()
+        return int(value)
+
+    def trim(self, namespace: str, max_entries: int):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM shared_state WHERE namespace = ? AND expires_at < ?", (namespace, time.time())
+            )
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM shared_state WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            if count > max_entries:
+                self._db.execute(
+                    "DELETE FROM shared_state WHERE namespace = ? AND key IN "
+                    "(SELECT key FROM shared_state WHERE namespace = ? ORDER BY updated_at LIMIT ?)",
+                    (namespace, namespace, count - max_entries)
+                )
+            self._db.commit()
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM shared_state WHERE namespace = ?", (namespace,)
+            ).fetchone()
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["path"] = self.path
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_backend(url: str) -> StateBackend:
+    """
+    Build the backend named by SHARED_STATE_URL:
+    "" or "memory://" for in-process state, "sqlite:///relative.db" or
+    "sqlite:////absolute/path.db" for a file shared by all workers.
+    """
+    if not url or url == "memory://":
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteBackend(path)
+    raise ValueError(f"Unsupported shared state URL: {url}")
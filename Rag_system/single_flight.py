@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for a key is in flight, later callers
+    with the same key await that call instead of starting their own.
+    The shared call is shielded, so a cancelled caller does not cancel it
+    for the others; it is cancelled once every caller has left.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+        # Counters
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when the result came from another caller's call"""
+        future = self._calls.get(key)
+        shared = future is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(factory())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.executed += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(future), shared
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not future.done():
+                # Last waiter gone: stop the paid call and let a later caller start afresh
+                future.cancel()
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # Retrieve the exception so an unawaited failure is not logged as "never retrieved"
+        if not future.cancelled():
+            future.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced
+        }
@@ -1,5 +1,7 @@
 from typing import Dict, List, Tuple, Callable, Optional, Any
-from config import SMART_RESPONSES, SMART_PRODUCT_QUERIES, PRODUCT_KEYWORDS, DATABASE_QUERIES, PRODUCT_TRANSLATIONS, REGEX_PATTERNS
+from config import SMART_RESPONSES, SMART_PRODUCT_QUERIES, PRODUCT_KEYWORDS, DATABASE_QUERIES, PRODUCT_TRANSLATIONS, REGEX_PATTERNS, CONTEXT_PRONOUNS
+from keyword_matcher import KeywordMatcher
+from functools import lru_cache
 import logging
 import re
 
@@ -8,6 +10,29 @@ logger = logging.getLogger(__name__)
 class SmartResponseService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        
+        # Keyword tables in lookup order; each table keeps its own priority order
+        self._smart_responses = list(SMART_RESPONSES.values())
+        self._smart_product_queries = list(SMART_PRODUCT_QUERIES.values())
+        self._database_queries = list(DATABASE_QUERIES.values())
+        self.matcher = self._build_matcher()
+        self._match = lru_cache(maxsize=1024)(self.matcher.find_first)
+
+    def _build_matcher(self) -> KeywordMatcher:
+        """Compile every keyword table from config.py into one automaton"""
+        matcher = KeywordMatcher()
+        for index, keywords in enumerate(SMART_RESPONSES):
+            matcher.add_many(keywords, ("smart_responses", index))
+        for index, pronoun in enumerate(CONTEXT_PRONOUNS):
+            matcher.add(pronoun, ("context_pronouns", index))
+        for index, keywords in enumerate(SMART_PRODUCT_QUERIES):
+            matcher.add_many(keywords, ("smart_product_queries", index))
+        for index, product in enumerate(PRODUCT_KEYWORDS):
+            matcher.add(product, ("product_keywords", index))
+        for index, keywords in enumerate(DATABASE_QUERIES):
+            matcher.add_many(keywords, ("database_queries", index))
+        matcher.build()
+        return matcher
 
     def get_smart_response(self, question: str, user_name: Optional[str] = None) -> Optional[str]:
         """Get smart response using configuration-based approach with regex support"""
@@ -21,10 +46,10 @@ class SmartResponseService:
         if regex_match:
             return regex_match
         
-        # Then check smart responses
-        for keywords, response_func in SMART_RESPONSES.items():
-            if any(keyword in q for keyword in keywords):
-                return response_func(user_name)
+        # Then check smart responses (first matching table entry wins)
+        match = self._match(q).get("smart_responses")
+        if match is not None:
+            return self._smart_responses[match[0]](user_name)
         
         return None
 
@@ -63,21 +88,22 @@ class SmartResponseService:
             return None
             
         q = question.lower().strip()
+        matches = self._match(q)
         
         # Check for context-aware questions (pronouns)
-        context_pronouns = ["هو", "هي", "هذا", "هذه", "سعره", "سعرها", "سعراته", "سعراتها", "كم سعره", "كم سعرها"]
-        if any(pronoun in q for pronoun in context_pronouns):
+        if "context_pronouns" in matches:
             return "smart_product_query: context_pronoun"
         
         # Check smart product queries with enhanced variations FIRST (higher priority)
-        for keywords, query_type in SMART_PRODUCT_QUERIES.items():
-            if any(keyword in q for keyword in keywords):
-                return f"smart_product_query: {query_type}"
+        match = matches.get("smart_product_queries")
+        if match is not None:
+            return f"smart_product_query: {self._smart_product_queries[match[0]]}"
         
-        # Enhanced product keyword matching with variations (lower priority)
-        for product in PRODUCT_KEYWORDS:
-            if product.lower() in q:
-                return f"smart_product_query: product_info:{product}"
+        # Enhanced product keyword matching with variations (lower priority);
+        # the payload carries the product name as the user typed it
+        match = matches.get("product_keywords")
+        if match is not None:
+            return f"smart_product_query: product_info:{match[1]}"
         
         return None
 
@@ -89,9 +115,9 @@ class SmartResponseService:
         q = question.lower().strip()
         
         # Check database queries with enhanced variations
-        for keywords, query_type in DATABASE_QUERIES.items():
-            if any(keyword in q for keyword in keywords):
-                return query_type
+        match = self._match(q).get("database_queries")
+        if match is not None:
+            return self._database_queries[match[0]]
         
         return None
 
@@ -124,13 +150,13 @@ class SmartResponseService:
             out.append(f"{i}. {b.get('name','')} - {b.get('address','')}")
         return "\n".join(out)
 
-    def format_invoices(self, invoices: List[Dict]) -> str:
-        """Format invoices for display"""
+    def format_invoices(self, invoices: List[Dict], start: int = 1) -> str:
+        """Format invoices for display; start is the number of the first one (for chunked pages)"""
         if not invoices:
             return "لا توجد فواتير لهذا المستخدم."
         
         out = []
-        for i, inv in enumerate(invoices, 1):
+        for i, inv in enumerate(invoices, start):
             out.append(f"{i}. ID: {inv.get('id','')}, المجموع: {inv.get('total_amount',0)} ر.س, الحالة: {inv.get('status','')}")
         return "\n".join(out)
 
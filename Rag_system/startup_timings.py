@@ -0,0 +1,37 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    """
+    Wall-clock duration of each startup phase (imports, client construction,
+    warm-up steps). Phases may run concurrently from several threads; the
+    totals are reported by /cache-stats and benchmark_startup.py.
+    """
+
+    def __init__(self):
+        self._phases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+        logger.info(f"Startup phase '{name}' took {seconds * 1000:.1f} ms")
+
+    def as_dict(self) -> Dict[str, float]:
+        """Phase durations in milliseconds, in the order the phases finished"""
+        with self._lock:
+            return {name: round(seconds * 1000, 1) for name, seconds in self._phases.items()}
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class SupabaseRESTError(Exception):
+    """Raised when PostgREST answers with an error status"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"PostgREST error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class SupabaseREST:
+    """
+    Async client for the Supabase REST (PostgREST) API.
+    All requests share one keep-alive connection pool, at most
+    max_concurrency requests are in flight at once, and every call has a
+    timeout, so a slow query only delays its own caller instead of the
+    event loop. rest_url can point at a plain local PostgREST for testing.
+    """
+
+    def __init__(self, supabase_url: str, supabase_key: str, rest_url: Optional[str] = None,
+                 max_connections: int = 20, max_concurrency: int = 10, timeout: float = 10.0):
+        self.rest_url = (rest_url or f"{supabase_url.rstrip('/')}/rest/v1").rstrip("/")
+        self.headers = {
+            "apikey": supabase_key,
+            "Authorization": f"Bearer {supabase_key}",
+            "Accept": "application/json"
+        }
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Counters
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+
+        logger.info(f"Supabase REST client initialized ({self.rest_url}, pool={max_connections}, "
+                    f"concurrency={max_concurrency}, timeout={timeout}s)")
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the pool belongs to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.rest_url,
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(self.timeout)
+            )
+        return self._client
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      json: Any = None, headers: Optional[Dict[str, str]] = None,
+                      timeout: Optional[float] = None) -> Any:
+        """Send one request through the shared pool and return the decoded JSON body"""
+        client = self._get_client()
+        async with self._semaphore:
+            self.requests += 1
+            self.in_flight += 1
+            try:
+                response = await client.request(
+                    method,
+                    path,
+                    params=params,
+                    json=json,
+                    headers=headers,
+                    timeout=timeout if timeout is not None else self.timeout
+                )
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+        if response.status_code >= 400:
+            self.errors += 1
+            raise SupabaseRESTError(response.status_code, response.text)
+        return response.json() if response.content else None
+
+    async def select(self, table: str, columns: str = "*", filters: Optional[Dict[str, str]] = None,
+                     order: Optional[str] = None, limit: Optional[int] = None,
+                     timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Read rows from a table. filters use PostgREST operators,
+        e.g. {"user_id": "eq.42"}; order is e.g. "price.desc".
+        """
+        params: Dict[str, Any] = {"select": columns}
+        params.update(filters or {})
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = limit
+        return await self.request("GET", f"/{table}", params=params, timeout=timeout) or []
+
+    async def insert(self, table: str, rows: Any, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Insert one row or a list of rows and return what was stored"""
+        return await self.request(
+            "POST",
+            f"/{table}",
+            json=rows,
+            headers={"Prefer": "return=representation"},
+            timeout=timeout
+        ) or []
+
+    async def rpc(self, function: str, params: Optional[Dict[str, Any]] = None,
+                  timeout: Optional[float] = None) -> Any:
+        """Call a Postgres function exposed by PostgREST"""
+        return await self.request("POST", f"/rpc/{function}", json=params or {}, timeout=timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return request counters for monitoring"""
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "max_connections": self.max_connections,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout
+        }
+
+    async def aclose(self):
+        """Close the connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
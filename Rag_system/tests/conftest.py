@@ -0,0 +1,27 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# The services import each other as top-level modules (from config import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """Stands in for shared_state's clocks so TTLs can expire without sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import shared_state
+
+    clock = Clock()
+    monkeypatch.setattr(shared_state, "time", SimpleNamespace(time=clock, monotonic=clock))
+    return clock
@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import json
+import uuid
+
+import pytest
+
+import db_service
+from config import PRODUCT_CATEGORY_TERMS, PRODUCT_TRANSLATIONS
+from db_service import DatabaseService
+
+EXTRA_NAMES = [
+    "Orange Juice", "عصير برتقال", "Milk Chocolate", "شوكولاتة داكنة", "CHIPS Salt",
+    'Say "Cheese" Chips', "back\\slash milk", "Water", "",
+]
+
+
+class FakeREST:
+    """Serves whole tables; filtered queries fail so query_products uses the snapshot"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.calls = []
+
+    async def select(self, table, columns="*", filters=None, order=None, limit=None, timeout=None):
+        self.calls.append((table, filters, order, limit))
+        if filters or order:
+            raise RuntimeError("PostgREST unavailable")
+        return [dict(row) for row in self.tables.get(table, [])]
+
+
+def _service(products):
+    return DatabaseService("", "", rest_client=FakeREST({"products": products}))
+
+
+def _split(text, separator=","):
+    """Split at separators outside double quotes and parentheses"""
+    parts, current, depth, quoted, escaped = [], "", 0, False, False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif quoted and char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == separator:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    assert not quoted and depth == 0, f"unbalanced filter: {text}"
+    return parts + [current]
+
+
+def _unquote(value):
+    if not value.startswith('"'):
+        return value
+    assert value.endswith('"') and len(value) > 1
+    out, escaped = "", False
+    for char in value[1:-1]:
+        if escaped or char != "\\":
+            out += char
+            escaped = False
+        else:
+            escaped = True
+    return out
+
+
+def _evaluate(filter_text, name):
+    """Evaluate the subset of PostgREST's or=(...) syntax _category_filter produces"""
+    assert filter_text.startswith("(") and filter_text.endswith(")")
+    for condition in _split(filter_text[1:-1]):
+        column, operator, value = condition.split(".", 2)
+        assert column == "name"
+        if operator == "ilike":
+            pattern = _unquote(value)
+            assert pattern.startswith("*") and pattern.endswith("*")
+            if pattern[1:-1].lower() in name.lower():
+                return True
+        elif operator == "in":
+            assert value.startswith("(") and value.endswith(")")
+            if name in [_unquote(item) for item in _split(value[1:-1])]:
+                return True
+        else:
+            raise AssertionError(f"unexpected operator {operator}")
+    return False
+
+
+@pytest.mark.parametrize("category", sorted(PRODUCT_CATEGORY_TERMS))
+def test_category_filter_selects_what_the_snapshot_fallback_selects(category):
+    service = _service([])
+    names = list(PRODUCT_TRANSLATIONS) + EXTRA_NAMES
+    in_filter = {name for name in names if _evaluate(DatabaseService._category_filter(category), name)}
+    in_snapshot = {name for name in names if service._matches_category({"name": name}, category)}
+    assert in_filter == in_snapshot
+    assert in_filter
+
+
+def test_category_filter_escapes_quotes_and_backslashes(monkeypatch):
+    names = {'Say "Cheese" Chips': "شيبس تشيز", "back\\slash": "شيبس مالح", "plain, (odd) name": "شيبس"}
+    monkeypatch.setattr(db_service, "PRODUCT_TRANSLATIONS", names)
+    filter_text = DatabaseService._category_filter("chips")
+    (in_list,) = [condition for condition in _split(filter_text[1:-1]) if condition.startswith("name.in.")]
+    assert [_unquote(item) for item in _split(in_list[len("name.in.("):-1])] == list(names)
+    assert all(_evaluate(filter_text, name) for name in names)
+
+
+@pytest.mark.parametrize("category", sorted(PRODUCT_CATEGORY_TERMS))
+def test_query_products_snapshot_fallback_matches_category_filter(category):
+    names = list(PRODUCT_TRANSLATIONS) + EXTRA_NAMES
+    products = [{"id": i, "name": name, "price": i % 7 or None} for i, name in enumerate(names)]
+    service = _service(products)
+
+    rows = asyncio.run(service.query_products(order_by="price", descending=True, category=category))
+
+    expected = [p for p in products if _evaluate(DatabaseService._category_filter(category), p["name"])]
+    assert sorted(p["id"] for p in rows) == sorted(p["id"] for p in expected)
+    prices = [p["price"] for p in rows]
+    present = [price for price in prices if price is not None]
+    # Descending with missing values last, as nullslast does in Postgres
+    assert prices == present + [None] * (len(prices) - len(present))
+    assert present == sorted(present, reverse=True)
+
+
+@pytest.mark.parametrize("invoice_id", [42, str(uuid.uuid4())])
+def test_invoice_cursor_round_trip(invoice_id):
+    invoice = {"timestamp": "2024-05-01T10:30:00+00:00", "id": invoice_id, "total_amount": 12}
+    cursor = DatabaseService.encode_invoice_cursor(invoice)
+    assert DatabaseService.decode_invoice_cursor(cursor) == [invoice["timestamp"], invoice_id]
+
+
+def _cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 at all!",
+    base64.urlsafe_b64encode(b"not json").decode("ascii"),
+    _cursor({"timestamp": "2024-05-01T10:30:00", "id": 1}),
+    _cursor(["2024-05-01T10:30:00"]),
+    _cursor([1714559400, 1]),
+    _cursor(["yesterday", 1]),
+    _cursor(['2024-05-01T10:30:00",id.gt.0', 1]),
+    _cursor(["2024-05-01T10:30:00", True]),
+    _cursor(["2024-05-01T10:30:00", "1) or (id.gt.0"]),
+    _cursor(["2024-05-01T10:30:00", None]),
+])
+def test_invoice_cursor_rejects_invalid_values(cursor):
+    with pytest.raises(ValueError):
+        DatabaseService.decode_invoice_cursor(cursor)
+
+
+class FakeInvoiceREST:
+    """Returns the given invoices (newest first) after the keyset filter, up to the limit"""
+
+    def __init__(self, invoices):
+        self.invoices = invoices
+        self.calls = []
+
+    async def select(self, table, columns="*", filters=None, order=None, limit=None, timeout=None):
+        assert table == "invoices" and order == "timestamp.desc,id.desc"
+        self.calls.append((dict(filters or {}), columns, limit))
+        rows = self.invoices
+        if filters and "or" in filters:
+            _, timestamp, _, _, _, invoice_id, _ = filters["or"].split('"')
+            rows = [r for r in rows if (r["timestamp"], r["id"]) < (timestamp, int(invoice_id))]
+        return rows[:limit]
+
+
+def test_invoice_page_fetches_one_extra_row_for_the_next_cursor():
+    invoices = [{"id": i, "timestamp": f"2024-05-{i:02d}T00:00:00"} for i in (9, 8, 7)]
+    rest = FakeInvoiceREST(invoices)
+    service = DatabaseService("", "", rest_client=rest)
+
+    page = asyncio.run(service.get_invoice_page("user-1", limit=2, columns="total_amount"))
+    assert page["invoices"] == invoices[:2]
+    assert DatabaseService.decode_invoice_cursor(page["next_cursor"]) == [invoices[1]["timestamp"], 8]
+    filters, columns, limit = rest.calls[-1]
+    assert filters == {"user_id": "eq.user-1"}
+    assert columns == "total_amount,timestamp,id"
+    assert limit == 3
+
+    last = asyncio.run(service.get_invoice_page("user-1", limit=5, cursor=page["next_cursor"]))
+    assert last["next_cursor"] is None
+    filters, _, _ = rest.calls[-1]
+    assert filters["or"] == '(timestamp.lt."2024-05-08T00:00:00",and(timestamp.eq."2024-05-08T00:00:00",id.lt."8"))'
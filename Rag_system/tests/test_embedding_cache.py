@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-ada-002"
+
+
+def _vector(i, dim=4):
+    return [float(i + j) for j in range(dim)]
+
+
+def test_memory_lru_and_normalized_keys():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put(MODEL, "Hello  World", _vector(1))
+    cache.put(MODEL, "second", _vector(2))
+    assert cache.get(MODEL, " hello world ") == _vector(1)
+    cache.put(MODEL, "third", _vector(3))
+    # "second" was least recently used
+    assert cache.get(MODEL, "second") is None
+    assert cache.get("other-model", "hello world") is None
+    assert cache.get_stats()["memory_entries"] == 2
+
+
+def test_disk_store_survives_restart(tmp_path):
+    EmbeddingCache(cache_dir=str(tmp_path)).put(MODEL, "persisted", _vector(5))
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    assert cache.get(MODEL, "persisted") == _vector(5)
+    assert cache.get_stats()["disk_hits"] == 1
+
+
+def test_async_methods_share_the_store(tmp_path):
+    writer = EmbeddingCache(cache_dir=str(tmp_path))
+    reader = EmbeddingCache(cache_dir=str(tmp_path))
+
+    async def main():
+        await writer.aput(MODEL, "a", _vector(1))
+        await writer.aput(MODEL, "b", _vector(2))
+        return await reader.aget(MODEL, "a"), await reader.aget_many(MODEL, ["b", "missing", "a"])
+
+    single, many = asyncio.run(main())
+    assert single == _vector(1)
+    assert many == [_vector(2), None, _vector(1)]
+    stats = reader.get_stats()
+    assert (stats["hits"], stats["misses"], stats["disk_hits"]) == (3, 1, 2)
+
+
+def test_interleaved_writers_keep_rows_aligned(tmp_path):
+    first = EmbeddingCache(cache_dir=str(tmp_path))
+    second = EmbeddingCache(cache_dir=str(tmp_path))
+    for i in range(6):
+        (first if i % 2 else second).put(MODEL, f"text {i}", _vector(i))
+    fresh = EmbeddingCache(cache_dir=str(tmp_path))
+    assert [fresh.get(MODEL, f"text {i}") for i in range(6)] == [_vector(i) for i in range(6)]
+
+
+def _write_many(cache_dir, worker):
+    cache = EmbeddingCache(cache_dir=cache_dir)
+    for i in range(25):
+        cache.put(MODEL, f"worker {worker} text {i}", _vector(worker * 100 + i))
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_concurrent_processes_append_without_corruption(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_write_many, args=(str(tmp_path), w)) for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    for w in range(4):
+        for i in range(25):
+            assert cache.get(MODEL, f"worker {w} text {i}") == _vector(w * 100 + i)
+    assert cache.get_stats()["disk_entries"] == 100
+
+
+def test_torn_vector_row_is_ignored_and_overwritten(tmp_path):
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    cache.put(MODEL, "complete", _vector(1))
+    # A writer crashed halfway through a vector, before writing its key line
+    with open(os.path.join(tmp_path, "vectors.f32"), "ab") as f:
+        f.write(np.asarray(_vector(9)[:2], dtype=np.float32).tobytes())
+
+    reader = EmbeddingCache(cache_dir=str(tmp_path))
+    assert reader.get(MODEL, "complete") == _vector(1)
+
+    # The next append truncates the torn row and takes its place
+    reader.put(MODEL, "after crash", _vector(2))
+    assert os.path.getsize(os.path.join(tmp_path, "vectors.f32")) == 2 * 4 * 4
+    fresh = EmbeddingCache(cache_dir=str(tmp_path))
+    assert fresh.get(MODEL, "complete") == _vector(1)
+    assert fresh.get(MODEL, "after crash") == _vector(2)
+
+
+def test_unfinished_key_line_is_ignored_and_overwritten(tmp_path):
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    cache.put(MODEL, "complete", _vector(1))
+    # A writer crashed after its vector but halfway through its key line
+    with open(os.path.join(tmp_path, "vectors.f32"), "ab") as f:
+        f.write(np.asarray(_vector(9), dtype=np.float32).tobytes())
+    with open(os.path.join(tmp_path, "keys.txt"), "a", encoding="utf-8") as f:
+        f.write(cache.make_key(MODEL, "unfinished"))
+
+    reader = EmbeddingCache(cache_dir=str(tmp_path))
+    assert reader.get(MODEL, "unfinished") is None
+
+    reader.put(MODEL, "after crash", _vector(2))
+    with open(os.path.join(tmp_path, "keys.txt"), encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 2
+    fresh = EmbeddingCache(cache_dir=str(tmp_path))
+    assert fresh.get(MODEL, "complete") == _vector(1)
+    assert fresh.get(MODEL, "after crash") == _vector(2)
+    assert fresh.get(MODEL, "unfinished") is None
+
+
+def test_key_line_ahead_of_its_vector_is_not_served(tmp_path):
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    cache.put(MODEL, "complete", _vector(1))
+    # Seen mid-append by a reader: the key line points past the last complete row
+    with open(os.path.join(tmp_path, "keys.txt"), "a", encoding="utf-8") as f:
+        f.write(f"{cache.make_key(MODEL, 'pending')}\t1\n")
+    reader = EmbeddingCache(cache_dir=str(tmp_path))
+    assert reader.get(MODEL, "pending") is None
+    assert reader.get(MODEL, "complete") == _vector(1)
+
+
+def test_mismatched_dimensions_are_not_written(tmp_path):
+    cache = EmbeddingCache(cache_dir=str(tmp_path))
+    cache.put(MODEL, "four", _vector(1))
+    cache.put(MODEL, "three", _vector(2, dim=3))
+    fresh = EmbeddingCache(cache_dir=str(tmp_path))
+    assert fresh.get(MODEL, "three") is None
+    assert fresh.get(MODEL, "four") == _vector(1)
@@ -0,0 +1,116 @@
+import asyncio
+
+from enrichment_cache import CLAIM_NAMESPACE, ENTRY_NAMESPACE, ProductEnrichmentCache
+from shared_state import MemoryBackend, SQLiteBackend
+
+
+class FakeGenerator:
+    def __init__(self, fail=False, delay=0.0):
+        self.calls = []
+        self.fail = fail
+        self.delay = delay
+
+    async def __call__(self, name):
+        self.calls.append(name)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("OpenAI unavailable")
+        return f"about {name}"
+
+
+def _cache(generate, **kwargs):
+    return ProductEnrichmentCache(generate, translate=lambda name: name.upper(), **kwargs)
+
+
+async def _settle(*caches):
+    for cache in caches:
+        await asyncio.gather(*list(cache._inflight.values()), return_exceptions=True)
+
+
+def test_miss_generates_in_the_background():
+    generate = FakeGenerator()
+    cache = _cache(generate)
+    product = {"name": "milk", "price": 5}
+
+    async def main():
+        first = await cache.aget(product)
+        await _settle(cache)
+        second = await cache.aget(dict(product, price=6))
+        return first, second
+
+    assert asyncio.run(main()) == (None, "about MILK")
+    # A price change does not touch the prompt, so nothing is regenerated
+    assert generate.calls == ["MILK"]
+    assert cache.get_stats()["generated"] == 1
+
+
+def test_seeded_entries_are_served_until_the_prompt_fields_change():
+    generate = FakeGenerator()
+    cache = _cache(generate)
+    product = {"name": "milk"}
+    cache.seed({"milk": {"text": "seeded", "fingerprint": cache.fingerprint(product)}})
+
+    async def main():
+        seeded = await cache.aget(product)
+        await _settle(cache)
+        cache.seed({"milk": {"text": "outdated", "fingerprint": "old"}})
+        stale = await cache.aget(product)
+        await _settle(cache)
+        return seeded, stale, await cache.aget(product)
+
+    # A changed product is served the old text while the new one is generated
+    assert asyncio.run(main()) == ("seeded", "outdated", "about MILK")
+    assert generate.calls == ["MILK"]
+
+
+def test_workers_sharing_a_backend_generate_each_product_once(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    generators = [FakeGenerator(delay=0.01) for _ in range(3)]
+    workers = [_cache(generate, state=backend) for generate in generators]
+    product = {"name": "juice"}
+
+    async def main():
+        for worker in workers:
+            worker.schedule(product)
+        await _settle(*workers)
+        return [await worker.aget(product) for worker in workers]
+
+    try:
+        assert asyncio.run(main()) == ["about JUICE"] * 3
+        assert sum(len(generate.calls) for generate in generators) == 1
+        assert sum(worker.get_stats()["adopted"] for worker in workers) == 2
+        assert backend.count(CLAIM_NAMESPACE) == 0
+    finally:
+        backend.close()
+
+
+def test_failed_generation_releases_its_claim():
+    state = MemoryBackend()
+    failing = _cache(FakeGenerator(fail=True), state=state)
+    retry = _cache(FakeGenerator(), state=state)
+    product = {"name": "chips"}
+
+    async def main():
+        await failing.schedule(product)
+        await retry.schedule(product)
+        return await retry.aget(product)
+
+    assert asyncio.run(main()) == "about CHIPS"
+    assert failing.get_stats()["errors"] == 1
+    assert state.count(CLAIM_NAMESPACE) == 0
+
+
+def test_precompute_follows_the_catalog():
+    state = MemoryBackend()
+    generate = FakeGenerator()
+    cache = _cache(generate, state=state)
+
+    async def main():
+        await cache.precompute([{"name": "milk"}, {"name": "juice"}, {"name": ""}])
+        await cache.precompute([{"name": "milk"}])
+
+    asyncio.run(main())
+    assert sorted(generate.calls) == ["JUICE", "MILK"]
+    assert list(cache.entries) == ["milk"]
+    assert state.get(ENTRY_NAMESPACE, "juice") is None
+    assert state.get(ENTRY_NAMESPACE, "milk")["text"] == "about MILK"
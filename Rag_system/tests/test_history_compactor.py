@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+from history_compactor import SUMMARY_LABEL, HistoryCompactor, SummaryState
+from memory_store import ConversationTurn
+
+
+class FakeLLM:
+    def __init__(self, fail=False):
+        self.prompts = []
+        self.fail = fail
+
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("LLM unavailable")
+        return SimpleNamespace(content=f"summary {len(self.prompts)}")
+
+
+def _compactor(llm, **kwargs):
+    async def get_llm():
+        return llm
+    return HistoryCompactor(get_llm, **kwargs)
+
+
+def _turns(count, start=0):
+    return [ConversationTurn(f"q{i}", f"a{i}", created_at=float(i + 1)) for i in range(start, start + count)]
+
+
+async def _drain(compactor):
+    while compactor._tasks:
+        await asyncio.gather(*compactor._tasks.values())
+
+
+def test_compact_keeps_the_newest_turns_within_budget():
+    compactor = _compactor(FakeLLM(), keep_turns=3, token_budget=10_000)
+    turns = _turns(5)
+    assert asyncio.run(compactor.compact("user", turns)) == [("q2", "a2"), ("q3", "a3"), ("q4", "a4")]
+
+    tight = _compactor(FakeLLM(), keep_turns=3, token_budget=turns[-1].tokens + turns[-2].tokens)
+    assert asyncio.run(tight.compact("user", turns)) == [("q3", "a3"), ("q4", "a4")]
+
+
+def test_older_turns_are_folded_into_the_summary_incrementally():
+    llm = FakeLLM()
+    compactor = _compactor(llm, keep_turns=2)
+
+    async def main():
+        compactor.schedule_update("user", _turns(2))
+        assert not compactor._tasks  # nothing left the verbatim window yet
+        compactor.schedule_update("user", _turns(4))
+        await _drain(compactor)
+        first = await compactor.compact("user", _turns(4))
+        compactor.schedule_update("user", _turns(6))
+        await _drain(compactor)
+        return first, await compactor.compact("user", _turns(6)), await compactor.aget_stats()
+
+    first, second, stats = asyncio.run(main())
+    assert first == [(SUMMARY_LABEL, "summary 1"), ("q2", "a2"), ("q3", "a3")]
+    assert second[0] == (SUMMARY_LABEL, "summary 2")
+    # The second prompt builds on the first summary and only adds the new turns
+    assert "summary 1" in llm.prompts[1]
+    assert "q2" in llm.prompts[1] and "q0" not in llm.prompts[1]
+    assert stats["summaries"] == 1 and stats["summaries_built"] == 2
+
+
+def test_an_older_summary_does_not_replace_a_newer_one():
+    compactor = _compactor(FakeLLM())
+
+    async def main():
+        await compactor._store("user", SummaryState("newer", covered_until=5.0))
+        await compactor._store("user", SummaryState("older", covered_until=3.0))
+        return await compactor._load("user")
+
+    assert asyncio.run(main()) == SummaryState("newer", covered_until=5.0)
+
+
+def test_summary_errors_are_counted_and_history_still_returned():
+    compactor = _compactor(FakeLLM(fail=True), keep_turns=1)
+
+    async def main():
+        compactor.schedule_update("user", _turns(3))
+        await _drain(compactor)
+        return await compactor.compact("user", _turns(3)), await compactor.aget_stats()
+
+    history, stats = asyncio.run(main())
+    assert history == [("q2", "a2")]
+    assert stats["summary_errors"] == 1 and stats["summaries"] == 0
+
+
+def test_forget_drops_the_summary():
+    compactor = _compactor(FakeLLM(), keep_turns=1)
+
+    async def main():
+        compactor.schedule_update("user", _turns(3))
+        await _drain(compactor)
+        await compactor.forget("user")
+        return await compactor.compact("user", _turns(3))
+
+    assert asyncio.run(main()) == [("q2", "a2")]
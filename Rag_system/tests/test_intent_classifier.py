@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from intent_classifier import LocalIntentClassifier, load_training_pairs
+
+TRAINING = {
+    "products": ["ما هي المنتجات المتوفرة", "وش المنتجات عندكم", "اعرض المنتجات", "قائمة المنتجات",
+                 "ايش المنتجات الموجودة", "ابي اشوف المنتجات"],
+    "branches": ["وين فروعكم", "اين تقع الفروع", "عناوين الفروع", "كم فرع عندكم",
+                 "موقع الفرع", "الفروع في الرياض"],
+    "invoices": ["اعرض فواتيري", "كم فاتورة عندي", "اخر فاتورة", "فاتورتي الاخيرة",
+                 "تفاصيل الفواتير", "فواتير الشهر"],
+}
+
+
+def _pairs():
+    questions, labels = [], []
+    for label, examples in TRAINING.items():
+        questions.extend(examples)
+        labels.extend([label] * len(examples))
+    return questions, labels
+
+
+@pytest.fixture(scope="module")
+def model():
+    return LocalIntentClassifier(dim=2 ** 12).fit(*_pairs())
+
+
+def test_untrained_model_abstains():
+    assert LocalIntentClassifier().predict("وين فروعكم") == ("unknown", 0.0)
+
+
+@pytest.mark.parametrize("question, label", [
+    ("وش المنتجات الموجودة عندكم؟", "products"),
+    ("أين الفرع؟", "branches"),
+    ("أبي فاتورتي", "invoices"),
+])
+def test_predicts_the_nearest_category(model, question, label):
+    predicted, confidence = model.predict(question)
+    assert predicted == label
+    assert 1 / len(TRAINING) < confidence <= 1.0
+
+
+def test_unrelated_text_gets_low_confidence(model):
+    _, confidence = model.predict("xyz")
+    _, confident = model.predict("وين فروعكم")
+    assert confidence < confident
+
+
+def test_fit_rejects_mismatched_inputs():
+    with pytest.raises(ValueError):
+        LocalIntentClassifier().fit(["question"], [])
+
+
+def test_save_and_load_round_trip(model, tmp_path):
+    path = str(tmp_path / "intent_model.npz")
+    model.save(path)
+    loaded = LocalIntentClassifier.load(path)
+    assert loaded.labels == model.labels and loaded.temperature == model.temperature
+    for question in ("وين فروعكم", "اعرض فواتيري", "شيء اخر"):
+        assert loaded.predict(question) == pytest.approx(model.predict(question))
+
+
+def test_load_training_pairs_skips_incomplete_rows(tmp_path):
+    path = tmp_path / "classifications.jsonl"
+    rows = [{"question": "وين فروعكم", "category": "branches"}, {"question": "بدون تصنيف"}, {}]
+    path.write_text("\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n\n", encoding="utf-8")
+    assert load_training_pairs(str(path)) == (["وين فروعكم"], ["branches"])
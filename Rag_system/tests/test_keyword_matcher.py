@@ -0,0 +1,53 @@
+from keyword_matcher import KeywordMatcher, normalize_arabic
+
+
+def _matcher(*tables):
+    matcher = KeywordMatcher()
+    for table, entries in tables:
+        for index, keywords in enumerate(entries):
+            matcher.add_many(keywords, (table, index))
+    matcher.build()
+    return matcher
+
+
+def test_normalize_folds_alef_and_hamza_variants():
+    assert normalize_arabic("أعلى") == normalize_arabic("اعلى")
+    assert normalize_arabic("إلى") == normalize_arabic("الي")
+    assert normalize_arabic("مُنْتَج") == "منتج"
+
+
+def test_normalize_keeps_taa_marbuta():
+    assert normalize_arabic("سعرة") != normalize_arabic("سعره")
+
+
+def test_find_first_keeps_table_order_priority():
+    matcher = _matcher(("queries", [("سعر",), ("كم سعر",)]))
+    # Both entries match; the earlier table entry wins, as with the old loop
+    assert matcher.find_first("كم سعر العصير")["queries"][0] == 0
+
+
+def test_find_first_groups_matches_by_table():
+    matcher = _matcher(
+        ("products", [("جالكسي",), ("أوريو",)]),
+        ("queries", [("سعرة حرارية",)]),
+    )
+    first = matcher.find_first("كم سعرة حرارية في اوريو")
+    assert first["queries"][0] == 0
+    assert first["products"][0] == 1
+
+
+def test_find_first_returns_text_as_typed():
+    matcher = _matcher(("products", [("أوريو",)]))
+    assert matcher.find_first("كم سعر اوريو؟")["products"] == (0, "اوريو")
+    # Offsets survive tashkeel removed by normalization
+    assert matcher.find_first("هل الأُورِيو لذيذ")["products"] == (0, "أُورِيو")
+
+
+def test_overlapping_keywords_found_in_one_pass():
+    matcher = _matcher(("t", [("he",), ("she",), ("hers",)]))
+    assert matcher.find_all("ushers") == {("t", 0), ("t", 1), ("t", 2)}
+
+
+def test_no_match():
+    matcher = _matcher(("t", [("فواتيري",)]))
+    assert matcher.find_first("مرحبا") == {}
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import memory_store
+from memory_store import ConversationMemoryStore, count_tokens
+
+
+def _questions(store, user_key):
+    return [turn.question for turn in store.get_turns(user_key)]
+
+
+def test_turn_window_keeps_the_newest_turns():
+    store = ConversationMemoryStore(max_turns=3, max_tokens=10_000)
+    for i in range(5):
+        store.add_turn("user", f"q{i}", f"a{i}")
+    assert _questions(store, "user") == ["q2", "q3", "q4"]
+    assert store.get_stats()["trimmed_turns"] == 2
+
+
+def test_token_budget_drops_oldest_but_keeps_the_newest_turn():
+    long_answer = "كلمة " * 200
+    store = ConversationMemoryStore(max_turns=10, max_tokens=count_tokens(long_answer) + 20)
+    store.add_turn("user", "q0", long_answer)
+    store.add_turn("user", "q1", long_answer)
+    assert _questions(store, "user") == ["q1"]
+    store.add_turn("user", "q2", long_answer * 3)
+    assert _questions(store, "user") == ["q2"]
+
+
+def test_least_recently_used_users_are_evicted():
+    evicted = []
+    store = ConversationMemoryStore(max_users=2)
+    store.add_evict_listener(evicted.append)
+    store.add_turn("a", "q", "a")
+    store.add_turn("b", "q", "a")
+    store.get_turns("a")
+    store.add_turn("c", "q", "a")
+    assert evicted == ["b"]
+    assert store.get_turns("b") == []
+    assert store.get_stats()["users"] == 2
+
+
+def test_idle_users_are_evicted(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(memory_store, "time", SimpleNamespace(
+        time=lambda: clock.now, monotonic=lambda: clock.now
+    ))
+    store = ConversationMemoryStore(idle_ttl=100)
+    store.add_turn("idle", "q", "a")
+    clock.now += 60
+    store.add_turn("active", "q", "a")
+    clock.now += 60
+    assert store.evict_idle() == 1
+    assert store.get_turns("idle") == []
+    assert _questions(store, "active") == ["q"]
+
+
+def test_sqlite_history_survives_restart_and_eviction(tmp_path):
+    path = str(tmp_path / "memory.db")
+    store = ConversationMemoryStore(max_turns=2, max_users=1, db_path=path)
+    for i in range(3):
+        store.add_turn("a", f"q{i}", "answer")
+    store.add_turn("b", "q", "answer")
+    # "a" was evicted from memory but is reloaded from SQLite
+    assert _questions(store, "a") == ["q1", "q2"]
+    store.close()
+
+    restarted = ConversationMemoryStore(max_turns=2, db_path=path)
+    assert _questions(restarted, "a") == ["q1", "q2"]
+    restarted.clear("a")
+    assert restarted.get_turns("a") == []
+    assert _questions(restarted, "b") == ["q"]
+    restarted.close()
+
+
+def test_shared_stores_see_each_others_turns(tmp_path):
+    path = str(tmp_path / "memory.db")
+    first = ConversationMemoryStore(db_path=path, shared=True)
+    second = ConversationMemoryStore(db_path=path, shared=True)
+
+    async def main():
+        await first.aadd_turn("user", "q0", "a0")
+        await second.aget_turns("user")
+        await first.aadd_turn("user", "q1", "a1")
+        return [turn.question for turn in await second.aget_turns("user")]
+
+    try:
+        assert asyncio.run(main()) == ["q0", "q1"]
+    finally:
+        first.close()
+        second.close()
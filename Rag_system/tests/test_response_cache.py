@@ -0,0 +1,95 @@
+import asyncio
+
+from response_cache import NAMESPACE, ResponseCache
+from shared_state import SQLiteBackend
+
+
+def _answer(method="keywords"):
+    return {"answer": "متوفر", "source": "database", "confidence": 1.0, "method": method}
+
+
+def test_key_normalizes_the_question():
+    key = ResponseCache.make_key("  كم سعر   الحليب؟ ", None, 3)
+    assert key == ResponseCache.make_key("كم سعر الحليب؟", None, 3)
+    assert key != ResponseCache.make_key("كم سعر الحليب؟", "Sara", 3)
+    assert key != ResponseCache.make_key("كم سعر الحليب؟", None, 4)
+
+
+def test_hits_return_copies_and_count_by_tier():
+    cache = ResponseCache()
+    key = ResponseCache.make_key("question", None, 0)
+
+    async def main():
+        assert await cache.aget(key) is None
+        await cache.aput(key, _answer("smart_product"))
+        first = await cache.aget(key)
+        first["answer"] = "changed"
+        return await cache.aget(key), await cache.aget_stats()
+
+    result, stats = asyncio.run(main())
+    assert result == _answer("smart_product")
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+    assert stats["hits_by_tier"] == {"smart_product": 2}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl_seconds=60)
+    key = ResponseCache.make_key("question", None, 0)
+
+    async def main():
+        await cache.aput(key, _answer())
+        clock.now += 59
+        fresh = await cache.aget(key)
+        clock.now += 2
+        return fresh, await cache.aget(key)
+
+    assert asyncio.run(main()) == (_answer(), None)
+
+
+def test_in_process_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    keys = [ResponseCache.make_key(f"question {i}", None, 0) for i in range(3)]
+
+    async def main():
+        await cache.aput(keys[0], _answer())
+        await cache.aput(keys[1], _answer())
+        await cache.aget(keys[0])
+        await cache.aput(keys[2], _answer())
+        return [await cache.aget(key) is not None for key in keys]
+
+    assert asyncio.run(main()) == [True, False, True]
+
+
+def test_invalidate_drops_everything():
+    cache = ResponseCache()
+    key = ResponseCache.make_key("question", None, 0)
+
+    async def main():
+        await cache.aput(key, _answer())
+        await cache.ainvalidate("products changed")
+        return await cache.aget(key), await cache.aget_stats()
+
+    result, stats = asyncio.run(main())
+    assert result is None
+    assert stats["invalidations"] == 1 and stats["entries"] == 0
+
+
+def test_shared_backend_is_trimmed_every_trim_interval_writes(tmp_path, clock):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    cache = ResponseCache(max_entries=2, backend=backend, trim_interval=3)
+
+    async def main():
+        counts = []
+        for i in range(6):
+            clock.now += 1
+            await cache.aput(ResponseCache.make_key(f"question {i}", None, 0), _answer())
+            counts.append(backend.count(NAMESPACE))
+        return counts
+
+    try:
+        # Trimmed to max_entries on the 3rd and 6th write only
+        assert asyncio.run(main()) == [1, 2, 2, 3, 4, 2]
+        other_worker = ResponseCache(backend=backend)
+        assert asyncio.run(other_worker.aget(ResponseCache.make_key("question 5", None, 0))) == _answer()
+    finally:
+        backend.close()
@@ -0,0 +1,99 @@
+import asyncio
+
+from routing_engine import RoutingEngine, RoutingTier
+
+
+def _answer(text, confidence=1.0, delay=0.0, log=None, name=None):
+    async def handler(question, user_id, user_name):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"cancelled:{name}")
+            raise
+        if log is not None:
+            log.append(f"finished:{name}")
+        return {"answer": text, "confidence": confidence} if text else None
+    return handler
+
+
+def _route(tiers, budget=20.0):
+    return asyncio.run(RoutingEngine(tiers, parallel_budget=budget).route("question"))
+
+
+def test_local_tiers_run_in_cost_order():
+    decision = _route([
+        RoutingTier("database", _answer("db"), cost=1.0),
+        RoutingTier("keywords", _answer("kw"), cost=0.0),
+    ])
+    assert decision.tier == "keywords"
+    assert "database" not in decision.timings
+
+
+def test_local_answer_skips_remote_tiers():
+    log = []
+    decision = _route([
+        RoutingTier("keywords", _answer("kw"), cost=0.0),
+        RoutingTier("router", _answer("llm", log=log, name="router"), stage="remote", cost=10.0),
+    ])
+    assert decision.tier == "keywords"
+    assert log == []
+
+
+def test_losing_remote_tiers_are_cancelled():
+    log = []
+    decision = _route([
+        RoutingTier("router", _answer("llm", delay=0.01, log=log, name="router"), stage="remote", cost=10.0, priority=1.0),
+        RoutingTier("semantic", _answer("sem", delay=5.0, log=log, name="semantic"), stage="remote", cost=2.0, priority=2.0),
+        RoutingTier("prefetch", _answer(None, delay=5.0, log=log, name="prefetch"), stage="remote", cost=1.0, answers=False),
+    ])
+    assert decision.tier == "router"
+    assert sorted(decision.cancelled) == ["prefetch", "semantic"]
+    assert "cancelled:semantic" in log and "cancelled:prefetch" in log
+
+
+def test_precedence_beats_finishing_first():
+    # The semantic tier answers first, but the router has precedence and still wins
+    decision = _route([
+        RoutingTier("router", _answer("llm", delay=0.05), stage="remote", cost=10.0, priority=1.0),
+        RoutingTier("semantic", _answer("sem"), stage="remote", cost=2.0, priority=2.0),
+    ])
+    assert decision.tier == "router"
+    assert decision.result["answer"] == "llm"
+
+
+def test_unconfident_answer_falls_through():
+    decision = _route([
+        RoutingTier("router", _answer("llm", confidence=0.2), stage="remote", cost=10.0, min_confidence=0.5),
+        RoutingTier("semantic", _answer("sem"), stage="remote", cost=2.0),
+    ])
+    assert decision.tier == "semantic"
+
+
+def test_tiers_beyond_budget_run_after_the_race():
+    log = []
+    decision = _route([
+        RoutingTier("router", _answer(None, log=log, name="router"), stage="remote", cost=10.0),
+        RoutingTier("rag", _answer("rag", log=log, name="rag"), stage="remote", cost=100.0),
+    ], budget=20.0)
+    assert decision.tier == "rag"
+    assert log == ["finished:router", "finished:rag"]
+
+
+def test_timed_out_tier_is_skipped():
+    decision = _route([
+        RoutingTier("router", _answer("llm", delay=5.0), stage="remote", cost=10.0, timeout=0.01),
+        RoutingTier("rag", _answer("rag"), stage="remote", cost=100.0),
+    ])
+    assert decision.tier == "rag"
+
+
+def test_failing_tier_is_skipped():
+    async def broken(question, user_id, user_name):
+        raise RuntimeError("upstream down")
+
+    decision = _route([
+        RoutingTier("keywords", broken, cost=0.0),
+        RoutingTier("database", _answer("db"), cost=1.0),
+    ])
+    assert decision.tier == "database"
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from shared_state import MemoryBackend, SQLiteBackend, create_backend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    else:
+        backend = SQLiteBackend(str(tmp_path / "state.db"))
+        yield backend
+        backend.close()
+
+
+def test_set_get_delete(backend):
+    backend.set("ns", "a", {"answer": "نعم"})
+    backend.set("ns", "b", [1, 2])
+    backend.set("other", "a", 3)
+    assert backend.get("ns", "a") == {"answer": "نعم"}
+    assert backend.count("ns") == 2
+
+    backend.delete("ns", "a")
+    assert backend.get("ns", "a") is None
+    backend.delete("ns")
+    assert backend.count("ns") == 0
+    assert backend.get("other", "a") == 3
+
+
+def test_values_expire_after_ttl(backend, clock):
+    backend.set("ns", "short", 1, ttl=10)
+    backend.set("ns", "forever", 2)
+    clock.now += 9
+    assert backend.get("ns", "short") == 1
+    clock.now += 2
+    assert backend.get("ns", "short") is None
+    assert backend.get("ns", "forever") == 2
+
+
+def test_add_only_stores_missing_or_expired_keys(backend, clock):
+    assert backend.add("claims", "product", "worker-1", ttl=5)
+    assert not backend.add("claims", "product", "worker-2", ttl=5)
+    assert backend.get("claims", "product") == "worker-1"
+    clock.now += 6
+    assert backend.add("claims", "product", "worker-2", ttl=5)
+    assert backend.get("claims", "product") == "worker-2"
+
+
+def test_incr_counts_from_one(backend):
+    assert [backend.incr("catalog", "version") for _ in range(3)] == [1, 2, 3]
+
+
+def test_trim_drops_expired_then_oldest(backend, clock):
+    backend.set("ns", "expiring", 0, ttl=1)
+    for i in range(5):
+        clock.now += 1
+        backend.set("ns", f"k{i}", i, ttl=100)
+    backend.trim("ns", 3)
+    assert backend.count("ns") == 3
+    assert [backend.get("ns", f"k{i}") for i in range(5)] == [None, None, 2, 3, 4]
+
+
+def test_async_wrappers(backend):
+    async def main():
+        await backend.aset("ns", "a", 1)
+        assert await backend.aadd("ns", "b", 2)
+        assert await backend.aincr("ns", "n") == 1
+        await backend.atrim("ns", 10)
+        count = await backend.acount("ns")
+        value = await backend.aget("ns", "a")
+        await backend.adelete("ns")
+        return count, value, await backend.acount("ns")
+
+    assert asyncio.run(main()) == (3, 1, 0)
+
+
+def test_sqlite_backend_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "state.db")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    try:
+        first.set("answers", "q", {"answer": "a"}, ttl=60)
+        assert second.get("answers", "q") == {"answer": "a"}
+        assert first.incr("catalog", "version") == 1
+        assert second.incr("catalog", "version") == 2
+        assert first.add("claims", "p", 1, ttl=60)
+        assert not second.add("claims", "p", 2, ttl=60)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sqlite_reads_do_not_refresh_recency(tmp_path, clock):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    try:
+        for key in ("old", "new"):
+            clock.now += 1
+            backend.set("ns", key, key)
+        backend.get("ns", "old")
+        backend.trim("ns", 1)
+        assert backend.get("ns", "old") is None
+        assert backend.get("ns", "new") == "new"
+    finally:
+        backend.close()
+
+
+def test_memory_reads_refresh_recency(clock):
+    backend = MemoryBackend()
+    backend.set("ns", "old", 1)
+    backend.set("ns", "new", 2)
+    backend.get("ns", "old")
+    backend.trim("ns", 1)
+    assert backend.get("ns", "old") == 1
+    assert backend.get("ns", "new") is None
+
+
+def test_create_backend(tmp_path):
+    assert isinstance(create_backend(""), MemoryBackend)
+    assert isinstance(create_backend("memory://"), MemoryBackend)
+    backend = create_backend(f"sqlite:///{tmp_path}/nested/state.db")
+    assert isinstance(backend, SQLiteBackend) and backend.shared
+    backend.close()
+    with pytest.raises(ValueError):
+        create_backend("redis://localhost")
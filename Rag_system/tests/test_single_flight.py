@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "rows"
+
+    async def main():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["rows"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flight.get_stats() == {"in_flight": 0, "executed": 1, "coalesced": 4}
+
+
+def test_different_keys_do_not_share():
+    async def main():
+        flight = SingleFlight("test")
+        return await asyncio.gather(
+            flight.do("a", lambda: asyncio.sleep(0.01, result="a")),
+            flight.do("b", lambda: asyncio.sleep(0.01, result="b")),
+        )
+
+    assert asyncio.run(main()) == [("a", False), ("b", False)]
+
+
+def test_sequential_calls_run_again():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        flight = SingleFlight("test")
+        return [await flight.do("key", fetch), await flight.do("key", fetch)]
+
+    assert asyncio.run(main()) == [(1, False), (2, False)]
+
+
+def test_error_reaches_every_caller_and_is_not_kept():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        # The failed call is forgotten, so the next caller retries
+        retry = await flight.do("key", lambda: asyncio.sleep(0, result="ok"))
+        return results, retry
+
+    results, retry = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retry == ("ok", False)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def main():
+        flight = SingleFlight("test")
+        first = asyncio.create_task(flight.do("key", lambda: asyncio.sleep(0.05, result="done")))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flight.do("key", lambda: asyncio.sleep(0.05, result="other")))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_call_is_cancelled_when_every_caller_leaves():
+    events = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+        return "late"
+
+    async def main():
+        flight = SingleFlight("test")
+        callers = [asyncio.create_task(flight.do("key", slow)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        # The key is free again, so the next caller starts a new call
+        retry = await flight.do("key", lambda: asyncio.sleep(0, result="fresh"))
+        return flight, retry
+
+    flight, retry = asyncio.run(main())
+    assert events == ["cancelled"]
+    assert retry == ("fresh", False)
+    assert flight.get_stats()["in_flight"] == 0
@@ -0,0 +1,96 @@
+import json
+import os
+import re
+
+import pytest
+
+from config import CONTEXT_PRONOUNS, DATABASE_QUERIES, PRODUCT_KEYWORDS, SMART_PRODUCT_QUERIES, SMART_RESPONSES
+from smart_service import SmartResponseService
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "loadtest", "questions.jsonl")
+
+
+# Spelling variants the deduplicated tables rely on; written out here rather
+# than reusing normalize_arabic so a change to the folding shows up as a diff
+_VARIANTS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ؤ": "و", "ئ": "ي", "ى": "ي"})
+_MARKS = re.compile(r"[\u064B-\u0652\u0670\u0640]")
+
+
+def _fold(text):
+    return _MARKS.sub("", text.lower()).translate(_VARIANTS)
+
+
+def _contains(question, keyword):
+    return _fold(keyword) in _fold(question)
+
+
+def _baseline_product_query(question):
+    """The sequential substring loop SmartResponseService used before the matcher"""
+    q = question.lower().strip()
+    if any(_contains(q, pronoun) for pronoun in CONTEXT_PRONOUNS):
+        return "smart_product_query: context_pronoun"
+    for keywords, query_type in SMART_PRODUCT_QUERIES.items():
+        if any(_contains(q, keyword) for keyword in keywords):
+            return f"smart_product_query: {query_type}"
+    for product in PRODUCT_KEYWORDS:
+        if _contains(q, product):
+            return f"smart_product_query: product_info:{_fold(product)}"
+    return None
+
+
+def _baseline_database_query(question):
+    q = question.lower().strip()
+    for keywords, query_type in DATABASE_QUERIES.items():
+        if any(_contains(q, keyword) for keyword in keywords):
+            return query_type
+    return None
+
+
+def _baseline_smart_response(question):
+    q = question.lower().strip()
+    for keywords, response_func in SMART_RESPONSES.items():
+        if any(_contains(q, keyword) for keyword in keywords):
+            return response_func(None)
+    return None
+
+
+def _questions():
+    questions = set(CONTEXT_PRONOUNS) | set(PRODUCT_KEYWORDS)
+    for table in (SMART_RESPONSES, SMART_PRODUCT_QUERIES, DATABASE_QUERIES):
+        for keywords in table:
+            questions.update(keywords)
+    with open(QUESTIONS_PATH, encoding="utf-8") as f:
+        questions.update(json.loads(line)["question"] for line in f if line.strip())
+    return sorted(questions)
+
+
+@pytest.fixture(scope="module")
+def service():
+    return SmartResponseService()
+
+
+@pytest.mark.parametrize("question", _questions())
+def test_routing_matches_baseline_loops(service, question):
+    product_query = service.get_smart_product_query(question)
+    if product_query and "product_info:" in product_query:
+        prefix, name = product_query.split("product_info:", 1)
+        product_query = f"{prefix}product_info:{_fold(name)}"
+    assert product_query == _baseline_product_query(question)
+    assert service.get_database_query(question) == _baseline_database_query(question)
+    if not service._match_regex_patterns(question.lower().strip()):
+        assert service.get_smart_response(question) == _baseline_smart_response(question)
+
+
+@pytest.mark.parametrize("question", ["كم سعرة حرارية في جالكسي؟", "كم سعرة", "سعرة حرارية", "كم فيه سعرة"])
+def test_calorie_questions_are_not_pronouns(service, question):
+    assert service.get_smart_product_query(question) == "smart_product_query: all_calories"
+
+
+@pytest.mark.parametrize("question", ["كم سعره", "وش سعرها"])
+def test_pronoun_questions(service, question):
+    assert service.get_smart_product_query(question) == "smart_product_query: context_pronoun"
+
+
+@pytest.mark.parametrize("question,typed", [("اوريو", "اوريو"), ("أوريو", "أوريو"), ("شوكولاته", "شوكولاته")])
+def test_product_info_keeps_typed_name(service, question, typed):
+    assert service.get_smart_product_query(question) == f"smart_product_query: product_info:{typed}"
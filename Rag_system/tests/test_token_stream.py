@@ -0,0 +1,68 @@
+import asyncio
+
+from token_stream import TokenSink, current_sink, token_stream
+
+
+def test_sink_yields_tokens_until_closed():
+    async def main():
+        sink = TokenSink()
+        sink.emit("مرحبا")
+        sink.emit("")
+        sink.emit(" بك")
+        sink.close()
+        sink.emit("ignored")
+        sink.close()
+        return sink.emitted, [token async for token in sink]
+
+    assert asyncio.run(main()) == (True, ["مرحبا", " بك"])
+
+
+def test_empty_sink_reports_nothing_emitted():
+    async def main():
+        sink = TokenSink()
+        sink.close()
+        return sink.emitted, [token async for token in sink]
+
+    assert asyncio.run(main()) == (False, [])
+
+
+def test_consumer_receives_tokens_as_they_are_produced():
+    async def main():
+        sink = TokenSink()
+        received = []
+
+        async def consume():
+            async for token in sink:
+                received.append(token)
+
+        consumer = asyncio.create_task(consume())
+        sink.emit("a")
+        await asyncio.sleep(0)
+        seen_before_close = list(received)
+        sink.emit("b")
+        sink.close()
+        await consumer
+        return seen_before_close, received
+
+    assert asyncio.run(main()) == (["a"], ["a", "b"])
+
+
+def test_token_stream_scopes_the_current_sink():
+    async def producer():
+        sink = current_sink()
+        if sink:
+            sink.emit("token")
+
+    async def main():
+        assert current_sink() is None
+        sink = TokenSink()
+        with token_stream(sink) as active:
+            assert active is sink and current_sink() is sink
+            # Tasks started inside the block inherit the sink
+            await asyncio.create_task(producer())
+        assert current_sink() is None
+        await producer()
+        sink.close()
+        return [token async for token in sink]
+
+    assert asyncio.run(main()) == ["token"]
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_sink: ContextVar[Optional["TokenSink"]] = ContextVar("token_sink", default=None)
+
+
+class TokenSink:
+    """
+    Collects answer text as it is generated during one streamed request.
+    Producers (the RAG chain callbacks, product info formatting) call emit();
+    the /ask/stream endpoint iterates the sink until close() is called.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+        self.emitted = False
+
+    def emit(self, text: str):
+        if text and not self._closed:
+            self.emitted = True
+            self._queue.put_nowait(text)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        text = await self._queue.get()
+        if text is None:
+            raise StopAsyncIteration
+        return text
+
+
+def current_sink() -> Optional[TokenSink]:
+    """Return the sink of the request being streamed, if any"""
+    return _current_sink.get()
+
+
+@contextmanager
+def token_stream(sink: TokenSink) -> Iterator[TokenSink]:
+    """Route tokens produced within this block to sink"""
+    token = _current_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _current_sink.reset(token)
@@ -0,0 +1,4 @@
+"""
+Local load-testing kit for rag_api.py: fake OpenAI-compatible and Supabase
+REST servers with configurable latency, and a load generator for /ask.
+"""
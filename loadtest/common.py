@@ -0,0 +1,33 @@
+import argparse
+import asyncio
+import random
+import threading
+
+
+class Latency:
+    """Per-request delay: base_ms plus uniform jitter in [-jitter_ms, +jitter_ms], from a seeded RNG"""
+
+    def __init__(self, base_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 42):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """Next delay in seconds"""
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.base_ms + jitter) / 1000.0
+
+    async def wait(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def add_server_args(parser: argparse.ArgumentParser, default_port: int, default_latency_ms: float):
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--latency-ms", type=float, default=default_latency_ms, help="Base latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform jitter added to the base latency")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for latency jitter and generated data")
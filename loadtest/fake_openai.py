@@ -0,0 +1,194 @@
+"""
+Fake OpenAI-compatible API with deterministic responses.
+
+    python -m loadtest.fake_openai --port 8101 --latency-ms 400 --jitter-ms 150 --token-ms 15
+
+Serves /v1/chat/completions (plain and streamed) and /v1/embeddings.
+Classifier prompts get a keyword-picked category, other chat requests a
+fixed Arabic answer; embeddings are unit vectors derived from a hash of
+the input, so the same text always embeds the same way. --latency-ms and
+--jitter-ms delay each response (the first chunk when streaming);
+--token-ms spaces streamed chunks. Point OPENAI_BASE_URL at .../v1.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import math
+import random
+import struct
+import time
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from loadtest.common import Latency, add_server_args
+
+EMBEDDING_DIMENSIONS = 1536
+
+ANSWER = ("مرحباً! هذه إجابة تجريبية من خادم الاختبار المحلي. "
+          "دكان فيجن متجر ذكي بدون كاشير، يمكنك الشراء عبر مسح رمز QR والدفع بالبطاقة.")
+
+# First matching keyword wins; checked against the question in the classifier prompt
+CLASSIFIER_KEYWORDS = [
+    (("مرحبا", "السلام", "hello", "hi "), "greeting"),
+    (("شكرا", "thank"), "thanks"),
+    (("سعر", "بكم", "price", "cost"), "product_price"),
+    (("فرع", "موقع", "وين", "branch", "where"), "location"),
+    (("دفع", "بطاقة", "pay"), "payment"),
+    (("ساعات", "يفتح", "open", "hours"), "working_hours"),
+    (("منتجات", "products"), "product_list"),
+    (("qr", "باركود"), "qr_info"),
+]
+
+
+def classify(prompt: str) -> str:
+    question = prompt.split("Question:", 1)[-1].split("Return only", 1)[0].lower()
+    for keywords, category in CLASSIFIER_KEYWORDS:
+        if any(keyword in question for keyword in keywords):
+            return category
+    return "general_info"
+
+
+def reply_for(messages: List[Dict[str, Any]]) -> str:
+    system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+    if "classifier" in system.lower():
+        user = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+        return classify(user)
+    return ANSWER
+
+
+def embed(item: Any) -> List[float]:
+    """Unit vector seeded by the input (text or token ids)"""
+    digest = hashlib.sha256(json.dumps(item, ensure_ascii=False).encode("utf-8")).digest()
+    rng = random.Random(int.from_bytes(digest[:8], "big"))
+    vector = [rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIMENSIONS)]
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def create_app(latency: Latency, token_ms: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    ids = itertools.count(1)
+    counters = {"chat": 0, "stream": 0, "embeddings": 0, "inputs": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-3.5-turbo")
+        messages = body.get("messages", [])
+        content = reply_for(messages)
+        completion_id = f"chatcmpl-fake-{next(ids)}"
+        created = int(time.time())
+        prompt_tokens = sum(_tokens(str(m.get("content", ""))) for m in messages)
+
+        await latency.wait()
+
+        if not body.get("stream"):
+            counters["chat"] += 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": _tokens(content),
+                    "total_tokens": prompt_tokens + _tokens(content)
+                }
+            }
+
+        counters["stream"] += 1
+
+        def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for word in content.split(" "):
+                if token_ms:
+                    await asyncio.sleep(token_ms / 1000.0)
+                yield chunk({"content": word + " "})
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        # A single string or token list is one input; tiktoken-tokenized batches are lists of int lists
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        counters["embeddings"] += 1
+        counters["inputs"] += len(inputs)
+
+        await latency.wait()
+
+        data = []
+        for index, item in enumerate(inputs):
+            vector = embed(item)
+            if body.get("encoding_format") == "base64":
+                encoded: Any = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            else:
+                encoded = vector
+            data.append({"object": "embedding", "index": index, "embedding": encoded})
+
+        tokens = sum(len(item) if isinstance(item, list) else _tokens(item) for item in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [
+            {"id": name, "object": "model", "created": 0, "owned_by": "loadtest"}
+            for name in ("gpt-3.5-turbo", "gpt-4o-mini", "text-embedding-ada-002")
+        ]}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "requests": counters}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server with configurable latency")
+    add_server_args(parser, default_port=8101, default_latency_ms=300.0)
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Delay between streamed chunks")
+    args = parser.parse_args()
+
+    app = create_app(Latency(args.latency_ms, args.jitter_ms, args.seed), token_ms=args.token_ms)
+    print(f"Fake OpenAI on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, seed {args.seed})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Fake Supabase REST (PostgREST) server seeded from database_schema.md.
+
+    python -m loadtest.fake_supabase --port 8102 --latency-ms 40 --jitter-ms 20
+
+Supports the subset of PostgREST the RAG system uses: select=cols,
+column filters (eq, neq, gt, gte, lt, lte, like, ilike, in, is),
+or=(...) / and(...) groups, multi-key order with nullsfirst/nullslast,
+limit/offset, inserts (Prefer: return=representation) and rpc calls.
+Point SUPABASE_URL at it; SUPABASE_KEY can be any JWT-shaped string.
+"""
+
+import argparse
+import fnmatch
+import itertools
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from loadtest.common import Latency, add_server_args
+from loadtest.seed_data import SeedData
+
+Row = Dict[str, Any]
+Predicate = Callable[[Row], bool]
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "or", "and", "on_conflict", "columns"}
+
+
+class PostgRESTQueryError(Exception):
+    """Malformed filter, answered with 400 like PostgREST does"""
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas outside parentheses and double quotes"""
+    parts, current, depth, quoted = [], [], 0, False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    if current:
+        parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _coerce(value: str, sample: Any) -> Any:
+    """Convert a filter literal to the type of the stored value it is compared to"""
+    if isinstance(sample, bool):
+        return value.lower() == "true"
+    if isinstance(sample, (int, float)):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _compare(op: str, actual: Any, literal: str) -> bool:
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}.get(literal.lower(), literal)
+        return actual is expected
+    if actual is None:
+        return False
+    if op == "in":
+        if not (literal.startswith("(") and literal.endswith(")")):
+            raise PostgRESTQueryError(f"Invalid in-list: {literal}")
+        options = [_unquote(option) for option in _split_top_level(literal[1:-1])]
+        return any(actual == _coerce(option, actual) or str(actual) == option for option in options)
+    literal = _unquote(literal)
+    if op in ("like", "ilike"):
+        pattern = literal.replace("%", "*")
+        if op == "ilike":
+            return fnmatch.fnmatchcase(str(actual).lower(), pattern.lower())
+        return fnmatch.fnmatchcase(str(actual), pattern)
+
+    expected = _coerce(literal, actual)
+    if isinstance(expected, str):
+        actual = str(actual)
+    if op == "eq":
+        return actual == expected
+    if op == "neq":
+        return actual != expected
+    if op == "gt":
+        return actual > expected
+    if op == "gte":
+        return actual >= expected
+    if op == "lt":
+        return actual < expected
+    if op == "lte":
+        return actual <= expected
+    raise PostgRESTQueryError(f"Unsupported operator: {op}")
+
+
+def _column_predicate(column: str, expression: str) -> Predicate:
+    """'eq.5' / 'not.in.(1,2)' applied to one column"""
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, literal = expression.partition(".")
+    if not literal and op != "is":
+        raise PostgRESTQueryError(f"Invalid filter on {column}: {expression}")
+
+    def predicate(row: Row) -> bool:
+        return _compare(op, row.get(column), literal) != negate
+
+    return predicate
+
+
+def _group_predicate(kind: str, body: str) -> Predicate:
+    """or=(a.eq.1,and(b.gt.2,c.lt.3)) style groups"""
+    predicates = []
+    for condition in _split_top_level(body):
+        match = re.match(r"^(not\.)?(and|or)\((.*)\)$", condition, re.DOTALL)
+        if match:
+            inner = _group_predicate(match.group(2), match.group(3))
+            predicates.append((lambda p: lambda row: not p(row))(inner) if match.group(1) else inner)
+        else:
+            column, _, expression = condition.partition(".")
+            predicates.append(_column_predicate(column, expression))
+    combine = any if kind == "or" else all
+    return lambda row: combine(predicate(row) for predicate in predicates)
+
+
+def _sort(rows: List[Row], order: str) -> List[Row]:
+    """Apply order=col.desc.nullslast,col2 (stable sorts, last key first)"""
+    for term in reversed(_split_top_level(order)):
+        parts = term.split(".")
+        column = parts[0]
+        descending = "desc" in parts[1:]
+        # PostgREST default: nulls last for asc, first for desc
+        nulls_first = "nullsfirst" in parts[1:] or (descending and "nullslast" not in parts[1:])
+        present = [row for row in rows if row.get(column) is not None]
+        missing = [row for row in rows if row.get(column) is None]
+        present.sort(key=lambda row: row[column], reverse=descending)
+        rows = missing + present if nulls_first else present + missing
+    return rows
+
+
+def _project(row: Row, select: str) -> Row:
+    columns = [column.strip() for column in select.split(",") if column.strip()]
+    if not columns or "*" in columns:
+        return dict(row)
+    return {column: row.get(column) for column in columns}
+
+
+class FakeSupabase:
+    """In-memory tables answering the PostgREST subset used by the RAG system"""
+
+    def __init__(self, tables: Dict[str, List[Row]]):
+        self.tables = tables
+        self._ids = itertools.count(1_000_000)
+
+    def select(self, table: str, params: List[Tuple[str, str]]) -> List[Row]:
+        options = {key: value for key, value in params if key in RESERVED_PARAMS}
+        predicates: List[Predicate] = []
+        for key, value in params:
+            if key in ("or", "and"):
+                if not (value.startswith("(") and value.endswith(")")):
+                    raise PostgRESTQueryError(f"Invalid {key} group: {value}")
+                predicates.append(_group_predicate(key, value[1:-1]))
+            elif key not in RESERVED_PARAMS:
+                predicates.append(_column_predicate(key, value))
+
+        rows = [row for row in self.tables[table] if all(predicate(row) for predicate in predicates)]
+        if "order" in options:
+            rows = _sort(rows, options["order"])
+        offset = int(options.get("offset", 0))
+        limit = int(options["limit"]) if "limit" in options else None
+        rows = rows[offset:offset + limit if limit is not None else None]
+        return [_project(row, options.get("select", "*")) for row in rows]
+
+    def insert(self, table: str, payload: Any) -> List[Row]:
+        rows = payload if isinstance(payload, list) else [payload]
+        stored = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", next(self._ids))
+            # Tables missing from the schema doc (e.g. question_embeddings) are created on first insert
+            self.tables.setdefault(table, []).append(row)
+            stored.append(row)
+        return stored
+
+    def rpc(self, function: str, params: Dict[str, Any]) -> List[Row]:
+        if function == "match_documents":
+            count = int(params.get("match_count") or 4)
+            return [
+                {"id": row["id"], "content": row["content"], "metadata": row["metadata"], "similarity": 0.8}
+                for row in self.tables.get("documents", [])[:count]
+            ]
+        if function == "match_question_embeddings":
+            return []
+        raise KeyError(function)
+
+
+def _error(status: int, code: str, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"code": code, "message": message, "details": None, "hint": None})
+
+
+def create_app(latency: Latency, seed: int = 42, users: int = 50, invoices_per_user: int = 30) -> FastAPI:
+    store = FakeSupabase(SeedData(seed=seed, users=users, invoices_per_user=invoices_per_user).build())
+    app = FastAPI(title="Fake Supabase REST")
+    app.state.store = store
+
+    @app.middleware("http")
+    async def add_latency(request: Request, call_next):
+        await latency.wait()
+        return await call_next(request)
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        try:
+            params = await request.json() if await request.body() else {}
+            rows = store.rpc(function, params)
+        except KeyError:
+            return _error(404, "PGRST202", f"Could not find the function public.{function}")
+        limit = request.query_params.get("limit")
+        return rows[:int(limit)] if limit else rows
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        if table not in store.tables:
+            return _error(404, "42P01", f'relation "public.{table}" does not exist')
+        try:
+            return store.select(table, request.query_params.multi_items())
+        except (PostgRESTQueryError, ValueError) as e:
+            return _error(400, "PGRST100", str(e))
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        rows = store.insert(table, await request.json())
+        if "return=representation" in request.headers.get("prefer", ""):
+            return JSONResponse(status_code=201, content=rows)
+        return Response(status_code=201)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "tables": {name: len(rows) for name, rows in store.tables.items()}}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Supabase REST server seeded from database_schema.md")
+    add_server_args(parser, default_port=8102, default_latency_ms=20.0)
+    parser.add_argument("--users", type=int, default=50, help="Seeded users")
+    parser.add_argument("--invoices-per-user", type=int, default=30)
+    args = parser.parse_args()
+
+    app = create_app(
+        Latency(args.latency_ms, args.jitter_ms, args.seed),
+        seed=args.seed,
+        users=args.users,
+        invoices_per_user=args.invoices_per_user
+    )
+    print(f"Fake Supabase on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, seed {args.seed})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
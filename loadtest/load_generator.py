@@ -0,0 +1,207 @@
+"""
+Replay a question corpus against POST /ask and report latency per routing tier.
+
+    python -m loadtest.load_generator --url http://127.0.0.1:8001 --requests 2000 --concurrency 32
+    python -m loadtest.load_generator --rate 50 --requests 3000      # open loop: 50 requests/s
+
+The request schedule (question order and user ids) comes from --seed, so
+two runs send exactly the same requests. Closed loop keeps --concurrency
+requests in flight; with --rate requests start on a fixed schedule and
+latency is measured from the scheduled start, so queueing in the API is
+not hidden. Results are grouped by the "method" the API reports for each
+answer (keyword_matching, smart_product_query, ...): count, errors,
+cache hits, p50/p95/p99, mean and throughput.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from loadtest.seed_data import user_id
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "questions.jsonl"
+
+
+def load_corpus(path: Path, language: Optional[str] = None) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    if language:
+        entries = [entry for entry in entries if entry.get("lang") == language]
+    if not entries:
+        raise SystemExit(f"No questions in {path}" + (f" for language '{language}'" if language else ""))
+    return entries
+
+
+def build_schedule(corpus: List[Dict[str, Any]], count: int, users: int, seed: int) -> List[Dict[str, Any]]:
+    """Deterministic list of /ask payloads; user-specific questions get a seeded user id"""
+    rng = random.Random(seed)
+    schedule = []
+    for _ in range(count):
+        entry = rng.choice(corpus)
+        payload = {"question": entry["question"]}
+        if entry.get("user"):
+            payload["user_id"] = user_id(rng.randrange(users))
+        schedule.append(payload)
+    return schedule
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Results:
+    """Latencies (ms) and outcomes grouped by routing tier"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.cache_hits: Dict[str, int] = defaultdict(int)
+
+    def record(self, tier: str, latency_ms: float, ok: bool, cache_hit: bool):
+        self.latencies[tier].append(latency_ms)
+        if not ok:
+            self.errors[tier] += 1
+        if cache_hit:
+            self.cache_hits[tier] += 1
+
+    def _row(self, latencies: List[float], errors: int, cache_hits: int, elapsed: float) -> Dict[str, Any]:
+        values = sorted(latencies)
+        return {
+            "count": len(values),
+            "errors": errors,
+            "cache_hits": cache_hits,
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "mean_ms": round(sum(values) / len(values), 1) if values else 0.0,
+            "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0
+        }
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        tiers = {
+            tier: self._row(latencies, self.errors[tier], self.cache_hits[tier], elapsed)
+            for tier, latencies in sorted(self.latencies.items(), key=lambda item: -len(item[1]))
+        }
+        tiers["all"] = self._row(
+            [value for latencies in self.latencies.values() for value in latencies],
+            sum(self.errors.values()),
+            sum(self.cache_hits.values()),
+            elapsed
+        )
+        return tiers
+
+
+async def _send(client: httpx.AsyncClient, payload: Dict[str, Any], started: float,
+                results: Optional[Results]):
+    tier, ok, cache_hit = "transport_error", False, False
+    try:
+        response = await client.post("/ask", json=payload)
+        body = response.json()
+        tier = body.get("method") or body.get("source") or "unknown"
+        ok = response.status_code < 400 and body.get("source") not in ("error", "system_error")
+        cache_hit = bool(body.get("cache_hit"))
+    except Exception as e:
+        tier = f"transport_error:{type(e).__name__}"
+    if results is not None:
+        results.record(tier, (time.perf_counter() - started) * 1000, ok, cache_hit)
+
+
+async def run_closed_loop(client: httpx.AsyncClient, schedule: List[Dict[str, Any]], concurrency: int,
+                          results: Optional[Results]):
+    queue: asyncio.Queue = asyncio.Queue()
+    for payload in schedule:
+        queue.put_nowait(payload)
+
+    async def worker():
+        while not queue.empty():
+            payload = queue.get_nowait()
+            await _send(client, payload, time.perf_counter(), results)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run_open_loop(client: httpx.AsyncClient, schedule: List[Dict[str, Any]], rate: float,
+                        results: Optional[Results]):
+    start = time.perf_counter()
+    tasks = []
+    for index, payload in enumerate(schedule):
+        scheduled = start + index / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(client, payload, scheduled, results)))
+    await asyncio.gather(*tasks)
+
+
+async def run(args) -> Tuple[Dict[str, Dict[str, Any]], float]:
+    corpus = load_corpus(Path(args.corpus), args.lang)
+    schedule = build_schedule(corpus, args.warmup + args.requests, args.users, args.seed)
+    warmup, measured = schedule[:args.warmup], schedule[args.warmup:]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.rate:
+        # Open loop must not be throttled by the client pool
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        if warmup:
+            await run_closed_loop(client, warmup, args.concurrency, None)
+
+        results = Results()
+        started = time.perf_counter()
+        if args.rate:
+            await run_open_loop(client, measured, args.rate, results)
+        else:
+            await run_closed_loop(client, measured, args.concurrency, results)
+        elapsed = time.perf_counter() - started
+    return results.summary(elapsed), elapsed
+
+
+def print_report(summary: Dict[str, Dict[str, Any]], elapsed: float):
+    header = f"{'Tier':<28}{'count':>7}{'errors':>8}{'cached':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}{'req/s':>9}"
+    print(header)
+    print("-" * len(header))
+    for tier, row in summary.items():
+        if tier == "all":
+            print("-" * len(header))
+        print(f"{tier:<28}{row['count']:>7}{row['errors']:>8}{row['cache_hits']:>8}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+              f"{row['mean_ms']:>9.1f}{row['throughput_rps']:>9.2f}")
+    print(f"\nElapsed {elapsed:.1f} s (latencies in ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a question corpus against /ask")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Base URL of rag_api")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="JSONL with question, lang, user")
+    parser.add_argument("--lang", choices=["ar", "en"], help="Only replay questions in this language")
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=0, help="Unmeasured requests sent first")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight (closed loop)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open loop: start this many requests per second")
+    parser.add_argument("--users", type=int, default=50, help="Seeded user ids to spread user questions over")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", dest="json_path", help="Also write the summary to this file")
+    args = parser.parse_args()
+
+    summary, elapsed = asyncio.run(run(args))
+    print_report(summary, elapsed)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"elapsed_seconds": round(elapsed, 3), "tiers": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Deterministic seed data for the fake Supabase server. Table and column
+definitions are read from the CREATE TABLE blocks in database_schema.md;
+rows are generated per column type from a seeded RNG, with realistic
+values for the columns the RAG system reads (product names, prices,
+branches, invoice items).
+"""
+
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA_PATH = ROOT / "Front-End-new" / "database_schema.md"
+
+sys.path.insert(0, str(ROOT / "Rag_system"))
+from config import PRODUCT_CATEGORY_TERMS, PRODUCT_TRANSLATIONS  # noqa: E402
+
+_TABLE_RE = re.compile(r"CREATE TABLE (\w+) \((.*?)\);", re.DOTALL)
+_ENUM_RE = re.compile(r"### \*\*(\w+)\*\*\s*```sql(.*?)```", re.DOTALL)
+_ENUM_VALUES_RE = re.compile(r"القيم المحتملة:\s*(.+)")
+
+BRANCHES = [
+    ("فرع الرياض - العليا", "طريق العليا، الرياض", 24.6900, 46.6850),
+    ("فرع الرياض - النخيل", "حي النخيل، الرياض", 24.7450, 46.6270),
+    ("فرع جدة - التحلية", "شارع التحلية، جدة", 21.5430, 39.1720),
+    ("فرع الدمام - الشاطئ", "حي الشاطئ، الدمام", 26.4550, 50.1080),
+    ("فرع مكة - العزيزية", "حي العزيزية، مكة المكرمة", 21.4060, 39.8850),
+]
+
+DOCUMENTS = [
+    "دكان فيجن متجر ذكي يعمل بالكاميرات والذكاء الاصطناعي بدون كاشير.",
+    "للشراء امسح رمز QR عند باب الثلاجة، اختر منتجاتك وأغلق الباب لتصلك الفاتورة.",
+    "طرق الدفع المتاحة: مدى، فيزا، ماستركارد، Apple Pay.",
+    "تعمل فروع دكان فيجن على مدار الساعة طوال أيام الأسبوع.",
+    "يمكن طلب استرداد المبلغ عبر فتح تذكرة مرتبطة بالفاتورة من التطبيق.",
+]
+
+CITIES = ["الرياض", "جدة", "الدمام", "مكة المكرمة", "المدينة المنورة"]
+FIRST_NAMES = ["محمد", "أحمد", "سارة", "نورة", "خالد", "ريم", "فهد", "لمى"]
+LAST_NAMES = ["العتيبي", "القحطاني", "الشمري", "الحربي", "الزهراني", "الدوسري"]
+
+_USER_NAMESPACE = uuid.UUID("6f1c9a52-3d0e-4c41-9a57-6b3f0d7f2a10")
+
+
+def user_id(index: int) -> str:
+    """Stable id of seeded user `index`; the load generator sends the same ids"""
+    return str(uuid.uuid5(_USER_NAMESPACE, f"user-{index}"))
+
+
+def parse_schema(path: Path = SCHEMA_PATH) -> Tuple[Dict[str, List[Tuple[str, str]]], Dict[str, List[str]]]:
+    """Return ({table: [(column, type)]}, {enum_type: [values]}) from database_schema.md"""
+    text = path.read_text(encoding="utf-8")
+    tables: Dict[str, List[Tuple[str, str]]] = {}
+    for name, body in _TABLE_RE.findall(text):
+        columns = []
+        for line in body.splitlines():
+            parts = line.strip().rstrip(",").split()
+            if len(parts) >= 2 and not parts[0].startswith("--"):
+                columns.append((parts[0], parts[1]))
+        tables[name] = columns
+
+    enums: Dict[str, List[str]] = {}
+    for name, body in _ENUM_RE.findall(text):
+        match = _ENUM_VALUES_RE.search(body)
+        if match:
+            enums[name] = [value.strip() for value in match.group(1).split(",")]
+    return tables, enums
+
+
+class SeedData:
+    """Generates every schema table; the same seed always yields the same rows"""
+
+    def __init__(self, seed: int = 42, users: int = 50, invoices_per_user: int = 30,
+                 schema_path: Path = SCHEMA_PATH):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.invoices_per_user = invoices_per_user
+        self.columns, self.enums = parse_schema(schema_path)
+        self.base_time = datetime(2025, 1, 1, 12, 0, 0)
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _value(self, column: str, column_type: str) -> Any:
+        """Fallback value for a column by its SQL type"""
+        column_type = column_type.upper()
+        if column_type == "UUID":
+            return self._uuid()
+        if column_type in ("INTEGER", "BIGSERIAL"):
+            return self.rng.randint(0, 100)
+        if column_type == "NUMERIC":
+            return round(self.rng.uniform(0, 100), 2)
+        if column_type == "BOOLEAN":
+            return self.rng.random() < 0.5
+        if column_type == "TIMESTAMP":
+            return self._timestamp()
+        if column_type in ("JSONB", "VECTOR"):
+            return None
+        if column_type.lower() in self.enums:
+            return self.rng.choice(self.enums[column_type.lower()])
+        return f"{column}_{self.rng.randint(1000, 9999)}"
+
+    def _timestamp(self) -> str:
+        offset = timedelta(minutes=self.rng.randint(0, 60 * 24 * 365))
+        return (self.base_time - offset).isoformat()
+
+    def _row(self, table: str, **values: Any) -> Dict[str, Any]:
+        """One row with every schema column: given values first, typed fallbacks for the rest"""
+        row = {}
+        for column, column_type in self.columns.get(table, []):
+            row[column] = values[column] if column in values else self._value(column, column_type)
+        return row
+
+    def _category(self, name: str) -> str:
+        translated = PRODUCT_TRANSLATIONS.get(name, name)
+        for category, (english, arabic) in PRODUCT_CATEGORY_TERMS.items():
+            if english in name.lower() or arabic in translated:
+                return category
+        return "snacks"
+
+    def build(self) -> Dict[str, List[Dict[str, Any]]]:
+        tables: Dict[str, List[Dict[str, Any]]] = {table: [] for table in self.columns}
+
+        for index, name in enumerate(PRODUCT_TRANSLATIONS, start=1):
+            tables["products"].append(self._row(
+                "products",
+                id=f"SKU{index:03d}",
+                name=name,
+                price=round(self.rng.uniform(1.5, 15.0), 2),
+                shelf=f"Shelf {self.rng.randint(1, 4)}",
+                category=self._category(name),
+                calories=self.rng.randint(50, 550)
+            ))
+
+        for name, address, lat, long in BRANCHES:
+            tables["branches"].append(self._row("branches", name=name, address=address, lat=lat, long=long))
+
+        for index in range(self.users):
+            uid = user_id(index)
+            first_name = self.rng.choice(FIRST_NAMES)
+            tables["users"].append(self._row(
+                "users",
+                id=uid,
+                email=f"user{index}@example.com",
+                phone=f"05{self.rng.randint(10000000, 99999999)}",
+                password="x",
+                is_admin=index == 0,
+                num_visits=self.rng.randint(0, 200),
+                owed_balance=0,
+                first_name=first_name,
+                last_name=self.rng.choice(LAST_NAMES),
+                city=self.rng.choice(CITIES)
+            ))
+            payment = self._row(
+                "payment_methods",
+                user_id=uid,
+                card_number=f"**** **** **** {self.rng.randint(1000, 9999)}",
+                card_holder_name=first_name,
+                cvv="***",
+                is_default=True,
+                is_deleted=False
+            )
+            tables["payment_methods"].append(payment)
+
+            for _ in range(self.invoices_per_user):
+                invoice = self._invoice(uid, tables["branches"], tables["products"], payment["id"])
+                tables["invoices"].append(invoice)
+                if invoice["status"] == "refunded":
+                    tables["tickets"].append(self._row(
+                        "tickets",
+                        invoice_id=invoice["id"],
+                        products_and_quantities=invoice["products_and_quantities"],
+                        refund_price=invoice["total_amount"],
+                        status=self.rng.choice(self.enums.get("ticket_status", ["open"]))
+                    ))
+
+        for index, content in enumerate(DOCUMENTS, start=1):
+            tables["documents"].append(self._row(
+                "documents", id=index, content=content, metadata={"source": "loadtest"}, embedding=None
+            ))
+        return tables
+
+    def _invoice(self, uid: str, branches: List[Dict[str, Any]], products: List[Dict[str, Any]],
+                 payment_id: str) -> Dict[str, Any]:
+        items = []
+        for product in self.rng.sample(products, self.rng.randint(1, 4)):
+            items.append({
+                "product_id": product["id"],
+                "name": product["name"],
+                "quantity": self.rng.randint(1, 3),
+                "price": product["price"]
+            })
+        total = round(sum(item["price"] * item["quantity"] for item in items), 2)
+        return self._row(
+            "invoices",
+            user_id=uid,
+            branch_id=self.rng.choice(branches)["id"],
+            payment_id=payment_id,
+            total_amount=total,
+            products_and_quantities=items
+        )
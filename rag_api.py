@@ -1,9 +1,11 @@
 import os
+import hmac
+import json
 from datetime import datetime
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from contextlib import asynccontextmanager
 
@@ -12,6 +14,7 @@ import sys
 sys.path.append('refactored_rag_system')
 from rag_system_refactored import RefactoredSupabaseRAG
 from config import RAGConfig
+from db_service import CATALOG_TABLES, INVOICE_SUMMARY_COLUMNS
 
 # مفاتيح من config.env
 from dotenv import load_dotenv
@@ -23,6 +26,9 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not all([OPENAI_API_KEY, SUPABASE_URL, SUPABASE_KEY]):
     raise RuntimeError("Missing environment variables")
 
+# Shared secret for cache administration endpoints; they are disabled when it is not set
+CACHE_ADMIN_KEY = os.getenv("CACHE_ADMIN_KEY")
+
 rag_system: Optional[RefactoredSupabaseRAG] = None
 
 @asynccontextmanager
@@ -35,7 +41,9 @@ async def lifespan(app: FastAPI):
             supabase_key=SUPABASE_KEY
         )
         rag_system = RefactoredSupabaseRAG(config)
+        await rag_system.warm_up()
         print("✅ Refactored RAG system initialized successfully!")
+        print(f"⏱️  Startup phases (ms): {rag_system.timings.as_dict()}")
         print("📦 New features available:")
         print("   - Modular design with separate services")
         print("   - Configuration-based responses")
@@ -44,6 +52,8 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"❌ Init error: {e}")
     yield
+    if rag_system:
+        await rag_system.shutdown()
     rag_system = None
     print("🛑 Refactored RAG system stopped")
 
@@ -127,6 +137,8 @@ async def ask(req: QuestionRequest):
             "answer": result["answer"],
             "source": result["source"],
             "confidence": result["confidence"],
+            "method": result.get("method"),
+            "cache_hit": result.get("cache_hit", False),
             "timestamp": datetime.now().isoformat()
         })
     except Exception as e:
@@ -140,6 +152,42 @@ async def ask(req: QuestionRequest):
             "timestamp": datetime.now().isoformat()
         }, status_code=500)
 
+@app.post("/ask/stream")
+async def ask_stream(req: QuestionRequest):
+    """Server-Sent Events: 'token' events with answer text, then one 'done' event with metadata"""
+    if not req.question or not req.question.strip():
+        raise HTTPException(status_code=400, detail="يرجى إدخال سؤال صحيح.")
+    if not rag_system:
+        raise HTTPException(status_code=503, detail="عذراً، النظام غير جاهز حالياً. يرجى المحاولة مرة أخرى.")
+    
+    question = req.question.strip()
+    print(f"🔍 Streaming question: '{question}'")
+    
+    async def events():
+        try:
+            async for event in rag_system.ask_question_stream(question, req.user_id, req.user_name):
+                data = event["data"]
+                if event["event"] == "token":
+                    data = {"text": data}
+                else:
+                    data = {**data, "timestamp": datetime.now().isoformat()}
+                yield f"event: {event['event']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"Error in /ask/stream endpoint: {e}")
+            error = {
+                "answer": "عذراً، حدث خطأ في معالجة سؤالك. يرجى المحاولة مرة أخرى.",
+                "source": "error",
+                "confidence": 0,
+                "timestamp": datetime.now().isoformat()
+            }
+            yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/products")
 async def get_products():
     try:
@@ -168,18 +216,68 @@ async def get_branches():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting branches: {str(e)}")
 
+# Pages larger than this are streamed, read from the database INVOICE_STREAM_CHUNK rows at a time
+INVOICE_STREAM_THRESHOLD = int(os.getenv("INVOICE_STREAM_THRESHOLD", "100"))
+INVOICE_STREAM_CHUNK = int(os.getenv("INVOICE_STREAM_CHUNK", "100"))
+
+async def stream_invoice_page(user_id: str, limit: int, cursor: Optional[str], columns: str):
+    """Yield the invoice page as JSON, writing each chunk of rows as it arrives from the database"""
+    count, next_cursor, formatted = 0, None, []
+    yield '{"invoices": ['
+    try:
+        async for chunk in rag_system.db_service.iter_invoice_page(
+            user_id, limit=limit, cursor=cursor, columns=columns, chunk_size=INVOICE_STREAM_CHUNK
+        ):
+            invoices = chunk["invoices"]
+            for invoice in invoices:
+                yield ("," if count else "") + json.dumps(invoice, ensure_ascii=False, default=str)
+                count += 1
+            if invoices:
+                formatted.append(rag_system.smart_service.format_invoices(invoices, start=count - len(invoices) + 1))
+            next_cursor = chunk["next_cursor"]
+    except Exception as e:
+        # Headers are already sent; end with a valid body and no next_cursor
+        print(f"Error streaming invoices: {e}")
+        next_cursor = None
+    fields = {
+        "formatted": "\n".join(formatted) or rag_system.smart_service.format_invoices([]),
+        "user_id": user_id,
+        "count": count,
+        "next_cursor": next_cursor,
+        "timestamp": datetime.now().isoformat()
+    }
+    yield "]"
+    for key, value in fields.items():
+        yield ", " + json.dumps(key) + ": " + json.dumps(value, ensure_ascii=False, default=str)
+    yield "}"
+
 @app.get("/invoices/{user_id}")
-async def get_user_invoices(user_id: str):
+async def get_user_invoices(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_items: bool = False
+):
     try:
-        invoices = await rag_system.db_service.get_invoices(user_id)
+        columns = "*" if include_items else INVOICE_SUMMARY_COLUMNS
+        if limit > INVOICE_STREAM_THRESHOLD:
+            if cursor:
+                # Reject a bad cursor before the streamed 200 response starts
+                rag_system.db_service.decode_invoice_cursor(cursor)
+            return StreamingResponse(stream_invoice_page(user_id, limit, cursor, columns), media_type="application/json")
+        page = await rag_system.db_service.get_invoice_page(user_id, limit=limit, cursor=cursor, columns=columns)
+        invoices = page["invoices"]
         formatted = rag_system.smart_service.format_invoices(invoices)
-        return JSONResponse(content={
-            "invoices": invoices,
+        fields = {
             "formatted": formatted,
             "user_id": user_id,
             "count": len(invoices),
+            "next_cursor": page["next_cursor"],
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        return JSONResponse(content={"invoices": invoices, **fields})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting invoices: {str(e)}")
 
@@ -196,6 +294,41 @@ async def add_documents(req: DocumentRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding documents: {str(e)}")
 
+@app.get("/cache-stats")
+async def get_cache_stats():
+    try:
+        return JSONResponse(content={
+            "stats": await rag_system.get_cache_stats(),
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting cache stats: {str(e)}")
+
+def require_admin_key(x_admin_key: Optional[str] = Header(None), authorization: Optional[str] = Header(None)):
+    """Accept the admin key as X-Admin-Key or as a Bearer token"""
+    if not CACHE_ADMIN_KEY:
+        raise HTTPException(status_code=503, detail="Cache administration is disabled (CACHE_ADMIN_KEY is not set)")
+    supplied = x_admin_key
+    if not supplied and authorization and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    if not supplied or not hmac.compare_digest(supplied.encode("utf-8"), CACHE_ADMIN_KEY.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin key")
+
+@app.post("/cache/invalidate", dependencies=[Depends(require_admin_key)])
+async def invalidate_cache(table: str = "products"):
+    """Call after writing products/branches (e.g. from a Supabase database webhook sending X-Admin-Key)"""
+    if table not in CATALOG_TABLES:
+        raise HTTPException(status_code=400, detail=f"Unknown table '{table}', expected one of: {', '.join(CATALOG_TABLES)}")
+    try:
+        await rag_system.db_service.notify_data_changed(table)
+        return JSONResponse(content={
+            "message": f"Caches invalidated for {table}",
+            "data_version": rag_system.db_service.data_version,
+            "timestamp": datetime.now().isoformat()
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error invalidating cache: {str(e)}")
+
 @app.get("/conversation-history")
 async def get_conversation_history(user_id: Optional[str] = None):
     try:
@@ -210,7 +343,7 @@ async def get_conversation_history(user_id: Optional[str] = None):
 @app.delete("/conversation-history")
 async def clear_conversation_history(user_id: Optional[str] = None):
     try:
-        rag_system.clear_memory(user_id)
+        await rag_system.clear_memory(user_id)
         return JSONResponse(content={
             "message": "Conversation history cleared successfully",
             "timestamp": datetime.now().isoformat()
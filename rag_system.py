@@ -1,6 +1,8 @@
 import os
+import sys
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
 from dataclasses import dataclass
 from datetime import datetime
 import aiohttp
@@ -15,11 +17,23 @@ from langchain.chains import ConversationalRetrievalChain
 from langchain.memory import ConversationBufferMemory
 
 # Supabase
-from supabase import create_client, Client
+from supabase import Client
+
+# Pooled clients come from the one process-wide registry in Rag_system/clients.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Rag_system"))
+import config as service_config
+from clients import ClientRegistry, get_clients
+from single_flight import SingleFlight
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Same store file as Rag_system/config.py: relative ENRICHMENT_STORE_PATH values are resolved against Rag_system/
+ENRICHMENT_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "Rag_system",
+    os.getenv("ENRICHMENT_STORE_PATH") or "product_enrichment.json"
+)
+
 @dataclass
 class RAGConfig:
     openai_api_key: str
@@ -32,6 +46,14 @@ class RAGConfig:
     chunk_overlap: int = 200
     table_name: str = os.getenv("VECTOR_TABLE", "documents")
     query_name: str = os.getenv("VECTOR_QUERY_FN", "match_documents")
+    db_pool_size: int = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+    db_max_concurrency: int = int(os.getenv("SUPABASE_MAX_CONCURRENCY", "10"))
+    db_timeout: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
+    openai_pool_size: int = int(os.getenv("OPENAI_POOL_SIZE", "20"))
+    openai_timeout: float = float(os.getenv("OPENAI_TIMEOUT", "30"))
+    openai_max_concurrency: int = int(os.getenv("OPENAI_CHAT_CONCURRENCY", "16"))
+    enrichment_store_path: str = ENRICHMENT_STORE_PATH
 
 class SupabaseRAG:
     def __init__(self, config: RAGConfig):
@@ -42,13 +64,15 @@ class SupabaseRAG:
         self.vector_store = None
         self.chain = None
         self.memory = None
+        self.clients = self._get_clients()
+        self.table_flight = SingleFlight("legacy_tables")
+        self.enrichment = self._load_enrichment_store()
         self._initialize()
 
     def _initialize(self):
         try:
             # Supabase
-            self.supabase = create_client(self.config.supabase_url, self.config.supabase_key)
-            logger.info("Supabase client initialized")
+            self.supabase = self.clients.supabase()
 
             # OpenAI
             self.llm = ChatOpenAI(
@@ -56,12 +80,16 @@ class SupabaseRAG:
                 temperature=self.config.temperature,
                 max_tokens=self.config.max_tokens,
                 openai_api_key=self.config.openai_api_key,
+                client=self.clients.openai().chat.completions,
+                async_client=self.clients.async_openai().chat.completions
             )
             logger.info("OpenAI LLM initialized")
 
             # Embeddings
             self.embeddings = OpenAIEmbeddings(
-                openai_api_key=self.config.openai_api_key
+                openai_api_key=self.config.openai_api_key,
+                client=self.clients.openai().embeddings,
+                async_client=self.clients.async_openai().embeddings
             )
             logger.info("OpenAI Embeddings initialized")
 
@@ -261,8 +289,28 @@ class SupabaseRAG:
             return {}
         return max(products, key=lambda x: x.get('calories', 0))
 
+    def _load_enrichment_store(self) -> Dict[str, str]:
+        """Precomputed descriptions (Rag_system/enrichment_store.py), by database and Arabic name"""
+        try:
+            with open(self.config.enrichment_store_path, "r", encoding="utf-8") as f:
+                products = json.load(f).get("products", {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Error loading enrichment store: {e}")
+            return {}
+        enrichment = {}
+        for name, entry in products.items():
+            if entry.get("text"):
+                enrichment[name] = entry["text"]
+                enrichment[entry.get("ar_name", name)] = entry["text"]
+        logger.info(f"Loaded enrichment for {len(products)} products")
+        return enrichment
+
     async def get_product_info_from_web(self, product_name: str) -> str:
-        """Get additional product information from web search"""
+        """Get additional product information (precomputed store first, OpenAI on a miss)"""
+        if product_name in self.enrichment:
+            return self.enrichment[product_name]
         try:
             # Use OpenAI to get product information
             prompt = f"""
@@ -278,18 +326,20 @@ class SupabaseRAG:
             اكتب الإجابة باللغة العربية وبشكل مختصر ومفيد.
             """
             
-            response = await asyncio.to_thread(
-                openai.ChatCompletion.create,
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "أنت مساعد متخصص في معلومات المنتجات الغذائية. أعط معلومات دقيقة ومفيدة."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300,
-                temperature=0.7
-            )
+            async with self.clients.limit("openai_chat"):
+                response = await self.clients.async_openai().chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[
+                        {"role": "system", "content": "أنت مساعد متخصص في معلومات المنتجات الغذائية. أعط معلومات دقيقة ومفيدة."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=300,
+                    temperature=0.7
+                )
             
-            return response.choices[0].message.content.strip()
+            text = response.choices[0].message.content.strip()
+            self.enrichment[product_name] = text
+            return text
             
         except Exception as e:
             logger.error(f"Error getting product info from web: {e}")
@@ -337,7 +387,7 @@ class SupabaseRAG:
                 # Handle smart product queries
                 if smart_response.startswith("smart_product_query:"):
                     query_type = smart_response.split(":")[1].strip()
-                    data = await self.load_database_data(user_id)
+                    data = await self.load_database_data(user_id, tables=("products",))
                     products = data['products']
                     
                     if query_type == "highest_price":
@@ -466,7 +516,7 @@ class SupabaseRAG:
                     elif query_type.startswith("product_info:"):
                         product_name = query_type.split(":", 1)[1]
                         # Get basic product info from database
-                        data = await self.load_database_data(user_id)
+                        data = await self.load_database_data(user_id, tables=("products",))
                         products = data['products']
                         
                         # Find the product in database
@@ -516,7 +566,7 @@ class SupabaseRAG:
             
             # Products queries - Smart handling
             if any(k in q_lower for k in ["المنتجات", "products", "product", "وش المنتجات", "ما هي المنتجات", "عرض المنتجات"]):
-                data = await self.load_database_data(user_id)
+                data = await self.load_database_data(user_id, tables=("products",))
                 # Show only names if asking about products generally
                 if any(w in q_lower for w in ["المنتجات", "products", "product"]):
                     return {
@@ -533,7 +583,7 @@ class SupabaseRAG:
             
             # Prices queries
             if any(k in q_lower for k in ["الاسعار", "prices", "price", "كم السعر", "كم الاسعار", "التكلفة", "cost"]):
-                data = await self.load_database_data(user_id)
+                data = await self.load_database_data(user_id, tables=("products",))
                 return {
                     "answer": f"أسعار المنتجات في دكان فجن:\n{self.format_products(data['products'], show_prices=True)}",
                     "source": "database",
@@ -548,7 +598,7 @@ class SupabaseRAG:
                 if product.lower() in q_lower:
                     # If asking about price specifically
                     if any(k in q_lower for k in ["كم سعر", "سعر", "تكلفة", "بكم"]):
-                        data = await self.load_database_data(user_id)
+                        data = await self.load_database_data(user_id, tables=("products",))
                         products = data['products']
                         
                         # Find the product
@@ -586,7 +636,7 @@ class SupabaseRAG:
             
             # Branches queries
             if any(k in q_lower for k in ["الفروع", "branches", "branch", "وين الفروع", "أين الفروع", "مواقع الفروع", "فروعكم"]):
-                data = await self.load_database_data(user_id)
+                data = await self.load_database_data(user_id, tables=("branches",))
                 return {
                     "answer": f"فروع دكان فجن المتوفرة:\n{self.format_branches(data['branches'])}",
                     "source": "database",
@@ -596,7 +646,7 @@ class SupabaseRAG:
             # Invoices queries - check for user-specific questions
             if any(k in q_lower for k in ["فواتيري", "فواتيري", "invoices", "invoice", "كم عدد فواتيري", "عرض فواتيري", "فواتيري"]):
                 if user_id:
-                    data = await self.load_database_data(user_id)
+                    data = await self.load_database_data(user_id, tables=("invoices",))
                     invoice_count = len(data['invoices'])
                     if invoice_count > 0:
                         return {
@@ -619,7 +669,7 @@ class SupabaseRAG:
             
             # General invoices query (not user-specific)
             if any(k in q_lower for k in ["الفواتير", "invoices", "invoice"]) and not any(k in q_lower for k in ["فواتيري", "فواتيري"]):
-                data = await self.load_database_data(user_id)
+                data = await self.load_database_data(user_id, tables=("invoices",))
                 return {
                     "answer": f"معلومات عن الفواتير في دكان فجن:\n{self.format_invoices(data['invoices'])}",
                     "source": "database",
@@ -670,18 +720,50 @@ class SupabaseRAG:
             logger.error(f"Error adding documents: {e}")
             return False
 
-    async def load_database_data(self, user_id: Optional[str] = None) -> Dict[str, Any]:
-        try:
-            data: Dict[str, Any] = {}
-            data['products'] = self.supabase.table("products").select("*").execute().data or []
-            data['branches'] = self.supabase.table("branches").select("*").execute().data or []
-            q = self.supabase.table("invoices").select("*")
-            if user_id: q = q.eq("user_id", user_id)
-            data['invoices'] = q.execute().data or []
-            return data
-        except Exception as e:
-            logger.error(f"Error loading DB: {e}")
-            return {"products": [], "branches": [], "invoices": []}
+    def _get_clients(self) -> ClientRegistry:
+        """The process-wide client registry, set up from this config if nothing created it yet"""
+        return get_clients(service_config.RAGConfig(
+            openai_api_key=self.config.openai_api_key,
+            supabase_url=self.config.supabase_url,
+            supabase_key=self.config.supabase_key,
+            supabase_pool_size=self.config.db_pool_size,
+            supabase_max_concurrency=self.config.db_max_concurrency,
+            supabase_timeout=self.config.db_timeout,
+            openai_base_url=self.config.openai_base_url,
+            openai_pool_size=self.config.openai_pool_size,
+            openai_timeout=self.config.openai_timeout,
+            openai_chat_concurrency=self.config.openai_max_concurrency
+        ))
+
+    async def _select(self, table: str, params: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        return await self.clients.supabase_rest().select(table, filters=params)
+
+    async def _load_table(self, table: str, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch one table; simultaneous askers for the same rows share one request"""
+        key = (table, user_id if table == "invoices" else None)
+        params = {"user_id": f"eq.{user_id}"} if key[1] else None
+        rows, _ = await self.table_flight.do(key, lambda: self._select(table, params))
+        return rows
+
+    async def load_database_data(self, user_id: Optional[str] = None,
+                                 tables: Iterable[str] = ("products", "branches", "invoices")) -> Dict[str, Any]:
+        """Load only the requested tables, concurrently"""
+        tables = list(tables)
+        data: Dict[str, Any] = {"products": [], "branches": [], "invoices": []}
+        results = await asyncio.gather(
+            *(self._load_table(table, user_id) for table in tables),
+            return_exceptions=True
+        )
+        for table, rows in zip(tables, results):
+            if isinstance(rows, Exception):
+                logger.error(f"Error loading {table}: {rows}")
+            else:
+                data[table] = rows
+        return data
+
+    async def close(self):
+        """Close the shared client pools (they are reopened on next use)"""
+        await self.clients.aclose()
 
     async def add_knowledge_base(self, knowledge_data: List[Dict[str, Any]]) -> bool:
         """Add knowledge base documents to the system"""
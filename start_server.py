@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 """
 Simple script to start the RAG API server
+
+    python start_server.py                 # development: one worker with auto-reload
+    python start_server.py --workers 4     # production: 4 preloaded worker processes
+    python start_server.py --workers 0     # production: one worker per CPU core
 """
 
+import argparse
+import tempfile
 import uvicorn
 from dotenv import load_dotenv
 import os
@@ -10,9 +16,64 @@ import os
 # Load environment variables
 load_dotenv("config.env")
 
+HOST = "0.0.0.0"
+PORT = 8001
+
+def configure_shared_state(workers: int):
+    """Point every worker at the same state files unless they were configured explicitly"""
+    os.environ["RAG_WORKERS"] = str(workers)
+    if workers <= 1:
+        return
+    # /dev/shm keeps the shared SQLite file in memory where available
+    state_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    os.environ.setdefault("SHARED_STATE_URL", f"sqlite:///{os.path.join(state_dir, f'duqan_rag_state_{PORT}.db')}")
+    os.environ.setdefault("MEMORY_DB_PATH", "conversation_memory.db")
+    print(f"🗄️  Shared state: {os.environ['SHARED_STATE_URL']}")
+    print(f"🧠 Conversation memory: {os.environ['MEMORY_DB_PATH']}")
+
+def run_workers(workers: int):
+    """Run preloaded worker processes: the app is imported once, then forked"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("⚠️  gunicorn is not installed; starting uvicorn workers without preloading")
+        uvicorn.run("rag_api:app", host=HOST, port=PORT, workers=workers, log_level="info")
+        return
+
+    class RAGApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{HOST}:{PORT}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            # Imports happen in the master; each worker builds its own RAG system in the lifespan
+            self.cfg.set("preload_app", True)
+            self.cfg.set("timeout", 120)
+            self.cfg.set("graceful_timeout", 30)
+            self.cfg.set("loglevel", "info")
+
+        def load(self):
+            from rag_api import app
+            # LangChain is imported lazily by each worker; importing it here shares the modules after fork
+            try:
+                import langchain_adapters  # noqa: F401
+                import langchain_openai  # noqa: F401
+                import langchain.chains  # noqa: F401
+                import langchain_community.vectorstores  # noqa: F401
+            except ImportError as e:
+                print(f"⚠️  Could not preload LangChain: {e}")
+            return app
+
+    RAGApplication().run()
+
 def main():
+    parser = argparse.ArgumentParser(description="Start the RAG API server")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("RAG_WORKERS", "1")),
+                        help="Worker processes; 1 runs the development server with reload, 0 uses one per CPU core")
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
     print("🚀 Starting Refactored RAG API Server...")
-    print("📍 Server will run on: http://localhost:8001")
+    print(f"📍 Server will run on: http://localhost:{PORT}")
     print("📝 Press Ctrl+C to stop the server")
     print("=" * 60)
     
@@ -37,11 +98,17 @@ def main():
     print("   🆕 New products: شيبس ليز, برينجلز باربكيو")
     print("=" * 60)
     
-    # Start the server
+    configure_shared_state(workers)
+    if workers > 1:
+        print(f"⚙️  Production mode: {workers} workers")
+        run_workers(workers)
+        return
+    
+    # Start the development server
     uvicorn.run(
         "rag_api:app",
-        host="0.0.0.0",
-        port=8001,
+        host=HOST,
+        port=PORT,
         reload=True,
         log_level="info"
     )